@@ -0,0 +1,170 @@
+-- 001_daily_sales_rollup.sql
+--
+-- Dzienny rollup sprzedaży: (dzień, oddział, przedstawiciel) -> netto, zysk
+-- i ich warianty opłacone. Utrzymywany przyrostowo przez triggery na
+-- transactions, więc dzienne liczby w /all_stats są aktualne od razu po zapisie
+-- i kosztują jedno zapytanie po kluczu głównym zamiast sumowania transakcji.
+--
+-- Dzień liczony jest jako created_at::date w strefie czasowej serwera - tak samo
+-- jak dotychczasowe zapytania created_at BETWEEN <dzień 00:00> AND <dzień 23:59>.
+-- Transakcje bez created_at nie należą do żadnego dnia i są pomijane.
+-- Transakcja jest opłacona, gdy to_pay IS NULL albo to_pay = 0 (Transaction.is_paid).
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/001_daily_sales_rollup.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+    day                 date           NOT NULL,
+    branch_name         varchar(100)   NOT NULL,
+    -- '' zamiast NULL - kolumna jest częścią klucza głównego
+    representative_name varchar(100)   NOT NULL DEFAULT '',
+    net_sales           numeric(14, 2) NOT NULL DEFAULT 0,
+    profit              numeric(14, 2) NOT NULL DEFAULT 0,
+    net_sales_paid      numeric(14, 2) NOT NULL DEFAULT 0,
+    profit_paid         numeric(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, branch_name, representative_name)
+);
+
+-- Triggery na poziomie instrukcji z tabelami przejściowymi: import wielu
+-- transakcji naraz aktualizuje każdy klucz rollupu jednym upsertem, a nie raz
+-- na wiersz. Tabele przejściowe wymagają osobnego triggera dla każdego zdarzenia.
+
+CREATE OR REPLACE FUNCTION daily_sales_rollup_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO daily_sales_rollup AS r
+        (day, branch_name, representative_name, net_sales, profit, net_sales_paid, profit_paid)
+    SELECT n.created_at::date,
+           n.branch_name,
+           COALESCE(n.representative_name, ''),
+           SUM(n.net_value),
+           SUM(n.profit),
+           COALESCE(SUM(n.net_value) FILTER (WHERE n.to_pay IS NULL OR n.to_pay = 0), 0),
+           COALESCE(SUM(n.profit) FILTER (WHERE n.to_pay IS NULL OR n.to_pay = 0), 0)
+    FROM new_rows n
+    WHERE n.created_at IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, branch_name, representative_name) DO UPDATE SET
+        net_sales      = r.net_sales + EXCLUDED.net_sales,
+        profit         = r.profit + EXCLUDED.profit,
+        net_sales_paid = r.net_sales_paid + EXCLUDED.net_sales_paid,
+        profit_paid    = r.profit_paid + EXCLUDED.profit_paid;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION daily_sales_rollup_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE daily_sales_rollup r SET
+        net_sales      = r.net_sales - d.net_sales,
+        profit         = r.profit - d.profit,
+        net_sales_paid = r.net_sales_paid - d.net_sales_paid,
+        profit_paid    = r.profit_paid - d.profit_paid
+    FROM (
+        SELECT o.created_at::date AS day,
+               o.branch_name,
+               COALESCE(o.representative_name, '') AS representative_name,
+               SUM(o.net_value) AS net_sales,
+               SUM(o.profit) AS profit,
+               COALESCE(SUM(o.net_value) FILTER (WHERE o.to_pay IS NULL OR o.to_pay = 0), 0) AS net_sales_paid,
+               COALESCE(SUM(o.profit) FILTER (WHERE o.to_pay IS NULL OR o.to_pay = 0), 0) AS profit_paid
+        FROM old_rows o
+        WHERE o.created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    ) d
+    WHERE r.day = d.day
+      AND r.branch_name = d.branch_name
+      AND r.representative_name = d.representative_name;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE: różnica nowych i starych wartości w jednym upsercie - zmiana dnia,
+-- oddziału czy przedstawiciela przenosi kwoty między kluczami
+CREATE OR REPLACE FUNCTION daily_sales_rollup_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO daily_sales_rollup AS r
+        (day, branch_name, representative_name, net_sales, profit, net_sales_paid, profit_paid)
+    SELECT c.day,
+           c.branch_name,
+           c.representative_name,
+           SUM(c.sign * c.net_value),
+           SUM(c.sign * c.profit),
+           COALESCE(SUM(c.sign * c.net_value) FILTER (WHERE c.paid), 0),
+           COALESCE(SUM(c.sign * c.profit) FILTER (WHERE c.paid), 0)
+    FROM (
+        SELECT n.created_at::date AS day, n.branch_name,
+               COALESCE(n.representative_name, '') AS representative_name,
+               n.net_value, n.profit, (n.to_pay IS NULL OR n.to_pay = 0) AS paid, 1 AS sign
+        FROM new_rows n
+        WHERE n.created_at IS NOT NULL
+        UNION ALL
+        SELECT o.created_at::date, o.branch_name,
+               COALESCE(o.representative_name, ''),
+               o.net_value, o.profit, (o.to_pay IS NULL OR o.to_pay = 0), -1
+        FROM old_rows o
+        WHERE o.created_at IS NOT NULL
+    ) c
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, branch_name, representative_name) DO UPDATE SET
+        net_sales      = r.net_sales + EXCLUDED.net_sales,
+        profit         = r.profit + EXCLUDED.profit,
+        net_sales_paid = r.net_sales_paid + EXCLUDED.net_sales_paid,
+        profit_paid    = r.profit_paid + EXCLUDED.profit_paid;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION daily_sales_rollup_truncate() RETURNS trigger AS $$
+BEGIN
+    TRUNCATE daily_sales_rollup;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Blokada na czas zakładania triggerów i wypełnienia: zapis transakcji między
+-- tymi krokami nie trafiłby do rollupu albo zostałby policzony dwa razy
+LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_daily_sales_rollup_insert ON transactions;
+DROP TRIGGER IF EXISTS trg_daily_sales_rollup_update ON transactions;
+DROP TRIGGER IF EXISTS trg_daily_sales_rollup_delete ON transactions;
+DROP TRIGGER IF EXISTS trg_daily_sales_rollup_truncate ON transactions;
+
+CREATE TRIGGER trg_daily_sales_rollup_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_insert();
+
+CREATE TRIGGER trg_daily_sales_rollup_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_update();
+
+CREATE TRIGGER trg_daily_sales_rollup_delete
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_delete();
+
+CREATE TRIGGER trg_daily_sales_rollup_truncate
+    AFTER TRUNCATE ON transactions
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_rollup_truncate();
+
+-- Wypełnienie historią
+TRUNCATE daily_sales_rollup;
+INSERT INTO daily_sales_rollup
+    (day, branch_name, representative_name, net_sales, profit, net_sales_paid, profit_paid)
+SELECT created_at::date,
+       branch_name,
+       COALESCE(representative_name, ''),
+       SUM(net_value),
+       SUM(profit),
+       COALESCE(SUM(net_value) FILTER (WHERE to_pay IS NULL OR to_pay = 0), 0),
+       COALESCE(SUM(profit) FILTER (WHERE to_pay IS NULL OR to_pay = 0), 0)
+FROM transactions
+WHERE created_at IS NOT NULL
+GROUP BY 1, 2, 3;
+
+COMMIT;
+
+ANALYZE daily_sales_rollup;
@@ -0,0 +1,279 @@
+-- 002_incremental_aggregates.sql
+--
+-- Przyrostowe odświeżanie agregatów miesięcznych.
+--
+-- Zapisy transakcji i kosztów odkładają w aggregate_dirty_periods klucze
+-- (rok, miesiąc, oddział, przedstawiciel), których dotyczyły. Funkcja
+-- refresh_aggregates_incremental() przelicza wyłącznie te klucze w:
+--   • aggregated_sales_data i representative_aggregated_data,
+--   • net_sales_branch_total, profit_total, net_sales_branch_payd, profit_payd,
+--   • net_sales_representative_total, profit_representative_total,
+--     net_sales_representative_payd, profit_representative_payd,
+-- więc czas odświeżenia zależy od liczby zmian, a nie od długości historii.
+-- Pełne funkcje refresh_aggregated_sales_data() i
+-- refresh_representative_aggregated_data() zostają do odbudowy od zera.
+--
+-- Definicje jak w pozostałych miejscach aplikacji:
+--   • opłacona: to_pay IS NULL OR to_pay = 0,
+--   • sprzedaż PH: transakcja z przedstawicielem (NOT NULL, różny od '' i '0'),
+--   • procenty i marże liczone z sum, jak w /aggregated_sales_data?aggregate_company=true.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/002_incremental_aggregates.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS aggregate_dirty_periods (
+    year                integer      NOT NULL,
+    month               integer      NOT NULL,
+    branch_name         varchar(100) NOT NULL,
+    -- '' gdy zmiana nie dotyczy przedstawiciela
+    representative_name varchar(100) NOT NULL DEFAULT '',
+    marked_at           timestamptz  NOT NULL DEFAULT now(),
+    PRIMARY KEY (year, month, branch_name, representative_name)
+);
+
+-- Przeliczenie klucza czyta transakcje jednego miesiąca jednego oddziału
+-- albo jednego przedstawiciela
+CREATE INDEX IF NOT EXISTS ix_transactions_year_month_branch
+    ON transactions (year, month, branch_name);
+CREATE INDEX IF NOT EXISTS ix_transactions_year_month_representative
+    ON transactions (year, month, representative_name);
+
+-- -------------------------------------------------------------------------
+-- Oznaczanie zmienionych kluczy
+-- -------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION mark_dirty_transactions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO aggregate_dirty_periods (year, month, branch_name, representative_name)
+        SELECT DISTINCT n.year, n.month, n.branch_name, COALESCE(n.representative_name, '')
+        FROM new_rows n
+        WHERE n.year IS NOT NULL AND n.month IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO aggregate_dirty_periods (year, month, branch_name, representative_name)
+        SELECT DISTINCT o.year, o.month, o.branch_name, COALESCE(o.representative_name, '')
+        FROM old_rows o
+        WHERE o.year IS NOT NULL AND o.month IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_dirty_costs() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO aggregate_dirty_periods (year, month, branch_name, representative_name)
+        SELECT DISTINCT n.cost_year, n.cost_mo, n.cost_branch, COALESCE(n.cost_ph, '')
+        FROM new_rows n
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO aggregate_dirty_periods (year, month, branch_name, representative_name)
+        SELECT DISTINCT o.cost_year, o.cost_mo, o.cost_branch, COALESCE(o.cost_ph, '')
+        FROM old_rows o
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_mark_dirty_transactions_insert ON transactions;
+DROP TRIGGER IF EXISTS trg_mark_dirty_transactions_update ON transactions;
+DROP TRIGGER IF EXISTS trg_mark_dirty_transactions_delete ON transactions;
+
+CREATE TRIGGER trg_mark_dirty_transactions_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_dirty_transactions();
+
+CREATE TRIGGER trg_mark_dirty_transactions_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_dirty_transactions();
+
+CREATE TRIGGER trg_mark_dirty_transactions_delete
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_dirty_transactions();
+
+DROP TRIGGER IF EXISTS trg_mark_dirty_costs_insert ON all_costs;
+DROP TRIGGER IF EXISTS trg_mark_dirty_costs_update ON all_costs;
+DROP TRIGGER IF EXISTS trg_mark_dirty_costs_delete ON all_costs;
+
+CREATE TRIGGER trg_mark_dirty_costs_insert
+    AFTER INSERT ON all_costs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_dirty_costs();
+
+CREATE TRIGGER trg_mark_dirty_costs_update
+    AFTER UPDATE ON all_costs
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_dirty_costs();
+
+CREATE TRIGGER trg_mark_dirty_costs_delete
+    AFTER DELETE ON all_costs
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_dirty_costs();
+
+-- -------------------------------------------------------------------------
+-- Przyrostowe przeliczenie
+-- -------------------------------------------------------------------------
+
+-- Zwraca liczbę przeliczonych kluczy. Klucze są zdejmowane z kolejki na
+-- początku (DELETE ... RETURNING), więc zapis równoległy do odświeżenia
+-- oznaczy swój klucz ponownie i trafi do następnego przebiegu.
+CREATE OR REPLACE FUNCTION refresh_aggregates_incremental() RETURNS integer AS $$
+DECLARE
+    claimed integer;
+BEGIN
+    DROP TABLE IF EXISTS _dirty, _dirty_branches, _dirty_reps, _branch_sums, _rep_sums;
+
+    CREATE TEMP TABLE _dirty (
+        year integer, month integer, branch_name varchar(100), representative_name varchar(100)
+    ) ON COMMIT DROP;
+
+    WITH taken AS (
+        DELETE FROM aggregate_dirty_periods
+        RETURNING year, month, branch_name, representative_name
+    )
+    INSERT INTO _dirty SELECT * FROM taken;
+    GET DIAGNOSTICS claimed = ROW_COUNT;
+
+    IF claimed = 0 THEN
+        RETURN 0;
+    END IF;
+
+    CREATE TEMP TABLE _dirty_branches ON COMMIT DROP AS
+        SELECT DISTINCT year, month, branch_name FROM _dirty;
+    CREATE TEMP TABLE _dirty_reps ON COMMIT DROP AS
+        SELECT DISTINCT year, month, representative_name FROM _dirty WHERE representative_name <> '';
+
+    -- Oddziały: cztery tabele miesięczne i aggregated_sales_data
+    DELETE FROM net_sales_branch_total t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM profit_total t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM net_sales_branch_payd t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM profit_payd t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM aggregated_sales_data t USING _dirty_branches d
+        WHERE t.asd_year = d.year AND t.asd_month = d.month AND t.asd_branch = d.branch_name;
+
+    CREATE TEMP TABLE _branch_sums ON COMMIT DROP AS
+    SELECT tr.year, tr.month, tr.branch_name,
+           COALESCE(SUM(tr.net_value), 0) AS net_sales,
+           COALESCE(SUM(tr.profit), 0) AS profit,
+           COALESCE(SUM(tr.net_value) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS net_sales_paid,
+           COALESCE(SUM(tr.profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS profit_paid,
+           COALESCE(SUM(tr.net_value) FILTER (
+               WHERE tr.representative_name IS NOT NULL AND tr.representative_name NOT IN ('', '0')), 0) AS sales_ph,
+           COALESCE(SUM(tr.profit) FILTER (
+               WHERE tr.representative_name IS NOT NULL AND tr.representative_name NOT IN ('', '0')), 0) AS profit_ph
+    FROM transactions tr
+    JOIN _dirty_branches d
+      ON tr.year = d.year AND tr.month = d.month AND tr.branch_name = d.branch_name
+    GROUP BY tr.year, tr.month, tr.branch_name;
+
+    INSERT INTO net_sales_branch_total (year, month, branch_name, net_sales)
+        SELECT year, month, branch_name, net_sales FROM _branch_sums;
+    INSERT INTO profit_total (year, month, branch_name, profit)
+        SELECT year, month, branch_name, profit FROM _branch_sums;
+    INSERT INTO net_sales_branch_payd (year, month, branch_name, net_sales_paid)
+        SELECT year, month, branch_name, net_sales_paid FROM _branch_sums;
+    INSERT INTO profit_payd (year, month, branch_name, profit_paid)
+        SELECT year, month, branch_name, profit_paid FROM _branch_sums;
+
+    INSERT INTO aggregated_sales_data (
+        asd_year, asd_month, asd_branch,
+        asd_sales_net, asd_profit_net, asd_sales_payd, asd_profit_payd, asd_sales_payd_percent,
+        asd_sales_ph, asd_profit_ph, asd_sales_ph_percent,
+        asd_marg_branch, asd_marg_ph, asd_marg_total
+    )
+    SELECT year, month, branch_name,
+           net_sales, profit, net_sales_paid, profit_paid,
+           COALESCE(100.0 * net_sales_paid / NULLIF(net_sales, 0), 0),
+           sales_ph, profit_ph,
+           COALESCE(100.0 * sales_ph / NULLIF(net_sales, 0), 0),
+           COALESCE(100.0 * (profit - profit_ph) / NULLIF(net_sales - sales_ph, 0), 0),
+           COALESCE(100.0 * profit_ph / NULLIF(sales_ph, 0), 0),
+           COALESCE(100.0 * profit / NULLIF(net_sales, 0), 0)
+    FROM _branch_sums;
+
+    DROP TABLE _branch_sums;
+
+    -- Przedstawiciele: cztery tabele miesięczne (klucz bez oddziału)
+    DELETE FROM net_sales_representative_total t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+    DELETE FROM profit_representative_total t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+    DELETE FROM net_sales_representative_payd t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+    DELETE FROM profit_representative_payd t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+
+    CREATE TEMP TABLE _rep_sums ON COMMIT DROP AS
+    SELECT tr.year, tr.month, tr.representative_name,
+           COALESCE(SUM(tr.net_value), 0) AS net_sales,
+           COALESCE(SUM(tr.profit), 0) AS profit,
+           COALESCE(SUM(tr.net_value) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS net_sales_paid,
+           COALESCE(SUM(tr.profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS profit_paid
+    FROM transactions tr
+    JOIN _dirty_reps d
+      ON tr.year = d.year AND tr.month = d.month AND tr.representative_name = d.representative_name
+    GROUP BY tr.year, tr.month, tr.representative_name;
+
+    INSERT INTO net_sales_representative_total (year, month, representative_name, net_sales)
+        SELECT year, month, representative_name, net_sales FROM _rep_sums;
+    INSERT INTO profit_representative_total (year, month, representative_name, profit)
+        SELECT year, month, representative_name, profit FROM _rep_sums;
+    INSERT INTO net_sales_representative_payd (year, month, representative_name, net_sales_paid)
+        SELECT year, month, representative_name, net_sales_paid FROM _rep_sums;
+    INSERT INTO profit_representative_payd (year, month, representative_name, profit_paid)
+        SELECT year, month, representative_name, profit_paid FROM _rep_sums;
+
+    DROP TABLE _rep_sums;
+
+    -- representative_aggregated_data: pełny klucz (rok, miesiąc, oddział, przedstawiciel)
+    DELETE FROM representative_aggregated_data t USING _dirty d
+        WHERE t.year = d.year AND t.month = d.month
+          AND t.branch_name = d.branch_name AND t.representative_name = d.representative_name
+          AND d.representative_name <> '';
+
+    INSERT INTO representative_aggregated_data (
+        year, month, branch_name, representative_name,
+        net_sales_total, net_sales_paid, profit_total, profit_paid,
+        sales_paid_percentage, profit_margin_percentage, paid_profit_margin_percentage,
+        rep_profit_total, rep_profit_payd
+    )
+    SELECT s.year, s.month, s.branch_name, s.representative_name,
+           s.net_sales, s.net_sales_paid, s.profit, s.profit_paid,
+           COALESCE(100.0 * s.net_sales_paid / NULLIF(s.net_sales, 0), 0),
+           COALESCE(100.0 * s.profit / NULLIF(s.net_sales, 0), 0),
+           COALESCE(100.0 * s.profit_paid / NULLIF(s.net_sales_paid, 0), 0),
+           s.rep_profit, s.rep_profit_paid
+    FROM (
+        SELECT tr.year, tr.month, tr.branch_name, tr.representative_name,
+               COALESCE(SUM(tr.net_value), 0) AS net_sales,
+               COALESCE(SUM(tr.profit), 0) AS profit,
+               COALESCE(SUM(tr.net_value) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS net_sales_paid,
+               COALESCE(SUM(tr.profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS profit_paid,
+               COALESCE(SUM(tr.rep_profit), 0) AS rep_profit,
+               COALESCE(SUM(tr.rep_profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS rep_profit_paid
+        FROM transactions tr
+        JOIN _dirty d
+          ON tr.year = d.year AND tr.month = d.month
+         AND tr.branch_name = d.branch_name AND tr.representative_name = d.representative_name
+        WHERE d.representative_name <> ''
+        GROUP BY tr.year, tr.month, tr.branch_name, tr.representative_name
+    ) s;
+
+    RETURN claimed;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,73 @@
+-- 003_refresh_jobs.sql
+--
+-- Zadania odświeżania agregatów (refresh_jobs.py) i odroczenie triggerów
+-- agregatów na config_current_date bez ALTER TABLE.
+--
+-- refresh_jobs: jeden wiersz na przebieg. W kolejce może czekać najwyżej jedno
+-- zadanie (status 'queued') - kolejne żądania są do niego dołączane
+-- (requests + 1, full_refresh OR), więc równoległe wywołania kończą się jednym
+-- przebiegiem zamiast wielu pełnych odświeżeń.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/003_refresh_jobs.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS refresh_jobs (
+    id            serial PRIMARY KEY,
+    status        varchar(10) NOT NULL DEFAULT 'queued',
+    full_refresh  boolean     NOT NULL DEFAULT false,
+    requests      integer     NOT NULL DEFAULT 1,
+    requested_at  timestamptz NOT NULL DEFAULT now(),
+    started_at    timestamptz,
+    finished_at   timestamptz,
+    current_stage varchar(50),
+    stages        json,
+    error         text,
+    CONSTRAINT check_refresh_job_status CHECK (status IN ('queued', 'running', 'done', 'failed'))
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_refresh_jobs_single_queued
+    ON refresh_jobs ((true)) WHERE status = 'queued';
+
+-- Triggery agregatów na config_current_date dostają warunek WHEN na zmiennej
+-- sesji app.defer_aggregates. update-date ustawia ją przez SET LOCAL zamiast
+-- DISABLE/ENABLE TRIGGER, które brały blokadę ACCESS EXCLUSIVE na tabeli.
+-- Definicje triggerów są odtwarzane z pg_get_triggerdef, więc funkcje i
+-- zdarzenia zostają bez zmian; odtworzone triggery są włączone.
+DO $$
+DECLARE
+    trg record;
+    guard constant text := 'current_setting(''app.defer_aggregates'', true) IS DISTINCT FROM ''on''';
+    definition text;
+BEGIN
+    FOR trg IN
+        SELECT t.tgname, pg_get_triggerdef(t.oid) AS def
+        FROM pg_trigger t
+        WHERE t.tgrelid = 'config_current_date'::regclass
+          AND t.tgname IN (
+              'trg_update_aggregated_data_config',
+              'trg_update_historical_data',
+              'trg_update_summary_from_config',
+              'trg_update_summary_after_config_date_change'
+          )
+    LOOP
+        IF position('app.defer_aggregates' IN trg.def) > 0 THEN
+            CONTINUE;
+        END IF;
+
+        IF position(' WHEN (' IN trg.def) > 0 THEN
+            definition := regexp_replace(
+                replace(trg.def, ' WHEN (', ' WHEN (' || guard || ' AND ('),
+                '\) EXECUTE ', ')) EXECUTE '
+            );
+        ELSE
+            definition := regexp_replace(trg.def, ' EXECUTE ', ' WHEN (' || guard || ') EXECUTE ');
+        END IF;
+
+        EXECUTE format('DROP TRIGGER %I ON config_current_date', trg.tgname);
+        EXECUTE definition;
+    END LOOP;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,111 @@
+-- 004_monthly_profit_cube.sql
+--
+-- Miesięczna kostka zysków per oddział dla /aggregated_profits: hq_profit,
+-- branch_profit, rep_profit, found, profit i ich warianty opłacone
+-- (to_pay IS NULL OR to_pay = 0). Endpoint czyta z kostki zamknięte miesiące,
+-- a bieżący miesiąc (wg config_current_date) liczy na żywo z transactions.
+--
+-- Kostka jest utrzymywana przez potok odświeżania: refresh_aggregates_incremental()
+-- przelicza ją dla tych samych (rok, miesiąc, oddział) co pozostałe agregaty
+-- miesięczne. Codzienny Lambda (update_daily_date_and_aggregates) kostki nie
+-- przelicza, dlatego endpoint liczy na żywo także każdy (rok, miesiąc, oddział),
+-- który czeka w aggregate_dirty_periods / aggregate_dirty_claims - zmiany
+-- w zamkniętych miesiącach (także zapisy spoza API) są widoczne od razu.
+--
+-- Transakcje bez year/month nie trafiają do kostki. Transakcje z branch_name
+-- NULL również są pomijane (złączenie po kluczu i PRIMARY KEY kostki) - dawny
+-- /aggregated_profits zwracał je jako osobną grupę z oddziałem NULL.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/004_monthly_profit_cube.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS monthly_profit_cube (
+    year               integer        NOT NULL,
+    month              integer        NOT NULL,
+    branch_name        varchar(100)   NOT NULL,
+    hq_profit          numeric(14, 2) NOT NULL DEFAULT 0,
+    branch_profit      numeric(14, 2) NOT NULL DEFAULT 0,
+    rep_profit         numeric(14, 2) NOT NULL DEFAULT 0,
+    found              numeric(14, 2) NOT NULL DEFAULT 0,
+    profit             numeric(14, 2) NOT NULL DEFAULT 0,
+    hq_profit_paid     numeric(14, 2) NOT NULL DEFAULT 0,
+    branch_profit_paid numeric(14, 2) NOT NULL DEFAULT 0,
+    rep_profit_paid    numeric(14, 2) NOT NULL DEFAULT 0,
+    found_paid         numeric(14, 2) NOT NULL DEFAULT 0,
+    profit_paid        numeric(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (year, month, branch_name)
+);
+
+-- Przeliczenie kostki dla podanych kluczy (tabela tymczasowa z year, month, branch_name)
+CREATE OR REPLACE FUNCTION refresh_profit_cube(keys regclass) RETURNS void AS $$
+BEGIN
+    EXECUTE format(
+        'DELETE FROM monthly_profit_cube c USING %s d
+         WHERE c.year = d.year AND c.month = d.month AND c.branch_name = d.branch_name',
+        keys
+    );
+    EXECUTE format(
+        'INSERT INTO monthly_profit_cube
+         SELECT tr.year, tr.month, tr.branch_name,
+                COALESCE(SUM(tr.hq_profit), 0),
+                COALESCE(SUM(tr.branch_profit), 0),
+                COALESCE(SUM(tr.rep_profit), 0),
+                COALESCE(SUM(tr.found), 0),
+                COALESCE(SUM(tr.profit), 0),
+                COALESCE(SUM(tr.hq_profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0),
+                COALESCE(SUM(tr.branch_profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0),
+                COALESCE(SUM(tr.rep_profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0),
+                COALESCE(SUM(tr.found) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0),
+                COALESCE(SUM(tr.profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0)
+         FROM transactions tr
+         JOIN %s d ON tr.year = d.year AND tr.month = d.month AND tr.branch_name = d.branch_name
+         GROUP BY tr.year, tr.month, tr.branch_name',
+        keys
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Włączenie kostki do przyrostowego odświeżania: dotychczasowa funkcja zostaje
+-- pod nową nazwą, a refresh_aggregates_incremental() wywołuje ją i przelicza
+-- kostkę dla kluczy z _dirty_branches (tabela tymczasowa tej samej transakcji).
+DO $$
+BEGIN
+    IF to_regprocedure('refresh_monthly_aggregates_incremental()') IS NULL THEN
+        ALTER FUNCTION refresh_aggregates_incremental() RENAME TO refresh_monthly_aggregates_incremental;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_aggregates_incremental() RETURNS integer AS $$
+DECLARE
+    claimed integer;
+BEGIN
+    claimed := refresh_monthly_aggregates_incremental();
+    IF claimed > 0 THEN
+        PERFORM refresh_profit_cube('_dirty_branches');
+    END IF;
+    RETURN claimed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Pełna przebudowa kostki (etap pełnego odświeżania w refresh_jobs.py)
+CREATE OR REPLACE FUNCTION refresh_profit_cube_full() RETURNS void AS $$
+BEGIN
+    DROP TABLE IF EXISTS _all_branch_months;
+    CREATE TEMP TABLE _all_branch_months ON COMMIT DROP AS
+        SELECT DISTINCT year, month, branch_name
+        FROM transactions
+        WHERE year IS NOT NULL AND month IS NOT NULL;
+    -- DELETE zamiast TRUNCATE - odczyty kostki nie czekają na blokadę ACCESS EXCLUSIVE
+    DELETE FROM monthly_profit_cube;
+    PERFORM refresh_profit_cube('_all_branch_months');
+END;
+$$ LANGUAGE plpgsql;
+
+-- Wypełnienie historią
+SELECT refresh_profit_cube_full();
+
+COMMIT;
+
+ANALYZE monthly_profit_cube;
@@ -0,0 +1,212 @@
+-- 005_partition_transactions.sql
+--
+-- Przeniesienie transactions do tabeli partycjonowanej zakresowo po year
+-- (jedna partycja na rok + partycja domyślna dla lat bez partycji). Zapytania z warunkiem na year (a przez year także na month)
+-- czytają tylko partycje swoich lat - planner odcina pozostałe.
+--
+-- Wymaga PostgreSQL 13+ (triggery BEFORE ROW na tabeli partycjonowanej).
+--
+-- Przebieg (jedna transakcja, tabela zablokowana dla zapisów na czas kopiowania):
+--   0. year NOT NULL - brakujący rok/miesiąc uzupełniany z created_at,
+--      wiersze bez year i created_at przerywają migrację (RAISE),
+--   1. transactions_partitioned (LIKE transactions) PARTITION BY RANGE (year),
+--      partycje dla lat obecnych w danych, bieżącego i następnego roku,
+--   2. kopia danych,
+--   3. zapamiętanie definicji indeksów, triggerów i widoków zależnych,
+--   4. zamiana nazw: transactions -> transactions_unpartitioned,
+--      transactions_partitioned -> transactions,
+--   5. odtworzenie indeksów, triggerów i widoków na nowej tabeli.
+-- Stara tabela zostaje jako transactions_unpartitioned (do usunięcia ręcznie
+-- po weryfikacji).
+--
+-- Unikalność na tabeli partycjonowanej musi obejmować klucz partycjonowania,
+-- więc klucz główny (id) zastępuje unikalny indeks (id, year) przy id i year
+-- NOT NULL. Sam id nie jest już wymuszany przez indeks - pilnuje go trigger
+-- z 013_transactions_year_not_null.sql.
+-- Klucze obce wskazujące na transactions(id) blokują migrację (RAISE).
+--
+-- Nowe lata: ensure_transactions_partitions() tworzy partycję bieżącego
+-- i następnego roku; wywołują ją start API i runner odświeżania
+-- (refresh_jobs.py), a import (ingest.py) zakłada partycje lat z partii.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/005_partition_transactions.sql
+
+BEGIN;
+
+-- -------------------------------------------------------------------------
+-- Tworzenie partycji rocznych
+-- -------------------------------------------------------------------------
+
+-- Tworzy partycję dla roku (jeśli jej brak). Wiersze tego roku leżące już
+-- w partycji domyślnej są do niej przenoszone - inaczej ATTACH by się nie udał.
+CREATE OR REPLACE FUNCTION ensure_transactions_partition(p_year integer) RETURNS boolean AS $$
+DECLARE
+    part text := format('transactions_y%s', p_year);
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+    IF to_regclass('transactions_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM transactions_default WHERE year = %s RETURNING *)
+             INSERT INTO %I SELECT * FROM moved',
+            p_year, part
+        );
+    END IF;
+    EXECUTE format(
+        'ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)',
+        part, p_year, p_year + 1
+    );
+    RAISE NOTICE 'Utworzono partycję %', part;
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partycje bieżącego i następnego roku - żeby nowe transakcje nie trafiały do partycji domyślnej
+CREATE OR REPLACE FUNCTION ensure_transactions_partitions() RETURNS integer AS $$
+DECLARE
+    created integer := 0;
+    y integer := extract(year FROM current_date)::integer;
+BEGIN
+    IF ensure_transactions_partition(y) THEN
+        created := created + 1;
+    END IF;
+    IF ensure_transactions_partition(y + 1) THEN
+        created := created + 1;
+    END IF;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -------------------------------------------------------------------------
+-- Migracja istniejącej tabeli (pomijana, jeśli transactions jest już partycjonowana)
+-- -------------------------------------------------------------------------
+
+DO $$
+DECLARE
+    old_oid oid := 'transactions'::regclass;
+    seq text := pg_get_serial_sequence('transactions', 'id');
+    y integer;
+    obj record;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = old_oid) THEN
+        RAISE NOTICE 'transactions jest już partycjonowana - pomijam migrację';
+        RETURN;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE confrelid = old_oid AND contype = 'f') THEN
+        RAISE EXCEPTION 'Klucze obce wskazują na transactions - partycjonowanie wymaga ich usunięcia';
+    END IF;
+
+    LOCK TABLE transactions IN EXCLUSIVE MODE;
+
+    -- 0. year NOT NULL - bez tego (id, year) nie gwarantuje unikalności
+    UPDATE transactions SET
+        year = extract(year FROM created_at)::integer,
+        month = COALESCE(month, extract(month FROM created_at)::integer)
+    WHERE year IS NULL AND created_at IS NOT NULL;
+    IF EXISTS (SELECT 1 FROM transactions WHERE year IS NULL) THEN
+        RAISE EXCEPTION 'transactions: wiersze bez year i created_at - uzupełnij year przed migracją';
+    END IF;
+    ALTER TABLE transactions ALTER COLUMN year SET NOT NULL;
+
+    -- 1. Tabela partycjonowana i partycje
+    CREATE TABLE transactions_partitioned (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (year);
+    CREATE TABLE transactions_partitioned_default PARTITION OF transactions_partitioned DEFAULT;
+
+    FOR y IN
+        SELECT DISTINCT year FROM transactions WHERE year IS NOT NULL
+        UNION
+        SELECT extract(year FROM current_date)::integer
+        UNION
+        SELECT extract(year FROM current_date)::integer + 1
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF transactions_partitioned FOR VALUES FROM (%s) TO (%s)',
+            'transactions_y' || y, y, y + 1
+        );
+    END LOOP;
+
+    -- 2. Dane
+    INSERT INTO transactions_partitioned SELECT * FROM transactions;
+
+    -- 3. Definicje do odtworzenia po zamianie nazw (odwołują się do nazwy "transactions")
+    CREATE TEMP TABLE _transactions_ddl (kind text, name text, definition text) ON COMMIT DROP;
+
+    INSERT INTO _transactions_ddl
+    SELECT 'index', i.relname, pg_get_indexdef(x.indexrelid)
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    WHERE x.indrelid = old_oid AND NOT x.indisprimary AND NOT x.indisunique;
+
+    INSERT INTO _transactions_ddl
+    SELECT 'trigger', t.tgname, pg_get_triggerdef(t.oid)
+    FROM pg_trigger t
+    WHERE t.tgrelid = old_oid AND NOT t.tgisinternal;
+
+    INSERT INTO _transactions_ddl
+    SELECT DISTINCT 'view', v.oid::regclass::text,
+           format('CREATE OR REPLACE VIEW %s AS %s', v.oid::regclass, pg_get_viewdef(v.oid))
+    FROM pg_depend d
+    JOIN pg_rewrite r ON r.oid = d.objid
+    JOIN pg_class v ON v.oid = r.ev_class
+    WHERE d.refobjid = old_oid AND v.oid <> old_oid AND v.relkind = 'v';
+
+    IF EXISTS (
+        SELECT 1 FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.refobjid = old_oid AND v.relkind = 'm'
+    ) THEN
+        RAISE EXCEPTION 'Widoki zmaterializowane zależą od transactions - odtwórz je ręcznie po migracji';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM pg_index x
+        WHERE x.indrelid = old_oid AND x.indisunique AND NOT x.indisprimary
+    ) THEN
+        RAISE NOTICE 'Indeksy unikalne na transactions nie są przenoszone (muszą zawierać year)';
+    END IF;
+
+    -- 4. Zamiana nazw; triggery starej tabeli są usuwane, żeby nie dublowały efektów
+    FOR obj IN SELECT name FROM _transactions_ddl WHERE kind = 'trigger' LOOP
+        EXECUTE format('DROP TRIGGER %I ON transactions', obj.name);
+    END LOOP;
+    FOR obj IN
+        SELECT i.relname
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = old_oid
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', obj.relname, left(obj.relname, 50) || '_unpartitioned');
+    END LOOP;
+
+    ALTER TABLE transactions RENAME TO transactions_unpartitioned;
+    ALTER TABLE transactions_partitioned RENAME TO transactions;
+    ALTER TABLE transactions_partitioned_default RENAME TO transactions_default;
+
+    -- 5. Klucz, indeksy, sekwencja, triggery i widoki na nowej tabeli
+    CREATE UNIQUE INDEX transactions_id_year_key ON transactions (id, year);
+    IF seq IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY transactions.id', seq);
+    END IF;
+
+    FOR obj IN SELECT definition FROM _transactions_ddl WHERE kind = 'index' LOOP
+        EXECUTE obj.definition;
+    END LOOP;
+    FOR obj IN SELECT definition FROM _transactions_ddl WHERE kind = 'trigger' LOOP
+        EXECUTE obj.definition;
+    END LOOP;
+    FOR obj IN SELECT definition FROM _transactions_ddl WHERE kind = 'view' LOOP
+        EXECUTE obj.definition;
+    END LOOP;
+
+    CREATE INDEX IF NOT EXISTS ix_transactions_created_at ON transactions (created_at);
+END;
+$$;
+
+COMMIT;
+
+ANALYZE transactions;
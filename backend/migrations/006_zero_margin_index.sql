@@ -0,0 +1,22 @@
+-- 006_zero_margin_index.sql
+--
+-- Indeks częściowy dla /transactions/zero-margin. Predykat jest taki sam jak
+-- warunek w get_zero_margin_transactions, więc planner może go użyć, a wpisy
+-- są w kolejności stron (created_at, id) malejąco - paginacja keyset czyta
+-- tylko kolejne `limit + 1` wpisów, a count tylko wiersze z zerową marżą.
+--
+-- Planner dopasowuje predykat do zapytania, gdy stała 0.02 jest w treści SQL
+-- (psycopg2 wstawia parametry po stronie klienta). Zmiana warunku w endpointcie
+-- wymaga zmiany tego indeksu.
+--
+-- Na tabeli partycjonowanej (005) indeks powstaje na każdej partycji.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/006_zero_margin_index.sql
+
+CREATE INDEX IF NOT EXISTS ix_transactions_zero_margin
+    ON transactions (created_at DESC, id DESC)
+    WHERE net_value > 0
+      AND abs(net_value - profit) < 0.02
+      AND created_at IS NOT NULL;
+
+ANALYZE transactions;
@@ -0,0 +1,167 @@
+-- 007_representative_directory.sql
+--
+-- Słownik przedstawicieli: jeden wiersz na (przedstawiciel, oddział) z latami
+-- sprzedaży, pierwszą i ostatnią sprzedażą oraz znacznikiem, czy przedstawiciel
+-- występuje w kosztach (all_costs.cost_ph). Z niego korzystają /representatives,
+-- /costs/representatives i /all_stats (przez cache procesu rep_directory.py)
+-- zamiast DISTINCT po całych transactions, all_costs i
+-- representative_aggregated_data.
+--
+-- Nazwa oddziału jest normalizowana raz, przy zapisie do słownika
+-- (normalize_branch_name), a nazwa przedstawiciela przycinana. Puste nazwy
+-- i '0' są pomijane.
+--
+-- Triggery na INSERT/UPDATE transactions i all_costs dopisują nowe pary i
+-- rozszerzają lata/daty. Usunięcie transakcji nie zawęża słownika - robi to
+-- pełna przebudowa rebuild_representative_directory(), etap pełnego
+-- odświeżania w refresh_jobs.py.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/007_representative_directory.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS representative_directory (
+    id                  serial         UNIQUE,
+    representative_name varchar(100)   NOT NULL,
+    branch_name         varchar(100)   NOT NULL,
+    years               integer[]      NOT NULL DEFAULT '{}',
+    first_sale          timestamptz,
+    last_sale           timestamptz,
+    in_costs            boolean        NOT NULL DEFAULT false,
+    PRIMARY KEY (representative_name, branch_name)
+);
+
+-- Wspólna pisownia oddziałów (dotąd słownik branch_mapping w /representatives)
+CREATE OR REPLACE FUNCTION normalize_branch_name(name text) RETURNS text AS $$
+    SELECT CASE upper(btrim(name))
+        WHEN 'LUBLIN' THEN 'Lublin'
+        WHEN 'PCIM' THEN 'Pcim'
+        WHEN 'RZGOW' THEN 'Rzgów'
+        WHEN 'RZGÓW' THEN 'Rzgów'
+        WHEN 'MALBORK' THEN 'Malbork'
+        WHEN 'LOMZA' THEN 'Łomża'
+        WHEN 'ŁOMŻA' THEN 'Łomża'
+        WHEN 'LOMŻA' THEN 'Łomża'
+        WHEN 'MYSLIBORZ' THEN 'Myślibórz'
+        WHEN 'MYŚLIBÓRZ' THEN 'Myślibórz'
+        WHEN 'MG' THEN 'MG'
+        WHEN 'STH' THEN 'STH'
+        WHEN 'BHP' THEN 'BHP'
+        ELSE btrim(name)
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Dopisanie sprzedaży z tabeli przejściowej new_rows (INSERT i UPDATE)
+CREATE OR REPLACE FUNCTION representative_directory_sales() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO representative_directory AS r
+        (representative_name, branch_name, years, first_sale, last_sale)
+    SELECT btrim(n.representative_name),
+           normalize_branch_name(n.branch_name),
+           COALESCE(array_agg(DISTINCT n.year ORDER BY n.year) FILTER (WHERE n.year IS NOT NULL), '{}'),
+           MIN(n.created_at),
+           MAX(n.created_at)
+    FROM new_rows n
+    WHERE btrim(n.representative_name) NOT IN ('', '0')
+      AND n.branch_name IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (representative_name, branch_name) DO UPDATE SET
+        years = ARRAY(SELECT DISTINCT y FROM unnest(r.years || EXCLUDED.years) y ORDER BY y),
+        first_sale = LEAST(r.first_sale, EXCLUDED.first_sale),
+        last_sale = GREATEST(r.last_sale, EXCLUDED.last_sale)
+    -- Upsert bez zmian nie przepisuje wiersza (typowy import: znani przedstawiciele)
+    WHERE NOT (r.years @> EXCLUDED.years)
+       OR EXCLUDED.first_sale < r.first_sale
+       OR EXCLUDED.last_sale > r.last_sale
+       OR (r.first_sale IS NULL AND EXCLUDED.first_sale IS NOT NULL);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION representative_directory_costs() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO representative_directory AS r (representative_name, branch_name, in_costs)
+    SELECT DISTINCT btrim(n.cost_ph), normalize_branch_name(n.cost_branch), true
+    FROM new_rows n
+    WHERE btrim(n.cost_ph) NOT IN ('', '0')
+      AND n.cost_branch IS NOT NULL
+    ON CONFLICT (representative_name, branch_name) DO UPDATE SET in_costs = true
+    WHERE NOT r.in_costs;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Pełna przebudowa (po usunięciach lub poprawkach danych)
+CREATE OR REPLACE FUNCTION rebuild_representative_directory() RETURNS void AS $$
+BEGIN
+    -- DELETE zamiast TRUNCATE - odczyty słownika nie czekają na blokadę ACCESS EXCLUSIVE
+    DELETE FROM representative_directory;
+    INSERT INTO representative_directory
+        (representative_name, branch_name, years, first_sale, last_sale, in_costs)
+    SELECT s.representative_name,
+           s.branch_name,
+           COALESCE(s.years, '{}'),
+           s.first_sale,
+           s.last_sale,
+           c.representative_name IS NOT NULL
+    FROM (
+        SELECT btrim(representative_name) AS representative_name,
+               normalize_branch_name(branch_name) AS branch_name,
+               array_agg(DISTINCT year ORDER BY year) FILTER (WHERE year IS NOT NULL) AS years,
+               MIN(created_at) AS first_sale,
+               MAX(created_at) AS last_sale
+        FROM transactions
+        WHERE btrim(representative_name) NOT IN ('', '0')
+          AND branch_name IS NOT NULL
+        GROUP BY 1, 2
+    ) s
+    LEFT JOIN (
+        SELECT DISTINCT btrim(cost_ph) AS representative_name,
+               normalize_branch_name(cost_branch) AS branch_name
+        FROM all_costs
+        WHERE btrim(cost_ph) NOT IN ('', '0')
+    ) c ON c.representative_name = s.representative_name AND c.branch_name = s.branch_name;
+
+    -- Pary występujące tylko w kosztach
+    INSERT INTO representative_directory (representative_name, branch_name, in_costs)
+    SELECT DISTINCT btrim(cost_ph), normalize_branch_name(cost_branch), true
+    FROM all_costs
+    WHERE btrim(cost_ph) NOT IN ('', '0')
+    ON CONFLICT (representative_name, branch_name) DO NOTHING;
+END;
+$$ LANGUAGE plpgsql;
+
+LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE;
+LOCK TABLE all_costs IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_representative_directory_insert ON transactions;
+DROP TRIGGER IF EXISTS trg_representative_directory_update ON transactions;
+DROP TRIGGER IF EXISTS trg_representative_directory_costs_insert ON all_costs;
+DROP TRIGGER IF EXISTS trg_representative_directory_costs_update ON all_costs;
+
+CREATE TRIGGER trg_representative_directory_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_sales();
+
+CREATE TRIGGER trg_representative_directory_update
+    AFTER UPDATE ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_sales();
+
+CREATE TRIGGER trg_representative_directory_costs_insert
+    AFTER INSERT ON all_costs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_costs();
+
+CREATE TRIGGER trg_representative_directory_costs_update
+    AFTER UPDATE ON all_costs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_costs();
+
+-- Wypełnienie historią
+SELECT rebuild_representative_directory();
+
+COMMIT;
+
+ANALYZE representative_directory;
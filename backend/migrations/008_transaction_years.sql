@@ -0,0 +1,78 @@
+-- 008_transaction_years.sql
+--
+-- Lata, w których są transakcje - dla /years (wybór roku na każdym dashboardzie)
+-- zamiast SELECT DISTINCT year po całych transactions przy każdym wejściu.
+--
+-- Trigger na INSERT/UPDATE transactions dopisuje nowe lata. Tylko gdy rok jest
+-- faktycznie nowy, wysyła NOTIFY transaction_years '<rok>' - workery API
+-- nasłuchują kanału (notifications.py) i dopiero wtedy unieważniają cache lat.
+-- Usunięcie wszystkich transakcji roku nie usuwa go ze słownika - robi to
+-- pełna przebudowa rebuild_transaction_years(), etap pełnego odświeżania
+-- w refresh_jobs.py.
+--
+-- Przebudowa liczy lata rekurencyjnym skip-scanem po indeksie (year): jedno
+-- zejście po indeksie na rok zamiast czytania wszystkich wierszy (Postgres
+-- nie ma natywnego loose index scan).
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/008_transaction_years.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS transaction_years (
+    year integer PRIMARY KEY
+);
+
+CREATE INDEX IF NOT EXISTS ix_transactions_year ON transactions (year);
+
+CREATE OR REPLACE FUNCTION transaction_years_add() RETURNS trigger AS $$
+DECLARE
+    y integer;
+BEGIN
+    FOR y IN
+        INSERT INTO transaction_years (year)
+        SELECT DISTINCT n.year FROM new_rows n WHERE n.year IS NOT NULL
+        ON CONFLICT (year) DO NOTHING
+        RETURNING year
+    LOOP
+        -- Powiadomienie dociera do słuchaczy dopiero po COMMIT
+        PERFORM pg_notify('transaction_years', y::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_transaction_years() RETURNS void AS $$
+BEGIN
+    DELETE FROM transaction_years;
+    INSERT INTO transaction_years (year)
+    WITH RECURSIVE y AS (
+        (SELECT year FROM transactions WHERE year IS NOT NULL ORDER BY year LIMIT 1)
+        UNION ALL
+        SELECT (SELECT t.year FROM transactions t WHERE t.year > y.year ORDER BY t.year LIMIT 1)
+        FROM y
+        WHERE y.year IS NOT NULL
+    )
+    SELECT year FROM y WHERE year IS NOT NULL;
+    PERFORM pg_notify('transaction_years', '');
+END;
+$$ LANGUAGE plpgsql;
+
+LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_transaction_years_insert ON transactions;
+DROP TRIGGER IF EXISTS trg_transaction_years_update ON transactions;
+
+CREATE TRIGGER trg_transaction_years_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transaction_years_add();
+
+CREATE TRIGGER trg_transaction_years_update
+    AFTER UPDATE ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transaction_years_add();
+
+-- Wypełnienie historią
+SELECT rebuild_transaction_years();
+
+COMMIT;
@@ -0,0 +1,36 @@
+-- 009_transactions_document_key.sql
+--
+-- Klucz naturalny transakcji dla importu (ingest.py): numer dokumentu w roku.
+-- Import scala partie z ERP przez INSERT ... ON CONFLICT (document_number, year),
+-- więc ponowne wysłanie tej samej partii aktualizuje wiersze zamiast je dublować.
+--
+-- Na tabeli partycjonowanej po year (005_partition_transactions.sql) indeks
+-- unikalny musi zawierać year - sam document_number nie wystarczy.
+-- Migracja przerywa się, jeśli w danych są już duplikaty.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/009_transactions_document_key.sql
+
+BEGIN;
+
+DO $$
+DECLARE
+    duplicates integer;
+BEGIN
+    SELECT count(*) INTO duplicates
+    FROM (
+        SELECT 1
+        FROM transactions
+        GROUP BY document_number, year
+        HAVING count(*) > 1
+    ) d;
+
+    IF duplicates > 0 THEN
+        RAISE EXCEPTION 'transactions: % numerów dokumentów występuje kilka razy w tym samym roku - usuń duplikaty przed migracją', duplicates;
+    END IF;
+END;
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_document_number_year
+    ON transactions (document_number, year);
+
+COMMIT;
@@ -0,0 +1,116 @@
+-- 010_costs_trigram_search.sql
+--
+-- Wyszukiwanie kosztów po kontrahencie, NIP-ie i numerze dokumentu (pg_trgm).
+--
+-- 1. Indeksy GIN (gin_trgm_ops) na all_costs.cost_contrahent, cost_nip
+--    i cost_doc_no - warunki ILIKE '%tekst%' z GET /costs (contrahent_like,
+--    search) korzystają z nich zamiast czytać całą tabelę.
+-- 2. cost_contractors: słownik (kontrahent, NIP) z liczbą kosztów, utrzymywany
+--    triggerami na all_costs. Podpowiedzi /costs/contractors/suggest szukają
+--    w nim przez indeks GiST (gist_trgm_ops) z sortowaniem KNN po word
+--    similarity - czas nie zależy od liczby kosztów, tylko kontrahentów.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/010_costs_trigram_search.sql
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS ix_all_costs_contrahent_trgm ON all_costs USING gin (cost_contrahent gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_all_costs_nip_trgm ON all_costs USING gin (cost_nip gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_all_costs_doc_no_trgm ON all_costs USING gin (cost_doc_no gin_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS cost_contractors (
+    cost_contrahent varchar(200) NOT NULL,
+    cost_nip        varchar(20)  NOT NULL,
+    uses            integer      NOT NULL DEFAULT 0,
+    PRIMARY KEY (cost_contrahent, cost_nip)
+);
+
+CREATE INDEX IF NOT EXISTS ix_cost_contractors_contrahent_trgm
+    ON cost_contractors USING gist (cost_contrahent gist_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_cost_contractors_nip
+    ON cost_contractors (cost_nip text_pattern_ops);
+
+-- Triggery na poziomie instrukcji z tabelami przejściowymi (jak w 001):
+-- uses = liczba kosztów pary (kontrahent, NIP); para bez kosztów znika ze słownika
+
+CREATE OR REPLACE FUNCTION cost_contractors_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO cost_contractors AS c (cost_contrahent, cost_nip, uses)
+    SELECT cost_contrahent, cost_nip, count(*)
+    FROM new_rows
+    WHERE btrim(cost_contrahent) NOT IN ('', '-')
+    GROUP BY 1, 2
+    ON CONFLICT (cost_contrahent, cost_nip) DO UPDATE SET uses = c.uses + EXCLUDED.uses;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cost_contractors_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE cost_contractors c SET uses = c.uses - d.n
+    FROM (SELECT cost_contrahent, cost_nip, count(*) AS n FROM old_rows GROUP BY 1, 2) d
+    WHERE c.cost_contrahent = d.cost_contrahent AND c.cost_nip = d.cost_nip;
+
+    DELETE FROM cost_contractors c
+    USING (SELECT DISTINCT cost_contrahent, cost_nip FROM old_rows) d
+    WHERE c.cost_contrahent = d.cost_contrahent AND c.cost_nip = d.cost_nip AND c.uses <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE: różnica nowych i starych par w jednym upsercie
+CREATE OR REPLACE FUNCTION cost_contractors_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO cost_contractors AS c (cost_contrahent, cost_nip, uses)
+    SELECT cost_contrahent, cost_nip, SUM(delta)
+    FROM (
+        SELECT cost_contrahent, cost_nip, 1 AS delta FROM new_rows
+        UNION ALL
+        SELECT cost_contrahent, cost_nip, -1 FROM old_rows
+    ) d
+    WHERE btrim(cost_contrahent) NOT IN ('', '-')
+    GROUP BY 1, 2
+    HAVING SUM(delta) <> 0
+    ON CONFLICT (cost_contrahent, cost_nip) DO UPDATE SET uses = c.uses + EXCLUDED.uses;
+
+    DELETE FROM cost_contractors c
+    USING (SELECT DISTINCT cost_contrahent, cost_nip FROM old_rows) d
+    WHERE c.cost_contrahent = d.cost_contrahent AND c.cost_nip = d.cost_nip AND c.uses <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+LOCK TABLE all_costs IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_cost_contractors_insert ON all_costs;
+DROP TRIGGER IF EXISTS trg_cost_contractors_update ON all_costs;
+DROP TRIGGER IF EXISTS trg_cost_contractors_delete ON all_costs;
+
+CREATE TRIGGER trg_cost_contractors_insert
+    AFTER INSERT ON all_costs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cost_contractors_insert();
+
+CREATE TRIGGER trg_cost_contractors_update
+    AFTER UPDATE ON all_costs
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cost_contractors_update();
+
+CREATE TRIGGER trg_cost_contractors_delete
+    AFTER DELETE ON all_costs
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cost_contractors_delete();
+
+-- Wypełnienie historią
+DELETE FROM cost_contractors;
+INSERT INTO cost_contractors (cost_contrahent, cost_nip, uses)
+SELECT cost_contrahent, cost_nip, count(*)
+FROM all_costs
+WHERE btrim(cost_contrahent) NOT IN ('', '-')
+GROUP BY 1, 2;
+
+COMMIT;
+
+ANALYZE cost_contractors;
@@ -0,0 +1,29 @@
+-- 011_cost_kinds_notify.sql
+--
+-- Powiadomienie o zmianie słownika rodzajów kosztów (cost_kinds).
+--
+-- Workery API trzymają słownik w pamięci (cost_kind_cache.py) - walidacja
+-- zapisu kosztu i GET /cost_kinds nie pytają bazy. Każda instrukcja zmieniająca
+-- cost_kinds wysyła NOTIFY cost_kinds; workery nasłuchują kanału
+-- (notifications.py) i unieważniają swoje kopie. Dotyczy to też zmian spoza
+-- API (psql, skrypty).
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/011_cost_kinds_notify.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION cost_kinds_notify() RETURNS trigger AS $$
+BEGIN
+    -- Powiadomienie dociera do słuchaczy dopiero po COMMIT
+    PERFORM pg_notify('cost_kinds', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cost_kinds_notify ON cost_kinds;
+
+CREATE TRIGGER trg_cost_kinds_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON cost_kinds
+    FOR EACH STATEMENT EXECUTE FUNCTION cost_kinds_notify();
+
+COMMIT;
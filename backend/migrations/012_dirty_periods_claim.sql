@@ -0,0 +1,221 @@
+-- 012_dirty_periods_claim.sql
+--
+-- Przejmowanie kluczy z aggregate_dirty_periods w osobnej, krótkiej transakcji.
+--
+-- Dotąd refresh_aggregates_incremental() zdejmowała klucze przez DELETE ...
+-- RETURNING wewnątrz długiej transakcji odświeżania (wszystkie etapy, razem
+-- z populate_*). Zapis transakcji oznaczający ten sam okres czekał wtedy
+-- w ON CONFLICT na usunięty, niezatwierdzony wiersz aż do końca odświeżania.
+--
+-- Teraz runner (refresh_jobs.py) najpierw wywołuje claim_dirty_periods() -
+-- przeniesienie kluczy do aggregate_dirty_claims zatwierdzane od razu - a etap
+-- przyrostowy czyta klucze z aggregate_dirty_claims i usuwa je w swojej
+-- transakcji. Zapisy transakcji nie dotykają aggregate_dirty_claims, więc na
+-- nic nie czekają. Nieudane odświeżenie zostawia klucze w claims - podejmie
+-- je następny przebieg. Pełne odświeżanie czyści claims w swojej transakcji.
+--
+-- Kto opróżnia kolejkę: wyłącznie zadania odświeżania z API (refresh_jobs.py) -
+-- PUT /config/update-date (domyślnie pełne: claim + DELETE claims), POST /refresh
+-- i odświeżenie przyrostowe po imporcie (ingest.py). Nocny Lambda
+-- (update_daily_date_and_aggregates) kolejki nie dotyka. Do czasu najbliższego
+-- zadania /aggregated_profits liczy oczekujące klucze na żywo z transactions
+-- (routes/transactions.py), więc kolejka nie psuje wyników - tylko wydłuża to
+-- zapytanie. Przed zmianą domyślnego odświeżania na przyrostowe uruchom
+-- tests/refresh_parity_check.py na danych produkcyjnych.
+--
+-- Usuwamy też oznaczanie okresów przy zapisach kosztów (mark_dirty_costs):
+-- przeliczane agregaty zależą tylko od transactions, więc te klucze tylko
+-- wydłużały przebieg.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/012_dirty_periods_claim.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS aggregate_dirty_claims (
+    year                integer      NOT NULL,
+    month               integer      NOT NULL,
+    branch_name         varchar(100) NOT NULL,
+    representative_name varchar(100) NOT NULL DEFAULT '',
+    claimed_at          timestamptz  NOT NULL DEFAULT now(),
+    PRIMARY KEY (year, month, branch_name, representative_name)
+);
+
+-- Zwraca liczbę kluczy w claims (nowo przejętych i pozostałych po nieudanym przebiegu)
+CREATE OR REPLACE FUNCTION claim_dirty_periods() RETURNS integer AS $$
+DECLARE
+    pending integer;
+BEGIN
+    WITH taken AS (
+        DELETE FROM aggregate_dirty_periods
+        RETURNING year, month, branch_name, representative_name
+    )
+    INSERT INTO aggregate_dirty_claims (year, month, branch_name, representative_name)
+    SELECT year, month, branch_name, representative_name FROM taken
+    ON CONFLICT DO NOTHING;
+
+    SELECT count(*) INTO pending FROM aggregate_dirty_claims;
+    RETURN pending;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Przeliczenie miesięcznych agregatów (wywoływane przez refresh_aggregates_incremental()
+-- z 004_monthly_profit_cube.sql) - jak w 002, ale klucze pochodzą z aggregate_dirty_claims
+CREATE OR REPLACE FUNCTION refresh_monthly_aggregates_incremental() RETURNS integer AS $$
+DECLARE
+    claimed integer;
+BEGIN
+    DROP TABLE IF EXISTS _dirty, _dirty_branches, _dirty_reps, _branch_sums, _rep_sums;
+
+    CREATE TEMP TABLE _dirty (
+        year integer, month integer, branch_name varchar(100), representative_name varchar(100)
+    ) ON COMMIT DROP;
+
+    -- Klucze przejęte przez claim_dirty_periods() - zdejmowane z claims
+    -- dopiero razem z przeliczeniem (ta sama transakcja)
+    INSERT INTO _dirty
+    SELECT year, month, branch_name, representative_name FROM aggregate_dirty_claims;
+    GET DIAGNOSTICS claimed = ROW_COUNT;
+
+    IF claimed = 0 THEN
+        RETURN 0;
+    END IF;
+
+    CREATE TEMP TABLE _dirty_branches ON COMMIT DROP AS
+        SELECT DISTINCT year, month, branch_name FROM _dirty;
+    CREATE TEMP TABLE _dirty_reps ON COMMIT DROP AS
+        SELECT DISTINCT year, month, representative_name FROM _dirty WHERE representative_name <> '';
+
+    -- Oddziały: cztery tabele miesięczne i aggregated_sales_data
+    DELETE FROM net_sales_branch_total t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM profit_total t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM net_sales_branch_payd t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM profit_payd t USING _dirty_branches d
+        WHERE t.year = d.year AND t.month = d.month AND t.branch_name = d.branch_name;
+    DELETE FROM aggregated_sales_data t USING _dirty_branches d
+        WHERE t.asd_year = d.year AND t.asd_month = d.month AND t.asd_branch = d.branch_name;
+
+    CREATE TEMP TABLE _branch_sums ON COMMIT DROP AS
+    SELECT tr.year, tr.month, tr.branch_name,
+           COALESCE(SUM(tr.net_value), 0) AS net_sales,
+           COALESCE(SUM(tr.profit), 0) AS profit,
+           COALESCE(SUM(tr.net_value) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS net_sales_paid,
+           COALESCE(SUM(tr.profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS profit_paid,
+           COALESCE(SUM(tr.net_value) FILTER (
+               WHERE tr.representative_name IS NOT NULL AND tr.representative_name NOT IN ('', '0')), 0) AS sales_ph,
+           COALESCE(SUM(tr.profit) FILTER (
+               WHERE tr.representative_name IS NOT NULL AND tr.representative_name NOT IN ('', '0')), 0) AS profit_ph
+    FROM transactions tr
+    JOIN _dirty_branches d
+      ON tr.year = d.year AND tr.month = d.month AND tr.branch_name = d.branch_name
+    GROUP BY tr.year, tr.month, tr.branch_name;
+
+    INSERT INTO net_sales_branch_total (year, month, branch_name, net_sales)
+        SELECT year, month, branch_name, net_sales FROM _branch_sums;
+    INSERT INTO profit_total (year, month, branch_name, profit)
+        SELECT year, month, branch_name, profit FROM _branch_sums;
+    INSERT INTO net_sales_branch_payd (year, month, branch_name, net_sales_paid)
+        SELECT year, month, branch_name, net_sales_paid FROM _branch_sums;
+    INSERT INTO profit_payd (year, month, branch_name, profit_paid)
+        SELECT year, month, branch_name, profit_paid FROM _branch_sums;
+
+    INSERT INTO aggregated_sales_data (
+        asd_year, asd_month, asd_branch,
+        asd_sales_net, asd_profit_net, asd_sales_payd, asd_profit_payd, asd_sales_payd_percent,
+        asd_sales_ph, asd_profit_ph, asd_sales_ph_percent,
+        asd_marg_branch, asd_marg_ph, asd_marg_total
+    )
+    SELECT year, month, branch_name,
+           net_sales, profit, net_sales_paid, profit_paid,
+           COALESCE(100.0 * net_sales_paid / NULLIF(net_sales, 0), 0),
+           sales_ph, profit_ph,
+           COALESCE(100.0 * sales_ph / NULLIF(net_sales, 0), 0),
+           COALESCE(100.0 * (profit - profit_ph) / NULLIF(net_sales - sales_ph, 0), 0),
+           COALESCE(100.0 * profit_ph / NULLIF(sales_ph, 0), 0),
+           COALESCE(100.0 * profit / NULLIF(net_sales, 0), 0)
+    FROM _branch_sums;
+
+    DROP TABLE _branch_sums;
+
+    -- Przedstawiciele: cztery tabele miesięczne (klucz bez oddziału)
+    DELETE FROM net_sales_representative_total t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+    DELETE FROM profit_representative_total t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+    DELETE FROM net_sales_representative_payd t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+    DELETE FROM profit_representative_payd t USING _dirty_reps d
+        WHERE t.year = d.year AND t.month = d.month AND t.representative_name = d.representative_name;
+
+    CREATE TEMP TABLE _rep_sums ON COMMIT DROP AS
+    SELECT tr.year, tr.month, tr.representative_name,
+           COALESCE(SUM(tr.net_value), 0) AS net_sales,
+           COALESCE(SUM(tr.profit), 0) AS profit,
+           COALESCE(SUM(tr.net_value) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS net_sales_paid,
+           COALESCE(SUM(tr.profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS profit_paid
+    FROM transactions tr
+    JOIN _dirty_reps d
+      ON tr.year = d.year AND tr.month = d.month AND tr.representative_name = d.representative_name
+    GROUP BY tr.year, tr.month, tr.representative_name;
+
+    INSERT INTO net_sales_representative_total (year, month, representative_name, net_sales)
+        SELECT year, month, representative_name, net_sales FROM _rep_sums;
+    INSERT INTO profit_representative_total (year, month, representative_name, profit)
+        SELECT year, month, representative_name, profit FROM _rep_sums;
+    INSERT INTO net_sales_representative_payd (year, month, representative_name, net_sales_paid)
+        SELECT year, month, representative_name, net_sales_paid FROM _rep_sums;
+    INSERT INTO profit_representative_payd (year, month, representative_name, profit_paid)
+        SELECT year, month, representative_name, profit_paid FROM _rep_sums;
+
+    DROP TABLE _rep_sums;
+
+    -- representative_aggregated_data: pełny klucz (rok, miesiąc, oddział, przedstawiciel)
+    DELETE FROM representative_aggregated_data t USING _dirty d
+        WHERE t.year = d.year AND t.month = d.month
+          AND t.branch_name = d.branch_name AND t.representative_name = d.representative_name
+          AND d.representative_name <> '';
+
+    INSERT INTO representative_aggregated_data (
+        year, month, branch_name, representative_name,
+        net_sales_total, net_sales_paid, profit_total, profit_paid,
+        sales_paid_percentage, profit_margin_percentage, paid_profit_margin_percentage,
+        rep_profit_total, rep_profit_payd
+    )
+    SELECT s.year, s.month, s.branch_name, s.representative_name,
+           s.net_sales, s.net_sales_paid, s.profit, s.profit_paid,
+           COALESCE(100.0 * s.net_sales_paid / NULLIF(s.net_sales, 0), 0),
+           COALESCE(100.0 * s.profit / NULLIF(s.net_sales, 0), 0),
+           COALESCE(100.0 * s.profit_paid / NULLIF(s.net_sales_paid, 0), 0),
+           s.rep_profit, s.rep_profit_paid
+    FROM (
+        SELECT tr.year, tr.month, tr.branch_name, tr.representative_name,
+               COALESCE(SUM(tr.net_value), 0) AS net_sales,
+               COALESCE(SUM(tr.profit), 0) AS profit,
+               COALESCE(SUM(tr.net_value) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS net_sales_paid,
+               COALESCE(SUM(tr.profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS profit_paid,
+               COALESCE(SUM(tr.rep_profit), 0) AS rep_profit,
+               COALESCE(SUM(tr.rep_profit) FILTER (WHERE tr.to_pay IS NULL OR tr.to_pay = 0), 0) AS rep_profit_paid
+        FROM transactions tr
+        JOIN _dirty d
+          ON tr.year = d.year AND tr.month = d.month
+         AND tr.branch_name = d.branch_name AND tr.representative_name = d.representative_name
+        WHERE d.representative_name <> ''
+        GROUP BY tr.year, tr.month, tr.branch_name, tr.representative_name
+    ) s;
+
+    DELETE FROM aggregate_dirty_claims c USING _dirty d
+        WHERE c.year = d.year AND c.month = d.month
+          AND c.branch_name = d.branch_name AND c.representative_name = d.representative_name;
+
+    RETURN claimed;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_mark_dirty_costs_insert ON all_costs;
+DROP TRIGGER IF EXISTS trg_mark_dirty_costs_update ON all_costs;
+DROP TRIGGER IF EXISTS trg_mark_dirty_costs_delete ON all_costs;
+DROP FUNCTION IF EXISTS mark_dirty_costs();
+
+COMMIT;
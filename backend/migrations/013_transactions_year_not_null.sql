@@ -0,0 +1,70 @@
+-- 013_transactions_year_not_null.sql
+--
+-- Klucz transactions po partycjonowaniu (005_partition_transactions.sql).
+--
+-- 1. year NOT NULL: unikalny indeks (id, year) nie chroni wierszy z year IS NULL.
+--    Brakujący rok/miesiąc jest uzupełniany z created_at (jak w ingest.py);
+--    wiersze bez year i created_at przerywają migrację.
+-- 2. Unikalność samego id: tabela partycjonowana nie może mieć indeksu
+--    unikalnego bez year, więc duplikat id (np. jawnie podany przy INSERT
+--    zamiast z sekwencji) odrzuca trigger na poziomie instrukcji. Sprawdzenie
+--    idzie po indeksie (id, year), po jednym zejściu na wstawiony wiersz.
+--    Nie chroni przed współbieżnymi wstawieniami - id nadaje tylko sekwencja
+--    (zob. 015_transactions_unique_id_scope.sql).
+--
+-- Migracja jest idempotentna - na bazie po nowej wersji 005 tylko dodaje trigger.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/013_transactions_year_not_null.sql
+
+BEGIN;
+
+LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE;
+
+UPDATE transactions SET
+    year = extract(year FROM created_at)::integer,
+    month = COALESCE(month, extract(month FROM created_at)::integer)
+WHERE year IS NULL AND created_at IS NOT NULL;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM transactions WHERE year IS NULL) THEN
+        RAISE EXCEPTION 'transactions: wiersze bez year i created_at - uzupełnij year przed migracją';
+    END IF;
+END;
+$$;
+
+ALTER TABLE transactions ALTER COLUMN year SET NOT NULL;
+
+CREATE OR REPLACE FUNCTION transactions_unique_id() RETURNS trigger AS $$
+DECLARE
+    duplicate integer;
+BEGIN
+    SELECT t.id INTO duplicate
+    FROM (SELECT DISTINCT id FROM new_rows) n
+    JOIN transactions t ON t.id = n.id
+    GROUP BY t.id
+    HAVING count(*) > 1
+    LIMIT 1;
+
+    IF duplicate IS NOT NULL THEN
+        RAISE EXCEPTION 'transactions: id % występuje więcej niż raz', duplicate
+            USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transactions_unique_id_insert ON transactions;
+DROP TRIGGER IF EXISTS trg_transactions_unique_id_update ON transactions;
+
+CREATE TRIGGER trg_transactions_unique_id_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transactions_unique_id();
+
+CREATE TRIGGER trg_transactions_unique_id_update
+    AFTER UPDATE ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transactions_unique_id();
+
+COMMIT;
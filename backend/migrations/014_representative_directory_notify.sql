@@ -0,0 +1,54 @@
+-- 014_representative_directory_notify.sql
+--
+-- Powiadomienie o zmianie słownika przedstawicieli (representative_directory).
+--
+-- Workery API trzymają słownik w pamięci (rep_directory.py). Jawne
+-- invalidate_rep_directory() czyści tylko kopię workera, który obsłużył zapis;
+-- pozostałe czekały na REP_DIRECTORY_TTL_SECONDS. Teraz każda instrukcja, która
+-- faktycznie zmieniła wiersze słownika (triggery z migracji 007, przebudowa
+-- rebuild_representative_directory(), zmiany spoza API), wysyła
+-- NOTIFY representative_directory; workery nasłuchują kanału (notifications.py).
+--
+-- Upsert ze sprzedaży bez zmian (typowy import znanych przedstawicieli) nie
+-- zmienia wierszy - tabela przejściowa jest pusta i powiadomienie nie jest wysyłane.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/014_representative_directory_notify.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION representative_directory_notify() RETURNS trigger AS $$
+BEGIN
+    -- TRUNCATE nie ma tabeli przejściowej; plpgsql planuje zapytanie dopiero przy wykonaniu
+    IF TG_OP = 'TRUNCATE' OR EXISTS (SELECT 1 FROM changed_rows) THEN
+        -- Powiadomienie dociera do słuchaczy dopiero po COMMIT
+        PERFORM pg_notify('representative_directory', '');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_representative_directory_notify_insert ON representative_directory;
+DROP TRIGGER IF EXISTS trg_representative_directory_notify_update ON representative_directory;
+DROP TRIGGER IF EXISTS trg_representative_directory_notify_delete ON representative_directory;
+DROP TRIGGER IF EXISTS trg_representative_directory_notify_truncate ON representative_directory;
+
+CREATE TRIGGER trg_representative_directory_notify_insert
+    AFTER INSERT ON representative_directory
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_notify();
+
+CREATE TRIGGER trg_representative_directory_notify_update
+    AFTER UPDATE ON representative_directory
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_notify();
+
+CREATE TRIGGER trg_representative_directory_notify_delete
+    AFTER DELETE ON representative_directory
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_notify();
+
+CREATE TRIGGER trg_representative_directory_notify_truncate
+    AFTER TRUNCATE ON representative_directory
+    FOR EACH STATEMENT EXECUTE FUNCTION representative_directory_notify();
+
+COMMIT;
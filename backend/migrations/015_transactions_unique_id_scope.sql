@@ -0,0 +1,59 @@
+-- 015_transactions_unique_id_scope.sql
+--
+-- Zakres triggera unikalności id w transactions (013_transactions_year_not_null.sql).
+--
+-- Id transakcji nadaje wyłącznie sekwencja (pg_get_serial_sequence('transactions', 'id')).
+-- Ani API, ani import (ingest.py, INGEST_COLUMNS bez id) nie podają id jawnie
+-- i nowy kod też nie może tego robić. Trigger jest zabezpieczeniem przed pomyłką
+-- w obrębie jednej transakcji, nie zamiennikiem klucza głównego: dwie
+-- współbieżne transakcje wstawiające ten sam jawny id nie widzą nawzajem
+-- niezatwierdzonych wierszy i obie przechodzą sprawdzenie. Blokady doradcze
+-- per id dałyby tu pewność, ale import wstawia dziesiątki tysięcy wierszy na
+-- instrukcję, a każda taka blokada zajmuje miejsce we wspólnej tablicy blokad.
+--
+-- Koszt: sprawdzenie schodzi po indeksie (id, year) każdej partycji dla
+-- każdego wstawionego id. Przy UPDATE sprawdzane są teraz tylko wiersze,
+-- którym zmienił się id - upsert importu (ON CONFLICT DO UPDATE) id nie
+-- zmienia, więc nie kosztuje żadnego zejścia po indeksie.
+--
+-- Uruchomienie: psql "$DATABASE_URL" -f backend/migrations/015_transactions_unique_id_scope.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION transactions_unique_id() RETURNS trigger AS $$
+DECLARE
+    duplicate integer;
+BEGIN
+    -- plpgsql planuje zapytanie dopiero przy wykonaniu - przy INSERT nie ma old_rows
+    IF TG_OP = 'UPDATE' THEN
+        SELECT t.id INTO duplicate
+        FROM (SELECT id FROM new_rows EXCEPT SELECT id FROM old_rows) n
+        JOIN transactions t ON t.id = n.id
+        GROUP BY t.id
+        HAVING count(*) > 1
+        LIMIT 1;
+    ELSE
+        SELECT t.id INTO duplicate
+        FROM (SELECT DISTINCT id FROM new_rows) n
+        JOIN transactions t ON t.id = n.id
+        GROUP BY t.id
+        HAVING count(*) > 1
+        LIMIT 1;
+    END IF;
+
+    IF duplicate IS NOT NULL THEN
+        RAISE EXCEPTION 'transactions: id % występuje więcej niż raz', duplicate
+            USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transactions_unique_id_update ON transactions;
+
+CREATE TRIGGER trg_transactions_unique_id_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transactions_unique_id();
+
+COMMIT;
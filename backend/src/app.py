@@ -6,7 +6,21 @@ from routes.costs import router as costs_router
 from routes.costs_raw import router as costs_raw_router
 from routes.users import router as users_router
 from routes.representatives import router as users_representatives
-from database import test_db_connection
+from database import (
+    get_pool_status, warm_sync_pool, warm_async_pool, engine, async_engine, read_engine, async_read_engine,
+    DB_THREADPOOL_SIZE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW,
+    DB_POOL_WARMUP,
+)
+from cache import bump_aggregate_version
+from responses import FastJSONResponse
+import health
+import notifications
+import refresh_jobs
+import serve
+from metrics import track_requests, metrics_response, mark_process_dead
+from query_stats import instrument_engine
+import anyio.to_thread
+import asyncio
 import logging
 import os
 
@@ -17,7 +31,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="MatPoz CRM API")
+# orjson jako domyślny serializer (Decimal, daty, wiersze SQLAlchemy) - responses.py
+app = FastAPI(title="MatPoz CRM API", default_response_class=FastJSONResponse)
+
+# Liczniki zapytań SQL na potrzeby metryk, Server-Timing i measure_timings
+for _engine in (engine, async_engine, read_engine, async_read_engine):
+    if _engine is not None:
+        instrument_engine(_engine)
 
 # Konfiguracja CORS - rozszerzona lista origins
 origins = [
@@ -50,26 +70,53 @@ app.add_middleware(
 )
 
 
-# Health check endpoint
+# Liveness - tylko proces, bez bazy (Docker HEALTHCHECK)
+@app.get("/livez", include_in_schema=False)
+async def livez():
+    return {"status": "ok"}
+
+
+# Readiness - wynik ostatniej sondy bazy z zadania w tle (load balancer)
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    ready = health.state.is_ready()
+    return JSONResponse(
+        content={"status": "ok" if ready else "error", **health.state.as_dict()},
+        status_code=200 if ready else 503
+    )
+
+
+# Health check endpoint - zgodny wstecznie, również z wyniku sondy w tle
 @app.get("/health")
 async def health_check():
-    try:
-        # Sprawdzamy połączenie z bazą danych
-        db_status = test_db_connection()
-        return JSONResponse(
-            content={
-                "status": "ok" if db_status else "error",
-                "version": "dupa_zupa",
-                "database": "connected" if db_status else "disconnected"
-            },
-            status_code=200 if db_status else 500
-        )
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return JSONResponse(
-            content={"status": "error", "detail": str(e)},
-            status_code=500
-        )
+    db_status = health.state.is_ready()
+    return JSONResponse(
+        content={
+            "status": "ok" if db_status else "error",
+            "version": "dupa_zupa",
+            "database": "connected" if db_status else "disconnected"
+        },
+        status_code=200 if db_status else 500
+    )
+
+
+# Stan puli połączeń z bazą - endpoint wewnętrzny (poza dokumentacją OpenAPI)
+@app.get("/internal/pool", include_in_schema=False)
+async def pool_status():
+    return get_pool_status()
+
+
+# Metryki w formacie Prometheus
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+# Unieważnienie cache agregatów - wywoływane po dziennym przebiegu Lambdy
+@app.post("/internal/cache/invalidate", include_in_schema=False)
+def invalidate_cache():
+    bump_aggregate_version()
+    return {"ok": True}
 
 
 # Event handlers
@@ -78,12 +125,30 @@ async def startup_event():
     logger.info("Starting MatPoz CRM API")
     logger.info("Environment: %s", os.getenv("ENV", "development"))
 
-    # Test database connection during startup
+    # Endpointy synchroniczne działają w puli wątków AnyIO - dopasowujemy jej
+    # rozmiar do puli połączeń, żeby wątki nie czekały bezczynnie na połączenie
+    anyio.to_thread.current_default_thread_limiter().total_tokens = DB_THREADPOOL_SIZE
+    logger.info("Thread limiter: %d tokens", DB_THREADPOOL_SIZE)
+    logger.info(
+        "Worker %d DB pools: sync %d+%d, async %d+%d, extra %d "
+        "(health probe, LISTEN, refresh runner; max %d connections)",
+        os.getpid(), DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW,
+        serve.EXTRA_CONNECTIONS,
+        DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW + serve.EXTRA_CONNECTIONS
+    )
+
+    # Test database connection during startup - pierwsza sonda, potem cyklicznie w tle
     logger.info("Testing database connection...")
-    if test_db_connection():
+    if await health.probe_once():
         logger.info("✅ Successfully connected to the database")
     else:
-        logger.error("❌ Failed to connect to the database")
+        logger.error("❌ Failed to connect to the database - waiting for the first successful probe")
+    health.start_probe()
+    # LISTEN na kanałach unieważniających cache procesu (np. nowy rok w transactions);
+    # _listen_loop sam ponawia połączenie, więc startuje niezależnie od stanu bazy
+    notifications.start_listener()
+    # Rozgrzanie pul i zadania pozostawione w kolejce - gdy baza pierwszy raz odpowie
+    app.state.database_ready_task = asyncio.create_task(on_database_ready())
 
     logger.info("Registered routes:")
     for route in app.routes:
@@ -94,9 +159,46 @@ async def startup_event():
         logger.info(f"  {origin}")
 
 
+async def warm_pools():
+    """Otwiera stałą część obu pul od razu, zamiast przy pierwszych żądaniach."""
+    try:
+        sync_count = await anyio.to_thread.run_sync(warm_sync_pool)
+        async_count = await warm_async_pool()
+        logger.info(f"Rozgrzano pule połączeń: sync {sync_count}, async {async_count}")
+    except Exception as e:
+        logger.error(f"Nie udało się rozgrzać puli połączeń: {str(e)}")
+
+
+async def on_database_ready():
+    await health.wait_ready()
+    if DB_POOL_WARMUP:
+        await warm_pools()
+    # Zadania odświeżania pozostawione w kolejce przez zatrzymany proces
+    await resume_refresh_jobs()
+
+
+async def resume_refresh_jobs():
+    # Partycje bieżącego i następnego roku niezależnie od tego, czy runner dostanie blokadę
+    try:
+        await anyio.to_thread.run_sync(refresh_jobs.ensure_partitions_now)
+    except Exception as e:
+        logger.error(f"Nie udało się utworzyć partycji transactions: {str(e)}")
+    try:
+        await anyio.to_thread.run_sync(refresh_jobs.run_pending)
+    except Exception as e:
+        logger.error(f"Nie udało się wznowić zadań odświeżania agregatów: {str(e)}")
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down MatPoz CRM API")
+    # Zadanie startowe może jeszcze czekać na bazę
+    ready_task = getattr(app.state, "database_ready_task", None)
+    if ready_task is not None and not ready_task.done():
+        ready_task.cancel()
+    await health.stop_probe()
+    await notifications.stop_listener()
+    mark_process_dead()
 
 
 # Middleware do logowania żądań i obsługi błędów
@@ -116,6 +218,10 @@ async def log_requests(request, call_next):
         )
 
 
+# Metryki żądań (liczba, czas, rozmiar, Server-Timing) - najbardziej zewnętrzny middleware
+app.middleware("http")(track_requests)
+
+
 # Error handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
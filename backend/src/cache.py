@@ -0,0 +1,234 @@
+# cache.py
+"""
+Cache odpowiedzi endpointów analitycznych w Redis.
+
+Endpointy dashboardu czytają tabele agregatów, które zmieniają się tylko po
+zadaniu odświeżania (refresh_jobs.py) albo po dziennym przebiegu Lambdy. Klucz
+cache składa się z nazwy endpointu, znormalizowanych parametrów zapytania i wersji agregatów -
+podbicie wersji (bump_aggregate_version) unieważnia wszystkie wpisy naraz.
+Wartości zależne od all_costs (sumy listy kosztów) mają osobną wersję,
+podbijaną przy każdym zapisie kosztu (bump_costs_version).
+
+Endpointy async korzystają z klienta redis.asyncio (get_cached_value,
+set_cached_value, bump_costs_version), żeby nie blokować pętli zdarzeń.
+
+Brak Redisa (brak REDIS_URL albo błąd połączenia) nie psuje API - endpoint
+wykonuje się wtedy normalnie, bez cache.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import time
+
+from fastapi import Response
+
+from responses import dumps
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - redis jest w requirements.txt
+    redis = None
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "crm")
+# Zabezpieczenie na wypadek pominiętego unieważnienia (np. zmiana danych poza API)
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))
+# Po błędzie połączenia nie próbujemy ponownie przez ten czas
+CACHE_RETRY_SECONDS = float(os.getenv("CACHE_RETRY_SECONDS", "30"))
+
+VERSION_KEY = f"{CACHE_PREFIX}:aggregate_version"
+COSTS_VERSION_KEY = f"{CACHE_PREFIX}:costs_version"
+
+_client = None
+_async_client = None
+_disabled_until = 0.0
+
+
+def _get_client():
+    """Zwraca klienta Redis albo None, jeśli cache jest niedostępny."""
+    global _client
+    if redis is None or not REDIS_URL:
+        return None
+    if time.monotonic() < _disabled_until:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(
+            REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+            health_check_interval=30,
+        )
+    return _client
+
+
+def _get_async_client():
+    """Klient redis.asyncio dla endpointów async albo None, jeśli cache jest niedostępny."""
+    global _async_client
+    if aioredis is None or not REDIS_URL:
+        return None
+    if time.monotonic() < _disabled_until:
+        return None
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(
+            REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+            health_check_interval=30,
+        )
+    return _async_client
+
+
+def _mark_unavailable(e: Exception):
+    global _disabled_until
+    _disabled_until = time.monotonic() + CACHE_RETRY_SECONDS
+    logger.warning(f"Redis niedostępny, cache wyłączony na {CACHE_RETRY_SECONDS:.0f}s: {str(e)}")
+
+
+def get_aggregate_version(client=None, version_key: str = VERSION_KEY) -> int:
+    client = client or _get_client()
+    if client is None:
+        return 0
+    return int(client.get(version_key) or 0)
+
+
+def bump_aggregate_version():
+    """Unieważnia wszystkie odpowiedzi zależne od agregatów."""
+    client = _get_client()
+    if client is None:
+        return
+    try:
+        version = client.incr(VERSION_KEY)
+        logger.info(f"Wersja agregatów podbita do {version}")
+    except Exception as e:
+        _mark_unavailable(e)
+
+
+async def bump_costs_version():
+    """Unieważnia wartości zależne od all_costs - wywoływane po zapisie kosztu."""
+    client = _get_async_client()
+    if client is None:
+        return
+    try:
+        await client.incr(COSTS_VERSION_KEY)
+    except Exception as e:
+        _mark_unavailable(e)
+
+
+def make_key(endpoint: str, params: dict, version: int) -> str:
+    # Pomijamy parametry puste, żeby ?year= i brak parametru dawały ten sam klucz
+    normalized = {k: v for k, v in sorted(params.items()) if v is not None}
+    digest = hashlib.sha1(
+        json.dumps(normalized, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"{CACHE_PREFIX}:v{version}:{endpoint}:{digest}"
+
+
+def cached_value(endpoint: str, params: dict, compute, ttl: int = CACHE_TTL_SECONDS,
+                 version_key: str = VERSION_KEY):
+    """
+    Wartość (JSON) pod kluczem z nazwy i parametrów - np. liczność wyniku dla
+    zestawu filtrów. Bez Redisa po prostu wywołuje compute().
+    """
+    client = _get_client()
+    if client is None:
+        return compute()
+    try:
+        key = make_key(endpoint, params, get_aggregate_version(client, version_key))
+        cached = client.get(key)
+    except Exception as e:
+        _mark_unavailable(e)
+        return compute()
+    if cached is not None:
+        return json.loads(cached)
+
+    value = compute()
+    try:
+        client.set(key, dumps(value), ex=ttl)
+    except Exception as e:
+        _mark_unavailable(e)
+    return value
+
+
+async def get_cached_value(endpoint: str, params: dict, version_key: str = VERSION_KEY):
+    """
+    Odczyt wartości zapisanej przez set_cached_value (None przy braku) - dla
+    endpointów async, w których wartość liczy się w tym samym zapytaniu co
+    reszta odpowiedzi. Zwraca też klucz do zapisu.
+    """
+    client = _get_async_client()
+    if client is None:
+        return None, None
+    try:
+        key = make_key(endpoint, params, int(await client.get(version_key) or 0))
+        cached = await client.get(key)
+    except Exception as e:
+        _mark_unavailable(e)
+        return None, None
+    return (json.loads(cached) if cached is not None else None), key
+
+
+async def set_cached_value(key, value, ttl: int = CACHE_TTL_SECONDS):
+    client = _get_async_client()
+    if client is None or key is None:
+        return
+    try:
+        await client.set(key, dumps(value), ex=ttl)
+    except Exception as e:
+        _mark_unavailable(e)
+
+
+def cached_response(endpoint: str, ttl: int = CACHE_TTL_SECONDS, exclude: tuple = ("db",)):
+    """
+    Dekorator dla synchronicznych endpointów zwracających dict.
+
+    Trafienie w cache zwraca gotowy JSON bez ponownej serializacji. Żądania z
+    measure_timings=true oraz odpowiedzi z flagą "error" omijają cache.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if kwargs.get("measure_timings"):
+                return func(*args, **kwargs)
+
+            client = _get_client()
+            if client is None:
+                return func(*args, **kwargs)
+
+            params = {k: v for k, v in kwargs.items() if k not in exclude}
+            try:
+                key = make_key(endpoint, params, get_aggregate_version(client))
+                cached = client.get(key)
+            except Exception as e:
+                _mark_unavailable(e)
+                return func(*args, **kwargs)
+
+            if cached is not None:
+                return Response(content=cached, media_type="application/json",
+                                headers={"X-Cache": "HIT"})
+
+            result = func(*args, **kwargs)
+            if isinstance(result, Response):
+                # Endpoint zwrócił gotową odpowiedź (json_response) - zapisujemy jej treść
+                if result.status_code != 200:
+                    return result
+                body = result.body
+            elif isinstance(result, dict) and result.get("error"):
+                return result
+            else:
+                body = dumps(result)
+
+            try:
+                client.set(key, body, ex=ttl)
+            except Exception as e:
+                _mark_unavailable(e)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,64 @@
+# config_cache.py
+"""
+Współdzielony cache procesu dla wiersza config_current_date (id = 1).
+
+Data konfiguracyjna zmienia się raz dziennie, a czyta ją prawie każde żądanie.
+Wartość trzymamy w pamięci (process_cache.py) przez CONFIG_DATE_TTL_SECONDS;
+update_config_date i zadania odświeżania (refresh_jobs.py) unieważniają ją jawnie.
+Pozostałe workery zobaczą nową datę najpóźniej po upływie TTL.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.transaction import ConfigCurrentDate
+from process_cache import ProcessCache
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DATE_TTL_SECONDS = float(os.getenv("CONFIG_DATE_TTL_SECONDS", "300"))
+
+
+@dataclass(frozen=True)
+class ConfigDate:
+    """Niemutowalna kopia wiersza config_current_date - bezpieczna poza sesją."""
+    config_date: date
+    year_value: Optional[int]
+    month_value: Optional[int]
+    day_value: Optional[int]
+
+
+_cache: ProcessCache[ConfigDate] = ProcessCache("daty konfiguracyjnej", CONFIG_DATE_TTL_SECONDS)
+
+
+def _from_row(row: Optional[ConfigCurrentDate]) -> Optional[ConfigDate]:
+    if row is None:
+        # Brak konfiguracji nie jest cache'owany - wiersz może zaraz powstać
+        return None
+    return ConfigDate(
+        config_date=row.config_date,
+        year_value=row.year_value,
+        month_value=row.month_value,
+        day_value=row.day_value,
+    )
+
+
+def get_config_date(db: Session) -> Optional[ConfigDate]:
+    """Bieżąca data konfiguracyjna (sesja synchroniczna)."""
+    return _cache.get(lambda: _from_row(db.get(ConfigCurrentDate, 1)))
+
+
+async def get_config_date_async(db: AsyncSession) -> Optional[ConfigDate]:
+    """Bieżąca data konfiguracyjna (AsyncSession)."""
+    async def load():
+        return _from_row(await db.get(ConfigCurrentDate, 1))
+    return await _cache.get_async(load)
+
+
+def invalidate_config_date():
+    _cache.invalidate()
@@ -0,0 +1,62 @@
+# cost_kind_cache.py
+"""
+Cache procesu dla słownika rodzajów kosztów (cost_kinds).
+
+Słownik ma kilkadziesiąt wierszy, a czyta go każdy zapis kosztu (walidacja
+cost_kind) i każde otwarcie formularza (GET /cost_kinds). Trzymamy go w pamięci
+(process_cache.py); endpointy CRUD rodzajów kosztów unieważniają go od razu
+w swoim workerze, a trigger na cost_kinds wysyła NOTIFY cost_kinds, na który pozostałe workery
+unieważniają swoje kopie (migrations/011_cost_kinds_notify.sql, notifications.py).
+COST_KINDS_TTL_SECONDS jest tylko zabezpieczeniem na wypadek utraconego powiadomienia.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from typing import FrozenSet, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.transaction import CostKind
+from process_cache import ProcessCache
+
+logger = logging.getLogger(__name__)
+
+COST_KINDS_TTL_SECONDS = float(os.getenv("COST_KINDS_TTL_SECONDS", "3600"))
+COST_KINDS_CHANNEL = "cost_kinds"
+
+
+@dataclass(frozen=True)
+class CostKindEntry:
+    """Niemutowalna kopia wiersza cost_kinds - bezpieczna poza sesją."""
+    id: int
+    kind: str
+
+
+@dataclass(frozen=True)
+class CostKinds:
+    entries: Tuple[CostKindEntry, ...]  # posortowane po nazwie
+    names: FrozenSet[str]
+
+    def by_id(self, cost_kind_id: int) -> Optional[CostKindEntry]:
+        return next((entry for entry in self.entries if entry.id == cost_kind_id), None)
+
+
+_cache: ProcessCache[CostKinds] = ProcessCache(
+    "rodzajów kosztów", COST_KINDS_TTL_SECONDS, channel=COST_KINDS_CHANNEL
+)
+
+
+async def get_cost_kinds_async(db: AsyncSession) -> CostKinds:
+    """Wszystkie rodzaje kosztów (AsyncSession)."""
+    async def load():
+        rows = (await db.execute(select(CostKind.id, CostKind.kind).order_by(CostKind.kind))).all()
+        return CostKinds(
+            entries=tuple(CostKindEntry(id=row.id, kind=row.kind) for row in rows),
+            names=frozenset(row.kind for row in rows),
+        )
+    return await _cache.get_async(load)
+
+
+def invalidate_cost_kinds(payload: Optional[str] = None):
+    _cache.invalidate(payload)
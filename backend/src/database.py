@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 import os
+import re
+import threading
+import time
 from pathlib import Path
 
 # Poprawiona ścieżka do pliku .env - idziemy jeden katalog wyżej
@@ -43,13 +49,210 @@ if not all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
 
 # Tworzenie URL do bazy danych
 SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Ten sam serwer dla ścieżki asynchronicznej (sterownik asyncpg)
+SQLALCHEMY_ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Parametry puli połączeń - sterowane zmiennymi środowiskowymi
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # sekundy, -1 = bez recyklingu
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = bez limitu
+
+# Osobna pula dla endpointów async def (AsyncSession) - domyślnie jak pula synchroniczna
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+
+# Limit wątków AnyIO dla endpointów synchronicznych (def) - domyślnie tyle,
+# ile połączeń może wydać pula; więcej wątków i tak czekałoby na połączenie.
+DB_THREADPOOL_SIZE = int(os.getenv("DB_THREADPOOL_SIZE", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+# Otwieranie pool_size połączeń przy starcie workera
+DB_POOL_WARMUP = _env_bool("DB_POOL_WARMUP", True)
+
+# Opcjonalna replika do odczytu (raporty, dashboardy). Bez DB_READ_HOST
+# zależności odczytowe korzystają z serwera głównego.
+DB_READ_HOST = os.getenv("DB_READ_HOST")
+DB_READ_PORT = os.getenv("DB_READ_PORT", DB_PORT)
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+# Po zapisie w tym procesie czytamy z serwera głównego przez tyle sekund.
+# Tylko w obrębie procesu (workera): zapis obsłużony przez inny worker nie
+# przełącza odczytów tutaj - kolejne żądanie klienta może trafić na replikę
+# opóźnioną najwyżej o DB_READ_MAX_LAG_SECONDS.
+DB_READ_AFTER_WRITE_SECONDS = float(os.getenv("DB_READ_AFTER_WRITE_SECONDS", "5"))
+# Replika opóźniona bardziej niż o tyle sekund jest pomijana
+DB_READ_MAX_LAG_SECONDS = float(os.getenv("DB_READ_MAX_LAG_SECONDS", "10"))
+DB_READ_LAG_CHECK_INTERVAL = float(os.getenv("DB_READ_LAG_CHECK_INTERVAL", "5"))
+
+
+class PoolStats:
+    """
+    Liczniki puli połączeń: histogram czasu oczekiwania na połączenie
+    (checkout) oraz liczba timeoutów. Bezpieczne wątkowo.
+    """
+
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bucket_counts = [0] * (len(self.WAIT_BUCKETS) + 1)
+        self.checkouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for i, bound in enumerate(self.WAIT_BUCKETS):
+                if seconds <= bound:
+                    self._bucket_counts[i] += 1
+                    break
+            else:
+                self._bucket_counts[-1] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            # Histogram kumulatywny (jak w Prometheusie): liczba checkoutów <= le
+            buckets = {}
+            running = 0
+            for bound, count in zip(self.WAIT_BUCKETS, self._bucket_counts):
+                running += count
+                buckets[str(bound)] = running
+            buckets["+Inf"] = running + self._bucket_counts[-1]
+            return {
+                "checkouts": self.checkouts,
+                "wait_seconds_sum": round(self.wait_sum, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+                "wait_seconds_buckets": buckets,
+                "timeouts": self.timeouts,
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Mierzy czas wydania połączenia z puli i zlicza timeouty (stats w podklasie)."""
+
+    stats: PoolStats
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.observe(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    stats = PoolStats()
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+class InstrumentedReadQueuePool(_InstrumentedPoolMixin, QueuePool):
+    stats = PoolStats()
+
+
+class InstrumentedAsyncReadQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+def _connect_args() -> dict:
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return {}
+
+
+def _async_connect_args() -> dict:
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {}
+
 
 # Tworzenie silnika SQLAlchemy
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=_connect_args(),
+)
+
+# Silnik asynchroniczny - endpointy async def nie blokują pętli zdarzeń
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=DB_ASYNC_POOL_SIZE,
+    max_overflow=DB_ASYNC_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=_async_connect_args(),
+)
+
+# Silniki repliki - tylko gdy skonfigurowano DB_READ_HOST
+read_engine = None
+async_read_engine = None
+if DB_READ_HOST:
+    read_engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_READ_HOST}:{DB_READ_PORT}/{DB_NAME}",
+        poolclass=InstrumentedReadQueuePool,
+        pool_size=DB_READ_POOL_SIZE,
+        max_overflow=DB_READ_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+    async_read_engine = create_async_engine(
+        f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_READ_HOST}:{DB_READ_PORT}/{DB_NAME}",
+        poolclass=InstrumentedAsyncReadQueuePool,
+        pool_size=DB_READ_POOL_SIZE,
+        max_overflow=DB_READ_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=_async_connect_args(),
+    )
 
 # Tworzenie klasy SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sesje asynchroniczne; expire_on_commit=False, bo obiekty są zwracane po commit
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Sesje odczytowe na replice (bez repliki - te same co na serwerze głównym)
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else SessionLocal
+)
+AsyncReadSessionLocal = (
+    async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+    if async_read_engine else AsyncSessionLocal
+)
+
 # Tworzenie klasy Base
 Base = declarative_base()
 
@@ -61,6 +264,189 @@ def get_db():
     finally:
         db.close()
 
+# Zależność dla endpointów async def - sesja na puli asyncpg
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+class ReplicaRouting:
+    """
+    Decyzja, czy odczyt może iść na replikę: nie zaraz po zapisie w tym procesie
+    (read-your-writes) i nie, gdy replika jest opóźniona ponad DB_READ_MAX_LAG_SECONDS.
+
+    Zapisy przez engine/async_engine są wykrywane zdarzeniami SQLAlchemy. Ścieżki
+    poza nimi - import przez raw_connection (ingest.py), runner odświeżania
+    (refresh_jobs.runner_engine) i funkcje bazy wywoływane przez SELECT - wołają
+    mark_write() jawnie po commicie. Stan jest per proces, nie współdzielony
+    między workerami serve.py.
+    """
+
+    LAG_QUERY = text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_write_at = 0.0
+        self.lag_seconds = None
+        self.lag_checked_at = 0.0
+        self.lag_ok = True
+
+    def mark_write(self):
+        with self._lock:
+            self.last_write_at = time.monotonic()
+
+    def lag_check_due(self) -> bool:
+        return time.monotonic() - self.lag_checked_at >= DB_READ_LAG_CHECK_INTERVAL
+
+    def record_lag(self, lag_seconds):
+        with self._lock:
+            self.lag_checked_at = time.monotonic()
+            self.lag_seconds = lag_seconds
+            # Błąd sprawdzenia (None) traktujemy jak niedostępną replikę
+            self.lag_ok = lag_seconds is not None and lag_seconds <= DB_READ_MAX_LAG_SECONDS
+
+    def replica_allowed(self) -> bool:
+        if time.monotonic() - self.last_write_at < DB_READ_AFTER_WRITE_SECONDS:
+            return False
+        return self.lag_ok
+
+    def snapshot(self) -> dict:
+        return {
+            "configured": read_engine is not None,
+            "lag_seconds": self.lag_seconds,
+            "lag_ok": self.lag_ok,
+            "seconds_since_write": round(time.monotonic() - self.last_write_at, 3) if self.last_write_at else None,
+        }
+
+
+replica_routing = ReplicaRouting()
+
+
+_READ_ONLY_PREFIXES = ("SELECT", "SHOW", "SET", "WITH")
+# CTE modyfikujące dane (WITH ... INSERT/UPDATE/DELETE) to zapis mimo prefiksu WITH
+_DATA_MODIFYING_CTE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def _is_write(statement: str) -> bool:
+    head = statement.lstrip()[:8].upper()
+    if not head.startswith(_READ_ONLY_PREFIXES):
+        return True
+    return head.startswith("WITH") and _DATA_MODIFYING_CTE.search(statement) is not None
+
+
+def _after_cursor_execute_write_check(conn, cursor, statement, parameters, context, executemany):
+    if _is_write(statement):
+        conn.info["pending_write"] = True
+
+
+def _on_commit(conn):
+    if conn.info.pop("pending_write", False):
+        replica_routing.mark_write()
+
+
+def _on_rollback(conn):
+    conn.info.pop("pending_write", None)
+
+
+# Zapisy na serwerze głównym (obie ścieżki) kierują kolejne odczyty na serwer główny
+for _primary in (engine, async_engine.sync_engine):
+    event.listen(_primary, "after_cursor_execute", _after_cursor_execute_write_check)
+    event.listen(_primary, "commit", _on_commit)
+    event.listen(_primary, "rollback", _on_rollback)
+
+
+def _use_replica() -> bool:
+    if read_engine is None:
+        return False
+    if replica_routing.lag_check_due():
+        try:
+            with read_engine.connect() as conn:
+                replica_routing.record_lag(float(conn.execute(ReplicaRouting.LAG_QUERY).scalar()))
+        except Exception:
+            replica_routing.record_lag(None)
+    return replica_routing.replica_allowed()
+
+
+async def _use_async_replica() -> bool:
+    if async_read_engine is None:
+        return False
+    if replica_routing.lag_check_due():
+        try:
+            async with async_read_engine.connect() as conn:
+                replica_routing.record_lag(float((await conn.execute(ReplicaRouting.LAG_QUERY)).scalar()))
+        except Exception:
+            replica_routing.record_lag(None)
+    return replica_routing.replica_allowed()
+
+
+# Zależność dla endpointów tylko do odczytu (GET) - replika, jeśli dostępna i aktualna
+def get_read_db():
+    db = ReadSessionLocal() if _use_replica() else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Wersja get_read_db dla endpointów async def
+async def get_async_read_db():
+    session_factory = AsyncReadSessionLocal if await _use_async_replica() else AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
+
+def warm_sync_pool() -> int:
+    """Otwiera z góry DB_POOL_SIZE połączeń, żeby pierwsze żądania nie płaciły za connect."""
+    connections = []
+    try:
+        for _ in range(DB_POOL_SIZE):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+async def warm_async_pool() -> int:
+    """Jak warm_sync_pool, dla puli asyncpg."""
+    connections = []
+    try:
+        for _ in range(DB_ASYNC_POOL_SIZE):
+            connections.append(await async_engine.connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+    return len(connections)
+
+def _pool_snapshot(pool, max_overflow: int) -> dict:
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        **pool.stats.snapshot(),
+    }
+
+
+def get_pool_status() -> dict:
+    """Bieżący stan pul połączeń (do endpointu wewnętrznego)."""
+    return {
+        "sync": _pool_snapshot(engine.pool, DB_MAX_OVERFLOW),
+        "async": _pool_snapshot(async_engine.pool, DB_ASYNC_MAX_OVERFLOW),
+        "timeout_seconds": DB_POOL_TIMEOUT,
+        "recycle_seconds": DB_POOL_RECYCLE,
+        "pre_ping": DB_POOL_PRE_PING,
+        "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+        "threadpool_size": DB_THREADPOOL_SIZE,
+        "read": _pool_snapshot(read_engine.pool, DB_READ_MAX_OVERFLOW) if read_engine else None,
+        "async_read": _pool_snapshot(async_read_engine.pool, DB_READ_MAX_OVERFLOW) if async_read_engine else None,
+        "replica": replica_routing.snapshot(),
+    }
+
+
 # Funkcja testująca połączenie z bazą danych
 def test_db_connection():
     try:
@@ -0,0 +1,114 @@
+# health.py
+"""
+Sondy zdrowia aplikacji.
+
+/livez sprawdza tylko, czy proces obsługuje pętlę zdarzeń. /readyz i /health
+zwracają wynik ostatniej sondy bazy - sondę co HEALTH_PROBE_INTERVAL sekund
+wykonuje zadanie w tle na osobnym, jednopołączeniowym silniku, więc ruch
+z load balancera i Dockera nie zajmuje połączeń z głównej puli ani wątków.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import SQLALCHEMY_ASYNC_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+# Wynik starszy niż to (np. zawieszone zadanie sondy) traktujemy jak błąd
+HEALTH_STALE_AFTER = float(os.getenv("HEALTH_STALE_AFTER", str(HEALTH_PROBE_INTERVAL * 3)))
+
+# Osobny silnik sondy: jedno połączenie, bez overflow - nie konkuruje z pulą API
+probe_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    pool_size=1,
+    max_overflow=0,
+    pool_recycle=1800,
+    connect_args={"timeout": HEALTH_PROBE_TIMEOUT},
+)
+
+
+class ProbeResult:
+    def __init__(self):
+        self.ok = False
+        self.checked_at: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def is_ready(self) -> bool:
+        if not self.ok or self.checked_at is None:
+            return False
+        return time.monotonic() - self.checked_at <= HEALTH_STALE_AFTER
+
+    def as_dict(self) -> dict:
+        age = None if self.checked_at is None else round(time.monotonic() - self.checked_at, 3)
+        return {
+            "database": "connected" if self.is_ready() else "disconnected",
+            "checked_seconds_ago": age,
+            "latency_ms": self.latency_ms,
+            "error": self.error,
+        }
+
+
+state = ProbeResult()
+_task: Optional[asyncio.Task] = None
+# Ustawiane przy pierwszej udanej sondzie - zadania startowe czekają na bazę
+_first_ready = asyncio.Event()
+
+
+async def probe_once() -> bool:
+    """Jednorazowy SELECT 1 na silniku sondy; aktualizuje współdzielony wynik."""
+    start = time.perf_counter()
+    try:
+        async with asyncio.timeout(HEALTH_PROBE_TIMEOUT):
+            async with probe_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        if not state.ok:
+            logger.info("Sonda bazy danych: połączenie dostępne")
+        state.ok = True
+        state.error = None
+        _first_ready.set()
+    except Exception as e:
+        if state.ok or state.checked_at is None:
+            logger.error(f"Sonda bazy danych nie powiodła się: {str(e)}")
+        state.ok = False
+        state.error = str(e) or type(e).__name__
+    state.latency_ms = round((time.perf_counter() - start) * 1000, 2)
+    state.checked_at = time.monotonic()
+    return state.ok
+
+
+async def _probe_loop():
+    while True:
+        await probe_once()
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+
+
+async def wait_ready():
+    """Czeka na pierwszą udaną sondę (baza może wstać później niż API)."""
+    await _first_ready.wait()
+
+
+def start_probe():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_probe_loop())
+
+
+async def stop_probe():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await probe_engine.dispose()
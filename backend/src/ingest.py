@@ -0,0 +1,335 @@
+# ingest.py
+"""
+Import partii transakcji z ERP (CSV albo NDJSON).
+
+Partia trafia przez COPY do tabeli tymczasowej, a dalej wszystko dzieje się
+zbiorczo w SQL - jedna instrukcja na krok dla całej partii, bez pętli po wierszach:
+  1. uzupełnienie year/month z created_at, normalizacja oddziału
+     (normalize_branch_name z migrations/007) i przedstawiciela,
+  2. walidacja pól wymaganych (year i month podane albo wyliczone z created_at),
+  3. podział zysku (rep_profit, branch_profit, hq_profit, found) - uzupełniane
+     są tylko kolumny, których ERP nie podał,
+  4. scalenie z transactions przez ON CONFLICT (document_number, year)
+     (migrations/009) - ponownie wysłana partia aktualizuje wiersze, a wiersze
+     bez zmian nie są przepisywane.
+Triggery na transactions oznaczają dotknięte okresy w aggregate_dirty_periods,
+więc po imporcie wystarcza przyrostowe odświeżenie (refresh_jobs.py).
+
+Podział zysku: rep_profit = profit * rep_profit_factor / 100, a reszta
+dzieli się na oddział (INGEST_BRANCH_SHARE), fundusz (INGEST_FOUND_SHARE)
+i centralę (to, co zostaje - łącznie z groszami z zaokrągleń). Wartości podane
+przez ERP zostają bez zmian, a brakujące liczone są od tego, co zostało z zysku.
+Udziały są ułamkami reszty; bez nich partia, w której brakuje branch_profit
+albo found, jest odrzucana.
+
+Import przez API działa z limitem INGEST_STATEMENT_TIMEOUT_MS na instrukcję
+(zawieszona partia nie trzyma bez końca połączenia z puli); import z wiersza
+poleceń działa bez limitu.
+
+Uruchomienie z wiersza poleceń (to samo co POST /api/transactions/ingest):
+    python ingest.py partia.csv
+    python ingest.py partia.ndjson --format ndjson
+"""
+import argparse
+import csv
+import logging
+import os
+import time
+from typing import BinaryIO, Optional
+
+from database import engine, replica_routing
+
+logger = logging.getLogger(__name__)
+
+INGEST_BRANCH_SHARE = os.getenv("INGEST_BRANCH_SHARE")
+INGEST_FOUND_SHARE = os.getenv("INGEST_FOUND_SHARE")
+# Limit pojedynczej instrukcji importu przez API; 0 = bez limitu
+INGEST_STATEMENT_TIMEOUT_MS = int(os.getenv("INGEST_STATEMENT_TIMEOUT_MS", "300000"))
+
+FORMATS = ("csv", "ndjson")
+
+# Kolumny, które może zawierać partia (nagłówek CSV albo klucze obiektów NDJSON)
+INGEST_COLUMNS = (
+    "document_number",
+    "created_at",
+    "branch_name",
+    "representative_name",
+    "customer_nip",
+    "net_value",
+    "gross_value",
+    "to_pay",
+    "profit",
+    "year",
+    "month",
+    "rep_profit_factor",
+    "rep_profit",
+    "branch_profit",
+    "hq_profit",
+    "found",
+)
+REQUIRED_COLUMNS = ("document_number", "branch_name", "net_value", "gross_value", "profit")
+SPLIT_COLUMNS = ("rep_profit", "branch_profit", "hq_profit", "found")
+
+_STAGING_DDL = """
+    CREATE TEMP TABLE _ingest (
+        line_no             bigint GENERATED ALWAYS AS IDENTITY,
+        document_number     varchar(50),
+        created_at          timestamptz,
+        branch_name         varchar(100),
+        representative_name varchar(100),
+        customer_nip        varchar(100),
+        net_value           numeric(12, 2),
+        gross_value         numeric(12, 2),
+        to_pay              numeric(12, 2),
+        profit              numeric(12, 2),
+        year                integer,
+        month               integer,
+        rep_profit_factor   numeric(5, 2),
+        rep_profit          numeric(12, 2),
+        branch_profit       numeric(12, 2),
+        hq_profit           numeric(12, 2),
+        found               numeric(12, 2)
+    ) ON COMMIT DROP
+"""
+
+_COLUMNS_SQL = ", ".join(INGEST_COLUMNS)
+_NEEDS_SPLIT_SQL = " OR ".join(f"{c} IS NULL" for c in SPLIT_COLUMNS)
+_NEEDS_SHARES_SQL = "branch_profit IS NULL OR found IS NULL"
+
+
+class IngestError(ValueError):
+    """Partia odrzucona w całości (zły format, brakujące pola, brak konfiguracji podziału)."""
+
+
+def _load_csv(cursor, stream: BinaryIO):
+    header_line = stream.readline().decode("utf-8-sig")
+    header = [c.strip() for c in next(csv.reader([header_line]), [])]
+    unknown = [c for c in header if c not in INGEST_COLUMNS]
+    if unknown:
+        raise IngestError(f"Nieznane kolumny w nagłówku CSV: {', '.join(unknown)}")
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        raise IngestError(f"Brak wymaganych kolumn w nagłówku CSV: {', '.join(missing)}")
+    cursor.copy_expert(
+        f"COPY _ingest ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)",
+        stream
+    )
+
+
+def _load_ndjson(cursor, stream: BinaryIO):
+    # Każda linia to jeden dokument JSON; separatory spoza JSON-a wyłączają
+    # cytowanie i escape'owanie COPY, więc linia trafia do jsonb bez zmian
+    cursor.execute("""
+        CREATE TEMP TABLE _ingest_json (
+            line_no bigint GENERATED ALWAYS AS IDENTITY,
+            doc     jsonb
+        ) ON COMMIT DROP
+    """)
+    cursor.copy_expert(
+        "COPY _ingest_json (doc) FROM STDIN WITH (FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')",
+        stream
+    )
+    cursor.execute("""
+        SELECT DISTINCT k
+        FROM _ingest_json, jsonb_object_keys(doc) k
+    """)
+    unknown = sorted(row[0] for row in cursor.fetchall() if row[0] not in INGEST_COLUMNS)
+    if unknown:
+        raise IngestError(f"Nieznane pola w NDJSON: {', '.join(unknown)}")
+    cursor.execute(f"""
+        INSERT INTO _ingest ({_COLUMNS_SQL})
+        SELECT {', '.join(f'r.{c}' for c in INGEST_COLUMNS)}
+        FROM _ingest_json j, jsonb_populate_record(NULL::_ingest, j.doc) r
+        WHERE j.doc IS NOT NULL
+        ORDER BY j.line_no
+    """)
+
+
+def _split_shares():
+    try:
+        branch_share = float(INGEST_BRANCH_SHARE)
+        found_share = float(INGEST_FOUND_SHARE)
+    except (TypeError, ValueError):
+        raise IngestError(
+            "Partia zawiera wiersze bez podziału zysku, a INGEST_BRANCH_SHARE "
+            "i INGEST_FOUND_SHARE nie są ustawione"
+        )
+    if branch_share < 0 or found_share < 0 or branch_share + found_share > 1:
+        raise IngestError("INGEST_BRANCH_SHARE i INGEST_FOUND_SHARE muszą być >= 0 i razem <= 1")
+    return branch_share, found_share
+
+
+def ingest_transactions(stream: BinaryIO, fmt: str = "csv",
+                        statement_timeout_ms: Optional[int] = None) -> dict:
+    """
+    Importuje partię w jednej transakcji i zwraca liczniki:
+    received (wiersze partii), rows (po usunięciu powtórzeń dokumentu - wygrywa
+    ostatni), inserted, updated, unchanged. Przy błędzie nic nie jest zapisywane.
+    statement_timeout_ms: limit instrukcji w ms (0 = bez limitu), domyślnie
+    INGEST_STATEMENT_TIMEOUT_MS.
+    """
+    if fmt not in FORMATS:
+        raise IngestError(f"Nieobsługiwany format: {fmt}")
+
+    start = time.perf_counter()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        if statement_timeout_ms is None:
+            statement_timeout_ms = INGEST_STATEMENT_TIMEOUT_MS
+        cursor.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+        cursor.execute(_STAGING_DDL)
+        if fmt == "csv":
+            _load_csv(cursor, stream)
+        else:
+            _load_ndjson(cursor, stream)
+
+        # 1. Uzupełnienie i normalizacja - jedno przejście po partii
+        cursor.execute("""
+            UPDATE _ingest SET
+                year = COALESCE(year, extract(year FROM created_at)::integer),
+                month = COALESCE(month, extract(month FROM created_at)::integer),
+                branch_name = normalize_branch_name(branch_name),
+                representative_name = NULLIF(btrim(representative_name), '')
+        """)
+
+        # 2. Walidacja
+        cursor.execute("SELECT count(*) FROM _ingest")
+        received = cursor.fetchone()[0]
+        cursor.execute(f"""
+            SELECT line_no FROM _ingest
+            WHERE {' OR '.join(f'{c} IS NULL' for c in REQUIRED_COLUMNS)} OR year IS NULL OR month IS NULL
+            ORDER BY line_no
+            LIMIT 10
+        """)
+        invalid = [row[0] for row in cursor.fetchall()]
+        if invalid:
+            raise IngestError(
+                "Wiersze bez wymaganych pól (document_number, branch_name, net_value, "
+                f"gross_value, profit, year i month lub created_at): {', '.join(map(str, invalid))}"
+            )
+
+        # 3. Podział zysku - uzupełniamy tylko kolumny, których ERP nie podał
+        cursor.execute(f"""
+            SELECT count(*) FILTER (WHERE {_NEEDS_SPLIT_SQL}),
+                   count(*) FILTER (WHERE {_NEEDS_SHARES_SQL})
+            FROM _ingest
+        """)
+        needs_split, needs_shares = cursor.fetchone()
+        if needs_split:
+            # Udziały potrzebne tylko, gdy brakuje branch_profit albo found
+            branch_share, found_share = _split_shares() if needs_shares else (None, None)
+            cursor.execute(f"""
+                UPDATE _ingest i SET
+                    rep_profit = s.rep_profit,
+                    branch_profit = s.branch_profit,
+                    found = s.found,
+                    hq_profit = COALESCE(i.hq_profit, s.rest - s.branch_profit - s.found)
+                FROM (
+                    SELECT line_no, rep_profit, rest,
+                           COALESCE(branch_profit, round(rest * %(branch_share)s::numeric, 2)) AS branch_profit,
+                           COALESCE(found, round(rest * %(found_share)s::numeric, 2)) AS found
+                    FROM (
+                        SELECT line_no, branch_profit, found, rep_profit, profit - rep_profit AS rest
+                        FROM (
+                            SELECT line_no, profit, branch_profit, found,
+                                   COALESCE(rep_profit,
+                                            round(profit * COALESCE(rep_profit_factor, 0) / 100, 2)) AS rep_profit
+                            FROM _ingest
+                            WHERE {_NEEDS_SPLIT_SQL}
+                        ) p
+                    ) r
+                ) s
+                WHERE i.line_no = s.line_no
+            """, {"branch_share": branch_share, "found_share": found_share})
+
+        # 4. Scalenie - dokument powtórzony w partii: wygrywa ostatnia linia
+        cursor.execute(f"""
+            CREATE TEMP TABLE _ingest_batch ON COMMIT DROP AS
+            SELECT DISTINCT ON (document_number, year) {_COLUMNS_SQL}
+            FROM _ingest
+            ORDER BY document_number, year, line_no DESC
+        """)
+        cursor.execute("SELECT count(*) FROM _ingest_batch")
+        rows = cursor.fetchone()[0]
+
+        # Partycje dla lat z partii (migrations/005) - nowy rok nie trafia do transactions_default
+        cursor.execute("SELECT to_regprocedure('ensure_transactions_partition(integer)') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute("""
+                SELECT count(*) FILTER (WHERE ensure_transactions_partition(year))
+                FROM (SELECT DISTINCT year FROM _ingest_batch) y
+            """)
+            created = cursor.fetchone()[0]
+            if created:
+                logger.info(f"Import: utworzono {created} nowych partycji transactions")
+        cursor.execute("""
+            SELECT count(*)
+            FROM _ingest_batch b
+            JOIN transactions t ON t.document_number = b.document_number AND t.year = b.year
+        """)
+        existing = cursor.fetchone()[0]
+
+        changed_columns = [c for c in INGEST_COLUMNS if c not in ("document_number", "year")]
+        cursor.execute(f"""
+            INSERT INTO transactions AS t ({_COLUMNS_SQL})
+            SELECT {_COLUMNS_SQL} FROM _ingest_batch
+            ON CONFLICT (document_number, year) DO UPDATE SET
+                {', '.join(f'{c} = EXCLUDED.{c}' for c in changed_columns)}
+            WHERE ({', '.join(f't.{c}' for c in changed_columns)})
+                IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in changed_columns)})
+        """)
+        written = cursor.rowcount
+        conn.commit()
+        # raw_connection() omija zdarzenia engine - odczyty tego procesu idą teraz na serwer główny
+        replica_routing.mark_write()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    inserted = rows - existing
+    updated = written - inserted
+    result = {
+        "received": received,
+        "rows": rows,
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": existing - updated,
+        "execution_time_seconds": round(time.perf_counter() - start, 4),
+    }
+    logger.info(
+        f"Import transakcji ({fmt}): {received} wierszy, {inserted} nowych, "
+        f"{updated} zmienionych, {result['unchanged']} bez zmian w {result['execution_time_seconds']:.2f}s"
+    )
+    return result
+
+
+def main():
+    from refresh_jobs import request_refresh, run_pending
+
+    parser = argparse.ArgumentParser(description="Import partii transakcji z ERP (CSV albo NDJSON)")
+    parser.add_argument("path", help="Plik partii")
+    parser.add_argument("--format", choices=FORMATS, help="Domyślnie wg rozszerzenia pliku")
+    parser.add_argument("--no-refresh", action="store_true", help="Nie odświeżaj agregatów po imporcie")
+    args = parser.parse_args()
+
+    fmt: Optional[str] = args.format
+    if fmt is None:
+        fmt = "ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv"
+
+    with open(args.path, "rb") as f:
+        # Import z wiersza poleceń może trwać dowolnie długo - bez statement_timeout
+        result = ingest_transactions(f, fmt, statement_timeout_ms=0)
+    print(result)
+
+    if not args.no_refresh and (result["inserted"] or result["updated"]):
+        job_id = request_refresh(full=False)
+        run_pending()
+        print(f"Odświeżanie agregatów: zadanie #{job_id}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
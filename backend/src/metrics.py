@@ -0,0 +1,113 @@
+# metrics.py
+"""
+Instrumentacja żądań HTTP w formacie Prometheus.
+
+Middleware zbiera dla każdego szablonu trasy (np. /api/costs/{cost_id}):
+liczbę żądań, histogram czasu odpowiedzi, liczbę żądań w toku i rozmiar
+odpowiedzi. Czas spędzony w bazie liczą zdarzenia kursora SQLAlchemy i trafia
+razem z czasem aplikacji do nagłówka Server-Timing (liczniki - query_stats.py).
+"""
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+import query_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUEST_COUNT = Counter(
+    "http_requests_total", "Liczba żądań HTTP", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Czas obsługi żądania", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds", "Czas zapytań SQL w ramach żądania", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Żądania w trakcie obsługi", ["method", "route"],
+    multiprocess_mode="livesum",
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Rozmiar odpowiedzi", ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(request: Request) -> str:
+    """Szablon ścieżki zamiast surowego URL - ogranicza liczbę serii metryk."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+async def track_requests(request: Request, call_next):
+    method = request.method
+    route = route_template(request)
+    stats, token = query_stats.start_request()
+    in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+    in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        in_flight.dec()
+        query_stats.finish_request(stats, token, f"{method} {route}")
+        REQUEST_COUNT.labels(method, route, str(status)).inc()
+        REQUEST_LATENCY.labels(method, route).observe(elapsed)
+        REQUEST_DB_TIME.labels(method, route).observe(stats.seconds)
+
+    content_length = response.headers.get("content-length")
+    if content_length is not None:
+        RESPONSE_SIZE.labels(method, route).observe(int(content_length))
+
+    app_ms = max(elapsed - stats.seconds, 0.0) * 1000
+    response.headers["Server-Timing"] = (
+        f"app;dur={app_ms:.1f}, db;dur={stats.seconds * 1000:.1f}, total;dur={elapsed * 1000:.1f}"
+    )
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time-ms"] = f"{stats.seconds * 1000:.1f}"
+    return response
+
+
+def metrics_response() -> Response:
+    # Przy wielu workerach (serve.py) każdy proces zapisuje metryki do katalogu
+    # PROMETHEUS_MULTIPROC_DIR - zbieramy je ze wszystkich procesów
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead():
+    """Usuwa dane kończącego się workera z metryk typu livesum."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
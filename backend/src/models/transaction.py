@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, func, cast, or_, Date, Text, CheckConstraint
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, func, cast, or_, Date, Text, CheckConstraint, Boolean
+from sqlalchemy.dialects.postgresql import JSON, ARRAY
 from sqlalchemy.ext.hybrid import hybrid_property
 from database import Base
 
@@ -41,6 +41,8 @@ class ConfigCurrentDate(Base):
     month_value = Column(Integer)
     day_value = Column(Integer)
 class Transaction(Base):
+    # Tabela może być partycjonowana po year (migrations/005_partition_transactions.sql) -
+    # zapytania powinny filtrować po year, żeby planner czytał tylko partycje swoich lat
     __tablename__ = "transactions"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -53,7 +55,7 @@ class Transaction(Base):
     gross_value = Column(Numeric(12, 2), nullable=False)
     to_pay = Column(Numeric(12, 2))
     profit = Column(Numeric(12, 2), nullable=False)
-    year = Column(Integer)
+    year = Column(Integer, nullable=False)  # NOT NULL od migrations/005 - klucz partycjonowania
     month = Column(Integer)
     # Dodane brakujące kolumny
     rep_profit_factor = Column(Numeric(5, 2))
@@ -84,6 +86,82 @@ class Transaction(Base):
             cast(cls.to_pay, Numeric) == 0
         )
 
+class DailySalesRollup(Base):
+    """
+    Dzienny rollup sprzedaży per oddział i przedstawiciel.
+    Utrzymywany przez triggery na transactions (migrations/001_daily_sales_rollup.sql).
+    """
+    __tablename__ = "daily_sales_rollup"
+
+    day = Column(Date, primary_key=True)
+    branch_name = Column(String(100), primary_key=True)
+    representative_name = Column(String(100), primary_key=True, default="")  # '' gdy brak przedstawiciela
+    net_sales = Column(Numeric(14, 2), default=0)
+    profit = Column(Numeric(14, 2), default=0)
+    net_sales_paid = Column(Numeric(14, 2), default=0)
+    profit_paid = Column(Numeric(14, 2), default=0)
+
+class AggregateDirtyPeriod(Base):
+    """
+    Kolejka kluczy do przyrostowego przeliczenia agregatów miesięcznych.
+    Wypełniana triggerami na transactions i all_costs, opróżniana przez
+    refresh_aggregates_incremental() (migrations/002_incremental_aggregates.sql).
+    """
+    __tablename__ = "aggregate_dirty_periods"
+
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    branch_name = Column(String(100), primary_key=True)
+    representative_name = Column(String(100), primary_key=True, default="")
+    marked_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AggregateDirtyClaim(Base):
+    """
+    Klucze przejęte z aggregate_dirty_periods przez claim_dirty_periods(),
+    jeszcze nieprzeliczone (migrations/012_dirty_periods_claim.sql).
+    """
+    __tablename__ = "aggregate_dirty_claims"
+
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    branch_name = Column(String(100), primary_key=True)
+    representative_name = Column(String(100), primary_key=True, default="")
+    claimed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RefreshJob(Base):
+    """
+    Przebieg odświeżania agregatów (refresh_jobs.py, migrations/003_refresh_jobs.sql).
+    stages: lista {"name", "seconds"} w kolejności wykonania.
+    """
+    __tablename__ = "refresh_jobs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String(10), nullable=False, default="queued")  # queued, running, done, failed
+    full_refresh = Column(Boolean, nullable=False, default=False)
+    requests = Column(Integer, nullable=False, default=1)  # liczba połączonych żądań
+    requested_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    current_stage = Column(String(50))
+    stages = Column(JSON)
+    error = Column(Text)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('queued', 'running', 'done', 'failed')", name='check_refresh_job_status'),
+    )
+
+class CostContractor(Base):
+    """
+    Kontrahenci kosztów (kontrahent, NIP) z liczbą kosztów - dla podpowiedzi
+    /costs/contractors/suggest. Utrzymywany triggerami na all_costs
+    (migrations/010_costs_trigram_search.sql).
+    """
+    __tablename__ = "cost_contractors"
+    cost_contrahent = Column(String(200), primary_key=True)
+    cost_nip = Column(String(20), primary_key=True)
+    uses = Column(Integer, nullable=False, default=0)
+
+
 class AllCosts(Base):
     __tablename__ = "all_costs"
 
@@ -287,6 +365,52 @@ class ProfitRepresentativePayd(Base):
     profit_paid = Column(Numeric)
 
 
+class RepresentativeDirectory(Base):
+    """
+    Słownik przedstawicieli per oddział (migrations/007_representative_directory.sql).
+    Utrzymywany triggerami na transactions i all_costs; branch_name jest już
+    znormalizowany. years - lata sprzedaży, in_costs - przedstawiciel występuje w kosztach.
+    """
+    __tablename__ = "representative_directory"
+    id = Column(Integer, unique=True)
+    representative_name = Column(String(100), primary_key=True)
+    branch_name = Column(String(100), primary_key=True)
+    years = Column(ARRAY(Integer), nullable=False, default=list)
+    first_sale = Column(DateTime(timezone=True))
+    last_sale = Column(DateTime(timezone=True))
+    in_costs = Column(Boolean, nullable=False, default=False)
+
+
+class TransactionYear(Base):
+    """
+    Lata, w których są transakcje (migrations/008_transaction_years.sql).
+    Nowy rok dopisuje trigger na transactions i wysyła NOTIFY transaction_years.
+    """
+    __tablename__ = "transaction_years"
+    year = Column(Integer, primary_key=True)
+
+
+class MonthlyProfitCube(Base):
+    """
+    Miesięczne sumy zysków per oddział (migrations/004_monthly_profit_cube.sql).
+    Warianty *_paid obejmują tylko transakcje opłacone (Transaction.is_paid).
+    """
+    __tablename__ = "monthly_profit_cube"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    branch_name = Column(String(100), primary_key=True)
+    hq_profit = Column(Numeric(14, 2), default=0)
+    branch_profit = Column(Numeric(14, 2), default=0)
+    rep_profit = Column(Numeric(14, 2), default=0)
+    found = Column(Numeric(14, 2), default=0)
+    profit = Column(Numeric(14, 2), default=0)
+    hq_profit_paid = Column(Numeric(14, 2), default=0)
+    branch_profit_paid = Column(Numeric(14, 2), default=0)
+    rep_profit_paid = Column(Numeric(14, 2), default=0)
+    found_paid = Column(Numeric(14, 2), default=0)
+    profit_paid = Column(Numeric(14, 2), default=0)
+
+
 class AggregatedSalesData(Base):
     __tablename__ = "aggregated_sales_data"
     # Klucz główny stanowią kombinacja roku, miesiąca i nazwy oddziału
@@ -0,0 +1,99 @@
+# notifications.py
+"""
+Nasłuch powiadomień Postgresa (LISTEN/NOTIFY) w workerze API.
+
+Każdy worker trzyma jedno osobne połączenie asyncpg - poza pulami API, jak
+silnik sondy w health.py - i dla każdego powiadomienia wywołuje funkcje
+zarejestrowane przez subscribe(). Funkcje są synchroniczne i krótkie
+(unieważnienie cache), wywoływane w pętli zdarzeń.
+
+Po zerwaniu połączenia nasłuch jest wznawiany co NOTIFY_RECONNECT_SECONDS.
+Powiadomienia z czasu przerwy przepadają, dlatego po każdym (ponownym)
+połączeniu subskrybenci dostają payload None - powinni wtedy unieważnić cache.
+"""
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+
+from database import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_RECONNECT_SECONDS = float(os.getenv("NOTIFY_RECONNECT_SECONDS", "5"))
+# Co tyle sekund ciszy sprawdzamy połączenie - zerwane TCP wychodzi dopiero przy zapytaniu
+NOTIFY_KEEPALIVE_SECONDS = float(os.getenv("NOTIFY_KEEPALIVE_SECONDS", "60"))
+
+_handlers: Dict[str, List[Callable[[Optional[str]], None]]] = {}
+_task: Optional[asyncio.Task] = None
+
+
+def subscribe(channel: str, handler: Callable[[Optional[str]], None]):
+    """Rejestruje funkcję dla kanału; wywołać przed start_listener()."""
+    _handlers.setdefault(channel, []).append(handler)
+
+
+def _dispatch(channel: str, payload: Optional[str]):
+    for handler in _handlers.get(channel, []):
+        try:
+            handler(payload)
+        except Exception as e:
+            logger.error(f"Błąd obsługi powiadomienia {channel}: {str(e)}")
+
+
+def _on_notification(connection, pid, channel, payload):
+    _dispatch(channel, payload)
+
+
+async def _listen_once():
+    conn = await asyncpg.connect(
+        host=DB_HOST, port=int(DB_PORT), database=DB_NAME, user=DB_USER, password=DB_PASSWORD
+    )
+    closed = asyncio.Event()
+    conn.add_termination_listener(lambda _: closed.set())
+    try:
+        for channel in _handlers:
+            await conn.add_listener(channel, _on_notification)
+        logger.info(f"Nasłuch powiadomień: {', '.join(_handlers)}")
+        for channel in _handlers:
+            _dispatch(channel, None)
+
+        while not closed.is_set():
+            try:
+                await asyncio.wait_for(closed.wait(), NOTIFY_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await conn.execute("SELECT 1")
+    finally:
+        if not conn.is_closed():
+            await conn.close()
+
+
+async def _listen_loop():
+    while True:
+        try:
+            await _listen_once()
+            logger.error("Połączenie nasłuchu powiadomień zostało zamknięte")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Nasłuch powiadomień przerwany: {str(e)}")
+        await asyncio.sleep(NOTIFY_RECONNECT_SECONDS)
+
+
+def start_listener():
+    global _task
+    if _task is None and _handlers:
+        _task = asyncio.create_task(_listen_loop())
+
+
+async def stop_listener():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,74 @@
+# process_cache.py
+"""
+Wspólny mechanizm cache procesu dla małych, rzadko zmienianych danych
+(config_cache.py, rep_directory.py, year_cache.py, cost_kind_cache.py).
+
+Wartość żyje w pamięci workera przez ttl_seconds. invalidate() czyści ją
+i zwiększa licznik generacji - wynik ładowania rozpoczętego przed
+unieważnieniem nie trafia do cache. Z podanym kanałem cache subskrybuje
+NOTIFY (notifications.py), więc zmiana w bazie unieważnia kopie we wszystkich
+workerach; TTL jest wtedy tylko zabezpieczeniem na wypadek utraconego
+powiadomienia. Wartość None nie jest cache'owana.
+"""
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Generic, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ProcessCache(Generic[T]):
+    def __init__(self, name: str, ttl_seconds: float, channel: Optional[str] = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._cached: Optional[T] = None
+        self._expires_at = 0.0
+        self._generation = 0
+        if channel:
+            # Import tutaj - cache bez kanału nie potrzebuje konfiguracji bazy (asyncpg, database.py)
+            import notifications
+            notifications.subscribe(channel, self.invalidate)
+
+    def _lookup(self) -> Tuple[Optional[T], int]:
+        with self._lock:
+            if self._cached is not None and time.monotonic() < self._expires_at:
+                return self._cached, self._generation
+            return None, self._generation
+
+    def _store(self, value: Optional[T], generation: int) -> Optional[T]:
+        if value is None:
+            return None
+        with self._lock:
+            if generation == self._generation:
+                self._cached = value
+                self._expires_at = time.monotonic() + self.ttl_seconds
+        return value
+
+    def get(self, load: Callable[[], Optional[T]]) -> Optional[T]:
+        """Wartość z cache albo wynik load() (sesja synchroniczna)."""
+        cached, generation = self._lookup()
+        if cached is not None:
+            return cached
+        return self._store(load(), generation)
+
+    async def get_async(self, load: Callable[[], Awaitable[Optional[T]]]) -> Optional[T]:
+        """Wartość z cache albo wynik await load() (AsyncSession)."""
+        cached, generation = self._lookup()
+        if cached is not None:
+            return cached
+        return self._store(await load(), generation)
+
+    def invalidate(self, payload: Optional[str] = None):
+        with self._lock:
+            self._cached = None
+            self._expires_at = 0.0
+            self._generation += 1
+        if payload:
+            logger.info(f"Unieważniono cache {self.name} (powiadomienie: {payload})")
+        else:
+            logger.info(f"Unieważniono cache {self.name}")
@@ -0,0 +1,122 @@
+# query_stats.py
+"""
+Statystyki zapytań SQL w obrębie jednego żądania.
+
+Zdarzenia before/after_cursor_execute liczą zapytania i czas bazy dla
+bieżącego żądania (zmienna kontekstowa ustawiana w middleware). Zapytania są
+grupowane po szablonie - jeśli ten sam szablon wykona się w jednym żądaniu
+więcej niż QUERY_REPEAT_WARN_THRESHOLD razy, logujemy ostrzeżenie (typowy
+objaw N+1).
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+QUERY_REPEAT_WARN_THRESHOLD = int(os.getenv("QUERY_REPEAT_WARN_THRESHOLD", "20"))
+QUERY_STATS_TOP_N = int(os.getenv("QUERY_STATS_TOP_N", "5"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PARAM_RE = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_PARAM_LIST_RE = re.compile(r"\(\?(?:, \?)+\)")
+
+
+def statement_template(statement: str) -> str:
+    """Normalizuje SQL do szablonu: jednolite białe znaki i placeholdery."""
+    template = _WHITESPACE_RE.sub(" ", statement).strip()
+    template = _PARAM_RE.sub("?", template)
+    return _PARAM_LIST_RE.sub("(?...)", template)
+
+
+class RequestQueryStats:
+    """Liczniki zapytań bieżącego żądania; aktualizowane także z wątków puli."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.by_template = {}  # szablon -> [liczba wykonań, łączny czas]
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float):
+        template = statement_template(statement)
+        with self._lock:
+            self.count += 1
+            self.seconds += elapsed
+            entry = self.by_template.setdefault(template, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def top(self, n: int = QUERY_STATS_TOP_N) -> list:
+        with self._lock:
+            items = sorted(self.by_template.items(), key=lambda kv: kv[1][1], reverse=True)[:n]
+        return [
+            {"statement": template[:300], "count": count, "seconds": round(seconds, 6)}
+            for template, (count, seconds) in items
+        ]
+
+    def repeated(self, threshold: int = QUERY_REPEAT_WARN_THRESHOLD) -> list:
+        with self._lock:
+            return [(t, c) for t, (c, _) in self.by_template.items() if c > threshold]
+
+    def summary(self) -> dict:
+        return {
+            "queries": self.count,
+            "db_seconds": round(self.seconds, 6),
+            "top_statements": self.top(),
+        }
+
+
+_current: contextvars.ContextVar[Optional[RequestQueryStats]] = contextvars.ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def start_request() -> tuple:
+    """Rozpoczyna zbieranie statystyk; zwraca (stats, token) dla finish_request."""
+    stats = RequestQueryStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(stats: RequestQueryStats, token, label: str):
+    _current.reset(token)
+    for template, count in stats.repeated():
+        logger.warning(
+            f"{label}: zapytanie wykonane {count} razy w jednym żądaniu (próg "
+            f"{QUERY_REPEAT_WARN_THRESHOLD}): {template[:200]}"
+        )
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+def query_summary() -> Optional[dict]:
+    """Podsumowanie dla bloków measure_timings; None poza żądaniem HTTP."""
+    stats = _current.get()
+    return stats.summary() if stats is not None else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_stats_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    start = getattr(context, "_query_stats_start", None)
+    if stats is not None and start is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Podpina liczniki zapytań pod silnik (dla AsyncEngine - pod sync_engine)."""
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,215 @@
+# refresh_jobs.py
+"""
+Zadania odświeżania agregatów.
+
+request_refresh() zapisuje żądanie w refresh_jobs - jeśli w kolejce czeka już
+zadanie, żądanie jest do niego dołączane, więc seria wywołań update-date kończy
+się jednym przebiegiem. run_pending() wykonuje zadania z kolejki na własnych
+połączeniach pod blokadą doradczą Postgresa - w danej chwili odświeżanie
+wykonuje najwyżej jeden worker w całym klastrze.
+
+Runner ma osobny silnik z REFRESH_RUNNER_CONNECTIONS połączeniami, poza pulami
+API: na pierwszym trzyma blokadę i zapisuje stan zadania (krótkie transakcje,
+widoczne od razu dla GET /refresh), na drugim wykonuje etapy w jednej długiej
+transakcji. serve.py wlicza te połączenia do DB_CONNECTION_BUDGET.
+Czasy poszczególnych etapów trafiają do refresh_jobs.stages. Przy okazji
+runner (i start API, ensure_partitions_now) zakłada partycje transactions na
+bieżący i następny rok.
+"""
+import logging
+import time
+
+from sqlalchemy import create_engine, text, func, update
+
+from cache import bump_aggregate_version
+from config_cache import invalidate_config_date
+from rep_directory import invalidate_rep_directory
+from database import SessionLocal, SQLALCHEMY_DATABASE_URL, DB_POOL_RECYCLE, replica_routing
+from models.transaction import RefreshJob
+
+logger = logging.getLogger(__name__)
+
+# Klucz blokady doradczej odświeżania agregatów (dowolna stała, wspólna dla workerów)
+REFRESH_LOCK_KEY = 720_431_001
+# Połączenie blokady i stanu zadania + połączenie etapów (serve.REFRESH_RUNNER_CONNECTIONS)
+REFRESH_RUNNER_CONNECTIONS = 2
+
+runner_engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=REFRESH_RUNNER_CONNECTIONS,
+    max_overflow=0,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+
+# Etapy: przyrostowe przeliczenie agregatów miesięcznych albo pełna przebudowa,
+# potem agregaty zależne od daty konfiguracyjnej (dziś, bieżący miesiąc, historia, sumy)
+INCREMENTAL_STAGES = [
+    ("incremental", "SELECT refresh_aggregates_incremental()"),
+]
+FULL_STAGES = [
+    ("clear_dirty_periods", "DELETE FROM aggregate_dirty_claims"),
+    ("aggregated_sales_data", "SELECT refresh_aggregated_sales_data()"),
+    ("representative_aggregated_data", "SELECT refresh_representative_aggregated_data()"),
+    ("monthly_profit_cube", "SELECT refresh_profit_cube_full()"),
+    ("representative_directory", "SELECT rebuild_representative_directory()"),
+    ("transaction_years", "SELECT rebuild_transaction_years()"),
+]
+SUMMARY_STAGES = [
+    ("aggregated_data", "SELECT populate_aggregated_data()"),
+    ("aggregated_data_hist", "SELECT populate_aggregated_data_hist()"),
+    ("aggregated_data_sums", "SELECT populate_aggregated_data_sums()"),
+]
+
+
+def request_refresh(full: bool = False) -> int:
+    """Dodaje żądanie odświeżenia do kolejki (albo dołącza do czekającego) i zwraca id zadania."""
+    with SessionLocal() as db:
+        job_id = db.execute(
+            text("""
+                INSERT INTO refresh_jobs (status, full_refresh)
+                VALUES ('queued', :full)
+                ON CONFLICT ((true)) WHERE status = 'queued'
+                DO UPDATE SET
+                    requests = refresh_jobs.requests + 1,
+                    full_refresh = refresh_jobs.full_refresh OR EXCLUDED.full_refresh
+                RETURNING id
+            """),
+            {"full": full}
+        ).scalar()
+        db.commit()
+    return job_id
+
+
+def get_job(db, job_id: int):
+    return db.get(RefreshJob, job_id)
+
+
+def _set_job(conn, job_id: int, **values):
+    """Aktualizuje stan zadania w osobnej, krótkiej transakcji - widoczny od razu dla GET /refresh."""
+    conn.execute(update(RefreshJob).where(RefreshJob.id == job_id).values(**values))
+    conn.commit()
+
+
+def _claim_next(conn):
+    """Przejmuje zadanie z kolejki (queued -> running) albo zwraca None."""
+    row = conn.execute(
+        text("""
+            UPDATE refresh_jobs
+            SET status = 'running', started_at = now()
+            WHERE status = 'queued'
+            RETURNING id, full_refresh
+        """)
+    ).first()
+    conn.commit()
+    return row
+
+
+def _run_job(conn, job_id: int, full: bool):
+    """Wykonuje etapy zadania; conn to połączenie blokady, na którym zapisujemy stan."""
+    stages = (FULL_STAGES if full else INCREMENTAL_STAGES) + SUMMARY_STAGES
+    timings = []
+    job_start = time.perf_counter()
+    try:
+        # Przejęcie oznaczonych okresów w osobnej, od razu zatwierdzonej transakcji
+        # (migrations/012) - zapisy transakcji nie czekają na koniec odświeżania
+        _set_job(conn, job_id, current_stage="claim_dirty_periods")
+        t = time.perf_counter()
+        conn.execute(text("SELECT claim_dirty_periods()"))
+        conn.commit()
+        # SELECT funkcji zapisującej i runner_engine - zdarzenia database.py zapisu nie widzą
+        replica_routing.mark_write()
+        timings.append({"name": "claim_dirty_periods", "seconds": round(time.perf_counter() - t, 4)})
+
+        # Wszystkie etapy w jednej transakcji - API widzi stare albo nowe agregaty, nigdy połowę
+        with runner_engine.connect() as stage_conn:
+            # Odświeżanie trwa dłużej niż zwykłe zapytania API - bez statement_timeout
+            stage_conn.execute(text("SET LOCAL statement_timeout = 0"))
+            for name, statement in stages:
+                _set_job(conn, job_id, current_stage=name)
+                t = time.perf_counter()
+                stage_conn.execute(text(statement))
+                timings.append({"name": name, "seconds": round(time.perf_counter() - t, 4)})
+            stage_conn.commit()
+        replica_routing.mark_write()
+
+        # Nowe agregaty - unieważnij odpowiedzi zapisane w cache
+        invalidate_config_date()
+        invalidate_rep_directory()
+        bump_aggregate_version()
+
+        _set_job(conn, job_id, status="done", finished_at=func.now(), current_stage=None, stages=timings)
+        logger.info(
+            f"Odświeżanie agregatów #{job_id} zakończone w {time.perf_counter() - job_start:.2f}s "
+            f"({'pełne' if full else 'przyrostowe'}): "
+            + ", ".join(f"{s['name']} {s['seconds']:.2f}s" for s in timings)
+        )
+    except Exception as e:
+        logger.error(f"Błąd podczas odświeżania agregatów #{job_id}: {str(e)}")
+        conn.rollback()
+        _set_job(conn, job_id, status="failed", finished_at=func.now(), stages=timings, error=str(e))
+
+
+def ensure_partitions(conn):
+    """
+    Partycje transactions na bieżący i następny rok (migrations/005_partition_transactions.sql).
+    Bez migracji partycjonowania funkcji nie ma - nic nie robimy.
+    """
+    exists = conn.execute(
+        text("SELECT to_regprocedure('ensure_transactions_partitions()') IS NOT NULL")
+    ).scalar()
+    if not exists:
+        return
+    created = conn.execute(text("SELECT ensure_transactions_partitions()")).scalar()
+    conn.commit()
+    if created:
+        logger.info(f"Utworzono {created} nowych partycji transactions")
+
+
+def ensure_partitions_now():
+    """Zakłada brakujące partycje poza runnerem - przy starcie API."""
+    with runner_engine.connect() as conn:
+        ensure_partitions(conn)
+
+
+def run_pending():
+    """
+    Wykonuje wszystkie zadania z kolejki. Jeśli blokadę trzyma inny proces,
+    wraca od razu - tamten przebieg podejmie też zadania dodane w międzyczasie.
+    """
+    while True:
+        with runner_engine.connect() as conn:
+            acquired = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": REFRESH_LOCK_KEY}
+            ).scalar()
+            conn.commit()
+            if not acquired:
+                return
+            try:
+                # Pod blokadą nikt inny nie odświeża - 'running' to pozostałość po przerwanym procesie
+                conn.execute(text("""
+                    UPDATE refresh_jobs
+                    SET status = 'failed', finished_at = now(), error = 'Przerwane (restart procesu)'
+                    WHERE status = 'running'
+                """))
+                conn.commit()
+                try:
+                    ensure_partitions(conn)
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Nie udało się utworzyć partycji transactions: {str(e)}")
+                while (job := _claim_next(conn)) is not None:
+                    _run_job(conn, job.id, job.full_refresh)
+            finally:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": REFRESH_LOCK_KEY})
+                conn.commit()
+
+            # Żądanie dodane tuż przed zwolnieniem blokady mogło nie dostać jej
+            # w swoim run_pending - sprawdzamy kolejkę jeszcze raz
+            queued = conn.execute(
+                text("SELECT 1 FROM refresh_jobs WHERE status = 'queued' LIMIT 1")
+            ).first()
+            conn.commit()
+        if not queued:
+            return
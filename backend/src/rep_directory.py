@@ -0,0 +1,137 @@
+# rep_directory.py
+"""
+Cache procesu dla słownika przedstawicieli (representative_directory).
+
+Słownik ma kilkaset wierszy i zmienia się rzadko, a czytają go listy
+przedstawicieli w formularzach kosztów i /all_stats. Trzymamy go w pamięci
+(process_cache.py) przez REP_DIRECTORY_TTL_SECONDS; zapisy przez API
+unieważniają go od razu w swoim workerze, a trigger na representative_directory wysyła
+NOTIFY representative_directory, na który pozostałe workery unieważniają swoje
+kopie (migrations/014_representative_directory_notify.sql, notifications.py).
+TTL jest tylko zabezpieczeniem na wypadek utraconego powiadomienia.
+
+Nazwy przedstawicieli w słowniku są przycięte (btrim); zapytania, które
+łączą je z danymi sprzedaży, przycinają nazwy z tabel sprzedaży tak samo.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.transaction import RepresentativeDirectory
+from process_cache import ProcessCache
+
+logger = logging.getLogger(__name__)
+
+REP_DIRECTORY_TTL_SECONDS = float(os.getenv("REP_DIRECTORY_TTL_SECONDS", "300"))
+REP_DIRECTORY_CHANNEL = "representative_directory"
+
+# Pisownia oddziałów w parametrach zapytań - ta sama co normalize_branch_name() w bazie
+BRANCH_MAPPING = {
+    "LUBLIN": "Lublin",
+    "PCIM": "Pcim",
+    "RZGOW": "Rzgów",
+    "RZGÓW": "Rzgów",
+    "MALBORK": "Malbork",
+    "LOMZA": "Łomża",
+    "ŁOMŻA": "Łomża",
+    "LOMŻA": "Łomża",
+    "MYSLIBORZ": "Myślibórz",
+    "MYŚLIBÓRZ": "Myślibórz",
+    "MG": "MG",
+    "STH": "STH",
+    "BHP": "BHP"
+}
+
+
+def normalize_branch(branch: str) -> str:
+    branch = branch.strip()
+    return BRANCH_MAPPING.get(branch.upper(), branch)
+
+
+@dataclass(frozen=True)
+class RepresentativeEntry:
+    """Niemutowalna kopia wiersza representative_directory - bezpieczna poza sesją."""
+    id: int
+    representative_name: str
+    branch_name: str
+    years: Tuple[int, ...]
+    first_sale: Optional[datetime]
+    last_sale: Optional[datetime]
+    in_costs: bool
+
+    @property
+    def has_sales(self) -> bool:
+        return self.first_sale is not None or bool(self.years)
+
+
+_cache: ProcessCache[Tuple[RepresentativeEntry, ...]] = ProcessCache(
+    "słownika przedstawicieli", REP_DIRECTORY_TTL_SECONDS, channel=REP_DIRECTORY_CHANNEL
+)
+
+_QUERY = select(RepresentativeDirectory).order_by(
+    RepresentativeDirectory.representative_name, RepresentativeDirectory.branch_name
+)
+
+
+def _from_rows(rows) -> Tuple[RepresentativeEntry, ...]:
+    return tuple(
+        RepresentativeEntry(
+            id=row.id,
+            representative_name=row.representative_name,
+            branch_name=row.branch_name,
+            years=tuple(row.years or ()),
+            first_sale=row.first_sale,
+            last_sale=row.last_sale,
+            in_costs=row.in_costs,
+        )
+        for row in rows
+    )
+
+
+def get_directory(db: Session) -> Tuple[RepresentativeEntry, ...]:
+    """Wszystkie wpisy słownika posortowane po przedstawicielu i oddziale (sesja synchroniczna)."""
+    return _cache.get(lambda: _from_rows(db.execute(_QUERY).scalars().all()))
+
+
+async def get_directory_async(db: AsyncSession) -> Tuple[RepresentativeEntry, ...]:
+    """Wszystkie wpisy słownika posortowane po przedstawicielu i oddziale (AsyncSession)."""
+    async def load():
+        return _from_rows((await db.execute(_QUERY)).scalars().all())
+    return await _cache.get_async(load)
+
+
+def sales_representatives(
+        entries: Tuple[RepresentativeEntry, ...],
+        branch: Optional[str] = None,
+        year: Optional[int] = None
+) -> List[RepresentativeEntry]:
+    """
+    Przedstawiciele ze sprzedażą - jeden wpis na nazwę, w kolejności alfabetycznej.
+    branch jest normalizowany jak przy zapisie do słownika.
+    """
+    branch = normalize_branch(branch) if branch else None
+    result = {}
+    for entry in entries:
+        if not entry.has_sales:
+            continue
+        if branch and entry.branch_name != branch:
+            continue
+        if year is not None and year not in entry.years:
+            continue
+        result.setdefault(entry.representative_name, entry)
+    return list(result.values())
+
+
+def cost_representatives(entries: Tuple[RepresentativeEntry, ...]) -> List[str]:
+    """Nazwy przedstawicieli występujących w kosztach, alfabetycznie i bez powtórzeń."""
+    return list(dict.fromkeys(e.representative_name for e in entries if e.in_costs))
+
+
+def invalidate_rep_directory(payload: Optional[str] = None):
+    _cache.invalidate(payload)
@@ -0,0 +1,47 @@
+# responses.py
+"""
+Szybka serializacja JSON odpowiedzi API (orjson).
+
+FastJSONResponse jest domyślną klasą odpowiedzi aplikacji. orjson obsługuje
+natywnie date/datetime/UUID, a _default dokłada typy z bazy: Decimal (kolumny
+Numeric), wiersze SQLAlchemy (Row / RowMapping) i modele Pydantic. Dzięki temu
+endpoint może zwrócić surowe wiersze przez json_response() - bez pętli
+float(row.x or 0) i bez przechodzenia przez jsonable_encoder.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.engine import Row, RowMapping
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, RowMapping):
+        return dict(obj)
+    if isinstance(obj, Row):
+        return obj._asdict()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(content: Any, status_code: int = 200) -> FastJSONResponse:
+    """Zwraca treść bezpośrednio, z pominięciem walidacji response_model i jsonable_encoder."""
+    return FastJSONResponse(content=content, status_code=status_code)
@@ -1,19 +1,113 @@
 # routes/costs.py
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, and_, select, update, insert, delete, values, column, cast, tuple_, true, text, literal, exists
 from datetime import datetime
 import logging
+import os
 from typing import List, Optional
 
-from models.transaction import AllCosts, ConfigCurrentDate, CostKind, CostAuditLog
+from models.transaction import AllCosts, CostKind, CostAuditLog, CostContractor
 from models.costs_raw import CostsRaw  # KROK 4d: odpinanie dokumentu ILUO przy usunięciu kosztu
-from database import get_db
+from database import get_async_db
+from cache import get_cached_value, set_cached_value, bump_costs_version, COSTS_VERSION_KEY
+from config_cache import get_config_date_async
+from cost_kind_cache import get_cost_kinds_async, invalidate_cost_kinds
+from rep_directory import get_directory_async, cost_representatives, invalidate_rep_directory
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Kolumny wiersza kosztu w odpowiedzi GET /costs
+COST_COLUMNS = tuple(AllCosts.__table__.columns)
+COST_COLUMN_NAMES = tuple(column.name for column in COST_COLUMNS)
+# Podpowiedzi kontrahentów: minimalne word similarity nazwy do wpisanego tekstu
+SUGGEST_MIN_SIMILARITY = float(os.getenv("SUGGEST_MIN_SIMILARITY", "0.3"))
+# Sumy listy kosztów unieważnia zapis kosztu (bump_costs_version); TTL to zabezpieczenie
+COSTS_TOTALS_TTL_SECONDS = int(os.getenv("COSTS_TOTALS_TTL_SECONDS", "3600"))
+# Maksymalna liczba pozycji (create + update + delete) w jednym POST /costs/bulk
+COSTS_BULK_MAX_ITEMS = int(os.getenv("COSTS_BULK_MAX_ITEMS", "2000"))
+
+# TYLKO pola edytowalne przez użytkownika w formularzu - tylko one trafiają do audit logu
+AUDITED_FIELDS = (
+    'cost_contrahent',  # Nazwa kontrahenta
+    'cost_nip',  # NIP
+    'cost_doc_no',  # Numer faktury
+    'cost_value',  # Kwota
+    'cost_mo',  # Miesiąc
+    'cost_year',  # Rok
+    'cost_kind',  # Rodzaj kosztu
+    'cost_4what',  # Za co?
+    'cost_own',  # Właściciel kosztu
+    'cost_branch',  # Oddział
+    'cost_ph'  # Przedstawiciel
+)
+# GET /costs/summary: (klucz odpowiedzi, nazwa pola w pozycji, kolumna) - pierwszy wymiar zawsze,
+# pozostałe z breakdown=true
+SUMMARY_DIMENSIONS = (
+    ("by_cost_type", "cost_kind", AllCosts.cost_kind),
+    ("by_branch", "branch", AllCosts.cost_branch),
+    ("by_owner", "cost_own", AllCosts.cost_own),
+    ("by_month", "month", AllCosts.cost_mo),
+    ("by_representative", "representative", AllCosts.cost_ph),
+)
+SUMMARY_FIELDS = ("total_cost", "total_branch_cost", "total_hq_cost", "total_ph_cost")
+SUMMARY_PH_FIELDS = ("total_cost", "total_ph_cost")
+SUMMARY_PAYOUT_FIELDS = ("branch_payout", "rep_payout")
+ILUO_READONLY_DETAIL = (
+    "Koszt pochodzi z dokumentu ILUO i jest nieedytowalny. "
+    "Aby skorygować, usuń koszt (dokument wróci do puli) i przypisz ponownie."
+)
+
+
+def _escape_like(value: str) -> str:
+    """Znaki specjalne LIKE z wpisanego tekstu traktujemy dosłownie."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_rank(term: str, columns):
+    """Trafność wyszukiwania: najlepsze word similarity kontrahenta, NIP-u albo numeru dokumentu."""
+    return func.greatest(
+        func.word_similarity(term, columns.cost_contrahent),
+        func.word_similarity(term, columns.cost_nip),
+        func.word_similarity(term, columns.cost_doc_no)
+    )
+
+
+def _audit_changes(db_cost: AllCosts, new_values: dict) -> dict:
+    """Zmiany pól edytowalnych w formacie audit logu: {pole: {"old": ..., "new": ...}}."""
+    changes = {}
+    for key in AUDITED_FIELDS:
+        if key not in new_values:
+            continue
+        old_value = getattr(db_cost, key, None)
+        new_value = new_values[key]
+        if old_value != new_value:
+            changes[key] = {
+                "old": str(old_value) if old_value is not None else None,
+                "new": str(new_value) if new_value is not None else None
+            }
+    return changes
+
+
+def _deleted_snapshot(cost: AllCosts) -> dict:
+    """Stan kosztu w momencie usunięcia - zapisywany w audit logu."""
+    return {
+        "cost_contrahent": str(cost.cost_contrahent),
+        "cost_nip": str(cost.cost_nip),
+        "cost_doc_no": str(cost.cost_doc_no),
+        "cost_value": str(cost.cost_value),
+        "cost_mo": str(cost.cost_mo),
+        "cost_year": str(cost.cost_year),
+        "cost_kind": str(cost.cost_kind),
+        "cost_4what": str(cost.cost_4what),
+        "cost_own": str(cost.cost_own),
+        "cost_branch": str(cost.cost_branch),
+        "cost_ph": str(cost.cost_ph) if cost.cost_ph else None,
+        "cost_author": str(cost.cost_author)
+    }
+
 
 # Models Pydantic
 class CostCreate(BaseModel):
@@ -37,6 +131,21 @@ class CostCreate(BaseModel):
         from_attributes = True
 
 
+class CostBulkUpdate(CostCreate):
+    cost_id: int
+
+
+class CostBulkRequest(BaseModel):
+    current_user: str  # Autor zmian w audit logu
+    create: List[CostCreate] = []
+    update: List[CostBulkUpdate] = []
+    delete: List[int] = []
+
+
+# Pola kosztu ustawiane przez edycję (wszystko z formularza poza current_user)
+COST_UPDATE_FIELDS = tuple(name for name in CostCreate.model_fields if name != 'current_user')
+
+
 class CostKindBase(BaseModel):
     kind: str
 
@@ -57,7 +166,7 @@ class CostKindResponse(CostKindBase):
 # Endpoint do pobierania wypłat dla oddziałów
 @router.get("/costs/branch_payouts")
 async def get_branch_payouts(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         year: Optional[int] = None,
         month: Optional[int] = None,
         branch: Optional[str] = None
@@ -66,21 +175,23 @@ async def get_branch_payouts(
     Pobiera sumy wypłat dla oddziałów z możliwością filtrowania.
     """
     try:
-        query = db.query(AllCosts)
+        filters = []
 
         # Zastosuj filtry
         if year is not None:
-            query = query.filter(AllCosts.cost_year == year)
+            filters.append(AllCosts.cost_year == year)
         if month is not None:
-            query = query.filter(AllCosts.cost_mo == month)
+            filters.append(AllCosts.cost_mo == month)
         if branch:
-            query = query.filter(AllCosts.cost_branch == branch)
+            filters.append(AllCosts.cost_branch == branch)
 
         # Pobierz dane zagregowane według oddziałów
-        branch_payouts = db.query(
-            AllCosts.cost_branch.label("branch"),
-            func.sum(AllCosts.branch_payout).label("total_payout")
-        ).filter(query.whereclause).group_by(AllCosts.cost_branch).all()
+        branch_payouts = (await db.execute(
+            select(
+                AllCosts.cost_branch.label("branch"),
+                func.sum(AllCosts.branch_payout).label("total_payout")
+            ).where(*filters).group_by(AllCosts.cost_branch)
+        )).all()
 
         # Formatowanie wyniku
         result = [
@@ -101,7 +212,7 @@ async def get_branch_payouts(
 # Zaktualizowany endpoint do pobierania wypłat dla przedstawicieli
 @router.get("/costs/representative_payouts")
 async def get_representative_payouts(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         year: Optional[int] = None,
         month: Optional[int] = None,
         rep: Optional[str] = None,
@@ -111,35 +222,37 @@ async def get_representative_payouts(
     Pobiera sumy wypłat dla przedstawicieli handlowych z możliwością filtrowania.
     """
     try:
-        query = db.query(AllCosts)
+        filters = []
 
         # Zastosuj filtry
         if year is not None:
-            query = query.filter(AllCosts.cost_year == year)
+            filters.append(AllCosts.cost_year == year)
         if month is not None:
-            query = query.filter(AllCosts.cost_mo == month)
+            filters.append(AllCosts.cost_mo == month)
         if rep:
-            query = query.filter(AllCosts.cost_ph == rep)
+            filters.append(AllCosts.cost_ph == rep)
         if branch:
-            query = query.filter(AllCosts.cost_branch == branch)
+            filters.append(AllCosts.cost_branch == branch)
 
         # Pobierz dane zagregowane według przedstawicieli
-        rep_payouts = db.query(
-            AllCosts.cost_ph.label("representative"),
-            AllCosts.cost_branch.label("branch"),
-            AllCosts.cost_year.label("year"),
-            AllCosts.cost_mo.label("month"),
-            func.sum(AllCosts.rep_payout).label("total_payout")
-        ).filter(
-            query.whereclause,
-            AllCosts.cost_ph.isnot(None),
-            AllCosts.cost_ph != ""
-        ).group_by(
-            AllCosts.cost_ph,
-            AllCosts.cost_branch,
-            AllCosts.cost_year,
-            AllCosts.cost_mo
-        ).all()
+        rep_payouts = (await db.execute(
+            select(
+                AllCosts.cost_ph.label("representative"),
+                AllCosts.cost_branch.label("branch"),
+                AllCosts.cost_year.label("year"),
+                AllCosts.cost_mo.label("month"),
+                func.sum(AllCosts.rep_payout).label("total_payout")
+            ).where(
+                *filters,
+                AllCosts.cost_ph.isnot(None),
+                AllCosts.cost_ph != ""
+            ).group_by(
+                AllCosts.cost_ph,
+                AllCosts.cost_branch,
+                AllCosts.cost_year,
+                AllCosts.cost_mo
+            )
+        )).all()
 
         # Formatowanie wyniku
         result = [
@@ -160,12 +273,12 @@ async def get_representative_payouts(
 
 
 @router.put("/costs/{cost_id}", response_model=CostCreate)
-async def update_cost(cost_id: int, cost: CostCreate, db: Session = Depends(get_db)):
+async def update_cost(cost_id: int, cost: CostCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Aktualizuje istniejący koszt.
     """
     try:
-        db_cost = db.query(AllCosts).filter(AllCosts.cost_id == cost_id).first()
+        db_cost = await db.get(AllCosts, cost_id)
         if not db_cost:
             raise HTTPException(status_code=404, detail="Nie znaleziono kosztu o podanym ID")
 
@@ -175,19 +288,16 @@ async def update_cost(cost_id: int, cost: CostCreate, db: Session = Depends(get_
         # ILUO wraca do puli dzięki odpięciu w DELETE) i ponowne przypisanie.
         is_iluo_cost = (
             db_cost.cost_4what == 'ILUO'
-            or db.query(CostsRaw).filter(CostsRaw.assigned_cost_id == cost_id).first() is not None
+            or (await db.scalar(
+                select(CostsRaw.id).where(CostsRaw.assigned_cost_id == cost_id).limit(1)
+            )) is not None
         )
         if is_iluo_cost:
-            raise HTTPException(
-                status_code=403,
-                detail="Koszt pochodzi z dokumentu ILUO i jest nieedytowalny. "
-                       "Aby skorygować, usuń koszt (dokument wróci do puli) i przypisz ponownie."
-            )
+            raise HTTPException(status_code=403, detail=ILUO_READONLY_DETAIL)
         # --- KONIEC KROKU 4e/4f ---
 
         # Sprawdź czy istnieje podany rodzaj kosztu
-        cost_kind = db.query(CostKind).filter(CostKind.kind == cost.cost_kind).first()
-        if not cost_kind:
+        if cost.cost_kind not in (await get_cost_kinds_async(db)).names:
             raise HTTPException(
                 status_code=400,
                 detail="Podany rodzaj kosztu nie istnieje"
@@ -197,34 +307,7 @@ async def update_cost(cost_id: int, cost: CostCreate, db: Session = Depends(get_
         new_values = cost.model_dump()
         current_user = new_values.pop('current_user', None)  # Wyciągnij current_user
 
-        # TYLKO pola edytowalne przez użytkownika w formularzu
-        editable_fields = {
-            'cost_contrahent',  # Nazwa kontrahenta
-            'cost_nip',  # NIP
-            'cost_doc_no',  # Numer faktury
-            'cost_value',  # Kwota
-            'cost_mo',  # Miesiąc
-            'cost_year',  # Rok
-            'cost_kind',  # Rodzaj kosztu
-            'cost_4what',  # Za co?
-            'cost_own',  # Właściciel kosztu
-            'cost_branch',  # Oddział
-            'cost_ph'  # Przedstawiciel
-        }
-
-        changes = {}
-
-        for key, new_value in new_values.items():
-            # Rejestruj TYLKO pola edytowalne
-            if key not in editable_fields:
-                continue
-
-            old_value = getattr(db_cost, key, None)
-            if old_value != new_value:
-                changes[key] = {
-                    "old": str(old_value) if old_value is not None else None,
-                    "new": str(new_value) if new_value is not None else None
-                }
+        changes = _audit_changes(db_cost, new_values)
 
         # Tylko jeśli są zmiany
         if changes:
@@ -241,29 +324,34 @@ async def update_cost(cost_id: int, cost: CostCreate, db: Session = Depends(get_
         for key, value in new_values.items():
             setattr(db_cost, key, value)
 
-        db.commit()
-        db.refresh(db_cost)
+        await db.commit()
+        await bump_costs_version()
+        # Nowy przedstawiciel w kosztach trafił do słownika (trigger) - odśwież cache
+        if db_cost.cost_ph:
+            invalidate_rep_directory()
+        await db.refresh(db_cost)
         return db_cost
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Błąd podczas aktualizacji kosztu: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Błąd wewnętrzny serwera: {str(e)}")
 
 
 @router.get("/costs/authors")
-async def get_cost_authors(db: Session = Depends(get_db)):
+async def get_cost_authors(db: AsyncSession = Depends(get_async_db)):
     """
     Pobiera listę unikalnych autorów kosztów.
     """
     try:
         # Pobieranie unikalnych autorów kosztów
-        authors = db.query(AllCosts.cost_author) \
-            .distinct() \
-            .order_by(AllCosts.cost_author) \
-            .all()
+        authors = (await db.execute(
+            select(AllCosts.cost_author)
+            .distinct()
+            .order_by(AllCosts.cost_author)
+        )).all()
 
         # Konwersja wyników zapytania do listy
         author_list = [author[0] for author in authors]
@@ -276,23 +364,13 @@ async def get_cost_authors(db: Session = Depends(get_db)):
 
 # Nowy endpoint do pobierania przedstawicieli handlowych
 @router.get("/costs/representatives")
-async def get_cost_representatives(db: Session = Depends(get_db)):
+async def get_cost_representatives(db: AsyncSession = Depends(get_async_db)):
     """
-    Pobiera listę unikalnych przedstawicieli handlowych z kosztów.
+    Pobiera listę unikalnych przedstawicieli handlowych z kosztów
+    (słownik representative_directory, cache procesu).
     """
     try:
-        # Pobieranie unikalnych przedstawicieli, ignorując wartości null i puste
-        representatives = db.query(AllCosts.cost_ph) \
-            .filter(AllCosts.cost_ph.isnot(None)) \
-            .filter(AllCosts.cost_ph != '') \
-            .distinct() \
-            .order_by(AllCosts.cost_ph) \
-            .all()
-
-        # Konwersja wyników zapytania do listy
-        representatives_list = [rep[0] for rep in representatives]
-
-        return representatives_list
+        return cost_representatives(await get_directory_async(db))
     except Exception as e:
         logger.error(f"Błąd podczas pobierania przedstawicieli: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Błąd wewnętrzny serwera: {str(e)}")
@@ -300,13 +378,12 @@ async def get_cost_representatives(db: Session = Depends(get_db)):
 
 # Cost Kinds endpoints
 @router.get("/cost_kinds", response_model=List[CostKindResponse])
-async def get_cost_kinds(db: Session = Depends(get_db)):
+async def get_cost_kinds(db: AsyncSession = Depends(get_async_db)):
     """
-    Pobiera listę wszystkich rodzajów kosztów.
+    Pobiera listę wszystkich rodzajów kosztów (cache procesu, cost_kind_cache.py).
     """
     try:
-        cost_kinds = db.query(CostKind).order_by(CostKind.kind).all()
-        return cost_kinds
+        return list((await get_cost_kinds_async(db)).entries)
     except Exception as e:
         logger.error(f"Błąd podczas pobierania rodzajów kosztów: {str(e)}")
         raise HTTPException(
@@ -316,7 +393,7 @@ async def get_cost_kinds(db: Session = Depends(get_db)):
 
 
 @router.post("/cost_kinds", response_model=CostKindResponse)
-async def create_cost_kind(cost_kind: CostKindCreate, db: Session = Depends(get_db)):
+async def create_cost_kind(cost_kind: CostKindCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Tworzy nowy rodzaj kosztu.
     """
@@ -327,7 +404,7 @@ async def create_cost_kind(cost_kind: CostKindCreate, db: Session = Depends(get_
                 detail="Nazwa rodzaju kosztu nie może być pusta"
             )
 
-        existing = db.query(CostKind).filter(CostKind.kind == cost_kind.kind).first()
+        existing = await db.scalar(select(CostKind).where(CostKind.kind == cost_kind.kind).limit(1))
         if existing:
             raise HTTPException(
                 status_code=400,
@@ -336,13 +413,14 @@ async def create_cost_kind(cost_kind: CostKindCreate, db: Session = Depends(get_
 
         db_cost_kind = CostKind(kind=cost_kind.kind)
         db.add(db_cost_kind)
-        db.commit()
-        db.refresh(db_cost_kind)
+        await db.commit()
+        invalidate_cost_kinds()
+        await db.refresh(db_cost_kind)
         return db_cost_kind
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas tworzenia rodzaju kosztu: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -351,12 +429,12 @@ async def create_cost_kind(cost_kind: CostKindCreate, db: Session = Depends(get_
 
 
 @router.get("/cost_kinds/{cost_kind_id}", response_model=CostKindResponse)
-async def get_cost_kind(cost_kind_id: int, db: Session = Depends(get_db)):
+async def get_cost_kind(cost_kind_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Pobiera szczegóły konkretnego rodzaju kosztu.
     """
     try:
-        cost_kind = db.query(CostKind).filter(CostKind.id == cost_kind_id).first()
+        cost_kind = (await get_cost_kinds_async(db)).by_id(cost_kind_id)
         if not cost_kind:
             raise HTTPException(
                 status_code=404,
@@ -377,7 +455,7 @@ async def get_cost_kind(cost_kind_id: int, db: Session = Depends(get_db)):
 async def update_cost_kind(
         cost_kind_id: int,
         cost_kind: CostKindCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Aktualizuje istniejący rodzaj kosztu.
@@ -389,19 +467,21 @@ async def update_cost_kind(
                 detail="Nazwa rodzaju kosztu nie może być pusta"
             )
 
-        db_cost_kind = db.query(CostKind).filter(CostKind.id == cost_kind_id).first()
+        db_cost_kind = await db.get(CostKind, cost_kind_id)
         if not db_cost_kind:
             raise HTTPException(
                 status_code=404,
                 detail="Nie znaleziono rodzaju kosztu"
             )
 
-        existing = db.query(CostKind).filter(
-            and_(
-                CostKind.kind == cost_kind.kind,
-                CostKind.id != cost_kind_id
-            )
-        ).first()
+        existing = await db.scalar(
+            select(CostKind).where(
+                and_(
+                    CostKind.kind == cost_kind.kind,
+                    CostKind.id != cost_kind_id
+                )
+            ).limit(1)
+        )
         if existing:
             raise HTTPException(
                 status_code=400,
@@ -409,13 +489,14 @@ async def update_cost_kind(
             )
 
         db_cost_kind.kind = cost_kind.kind
-        db.commit()
-        db.refresh(db_cost_kind)
+        await db.commit()
+        invalidate_cost_kinds()
+        await db.refresh(db_cost_kind)
         return db_cost_kind
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas aktualizacji rodzaju kosztu: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -424,12 +505,12 @@ async def update_cost_kind(
 
 
 @router.delete("/cost_kinds/{cost_kind_id}")
-async def delete_cost_kind(cost_kind_id: int, db: Session = Depends(get_db)):
+async def delete_cost_kind(cost_kind_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Usuwa rodzaj kosztu jeśli nie jest używany.
     """
     try:
-        db_cost_kind = db.query(CostKind).filter(CostKind.id == cost_kind_id).first()
+        db_cost_kind = await db.get(CostKind, cost_kind_id)
         if not db_cost_kind:
             raise HTTPException(
                 status_code=404,
@@ -437,22 +518,25 @@ async def delete_cost_kind(cost_kind_id: int, db: Session = Depends(get_db)):
             )
 
         # Sprawdź czy nie ma powiązanych kosztów
-        related_costs = db.query(AllCosts).filter(
-            AllCosts.cost_kind == db_cost_kind.kind
-        ).first()
+        related_costs = await db.scalar(
+            select(AllCosts.cost_id).where(
+                AllCosts.cost_kind == db_cost_kind.kind
+            ).limit(1)
+        )
         if related_costs:
             raise HTTPException(
                 status_code=400,
                 detail="Nie można usunąć rodzaju kosztu, który jest używany"
             )
 
-        db.delete(db_cost_kind)
-        db.commit()
+        await db.delete(db_cost_kind)
+        await db.commit()
+        invalidate_cost_kinds()
         return {"ok": True, "message": "Rodzaj kosztu został usunięty"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas usuwania rodzaju kosztu: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -462,22 +546,21 @@ async def delete_cost_kind(cost_kind_id: int, db: Session = Depends(get_db)):
 
 # Existing cost endpoints
 @router.post("/costs", response_model=CostCreate)
-async def create_cost(cost: CostCreate, db: Session = Depends(get_db)):
+async def create_cost(cost: CostCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Dodaje nowy koszt do bazy danych.
     Wartości cost_branch_value, cost_hq_value i cost_ph_value są obliczane automatycznie przez triggery bazodanowe.
     """
     try:
         # Sprawdź czy istnieje podany rodzaj kosztu
-        cost_kind = db.query(CostKind).filter(CostKind.kind == cost.cost_kind).first()
-        if not cost_kind:
+        if cost.cost_kind not in (await get_cost_kinds_async(db)).names:
             raise HTTPException(
                 status_code=400,
                 detail="Podany rodzaj kosztu nie istnieje"
             )
 
         # Pobierz aktualne wartości z config_current_date
-        config = db.query(ConfigCurrentDate).filter(ConfigCurrentDate.id == 1).first()
+        config = await get_config_date_async(db)
         if not config:
             raise HTTPException(status_code=404, detail="Nie znaleziono konfiguracji daty")
 
@@ -494,22 +577,220 @@ async def create_cost(cost: CostCreate, db: Session = Depends(get_db)):
         )
 
         db.add(db_cost)
-        db.commit()
-        db.refresh(db_cost)
+        await db.commit()
+        await bump_costs_version()
+        if db_cost.cost_ph:
+            invalidate_rep_directory()
+        await db.refresh(db_cost)
         return db_cost
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Błąd podczas dodawania kosztu: {str(e)}")
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Błąd wewnętrzny serwera: {str(e)}")
+
+
+@router.post("/costs/bulk")
+async def bulk_costs(payload: CostBulkRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Zbiorcze dodawanie, edycja i usuwanie kosztów (np. wprowadzanie na koniec miesiąca).
+
+    Rodzaje kosztów i data konfiguracji pochodzą z cache procesu, a poprawne pozycje
+    są zapisywane jedną instrukcją na rodzaj operacji (wielowierszowy INSERT, UPDATE
+    z VALUES, DELETE ... IN), wpisy audit logu jednym INSERT-em, całość jednym
+    commitem. Obowiązują reguły pojedynczych endpointów: rodzaj kosztu musi istnieć,
+    koszt z dokumentu ILUO nie może być edytowany, a jego usunięcie odpina dokument.
+
+    Wyniki są zwracane per pozycja, w kolejności list z żądania: błędna pozycja
+    (status "error" + detail) jest pomijana, pozostałe zostają zapisane.
+    """
+    items = len(payload.create) + len(payload.update) + len(payload.delete)
+    if not items:
+        raise HTTPException(status_code=400, detail="Partia nie zawiera żadnych pozycji")
+    if items > COSTS_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Partia może zawierać najwyżej {COSTS_BULK_MAX_ITEMS} pozycji"
+        )
+
+    results = {
+        "create": [{"status": "ok", "cost_id": None} for _ in payload.create],
+        "update": [{"status": "ok", "cost_id": cost.cost_id} for cost in payload.update],
+        "delete": [{"status": "ok", "cost_id": cost_id} for cost_id in payload.delete],
+    }
+
+    def fail(op: str, index: int, detail: str):
+        results[op][index] = {"status": "error", "cost_id": results[op][index]["cost_id"], "detail": detail}
+
+    try:
+        kinds = (await get_cost_kinds_async(db)).names
+
+        # --- Walidacja: jedno zapytanie na rodzaj danych dla całej partii ---
+        update_ids = {cost.cost_id for cost in payload.update}
+        delete_ids = set(payload.delete)
+        existing = {}
+        iluo_assigned = set()
+        if update_ids or delete_ids:
+            # FOR UPDATE: równoległa edycja/usunięcie tych kosztów czeka do commitu partii
+            existing = {
+                cost.cost_id: cost
+                for cost in (await db.scalars(
+                    select(AllCosts).where(AllCosts.cost_id.in_(update_ids | delete_ids))
+                    .order_by(AllCosts.cost_id).with_for_update()
+                )).all()
+            }
+        if update_ids:
+            iluo_assigned = set((await db.scalars(
+                select(CostsRaw.assigned_cost_id).where(CostsRaw.assigned_cost_id.in_(update_ids)).distinct()
+            )).all())
+
+        create_rows = []
+        if payload.create:
+            config = await get_config_date_async(db)
+            if not config:
+                raise HTTPException(status_code=404, detail="Nie znaleziono konfiguracji daty")
+            for index, cost in enumerate(payload.create):
+                if cost.cost_kind not in kinds:
+                    fail("create", index, "Podany rodzaj kosztu nie istnieje")
+                    continue
+                create_rows.append((index, {
+                    **cost.model_dump(exclude={'current_user'}),
+                    "cur_day": config.day_value,
+                    "cur_mo": config.month_value,
+                    "cur_yr": config.year_value,
+                }))
+
+        update_rows = []
+        update_index = {}
+        audit_rows = []
+        seen = set()
+        for index, cost in enumerate(payload.update):
+            db_cost = existing.get(cost.cost_id)
+            if cost.cost_id in seen:
+                fail("update", index, "Koszt występuje w partii kilka razy")
+            elif cost.cost_id in delete_ids:
+                fail("update", index, "Koszt jest w tej samej partii edytowany i usuwany")
+            elif db_cost is None:
+                fail("update", index, "Nie znaleziono kosztu o podanym ID")
+            # KROK 4e/4f: koszty z dokumentów ILUO są nieedytowalne
+            elif db_cost.cost_4what == 'ILUO' or cost.cost_id in iluo_assigned:
+                fail("update", index, ILUO_READONLY_DETAIL)
+            elif cost.cost_kind not in kinds:
+                fail("update", index, "Podany rodzaj kosztu nie istnieje")
+            else:
+                new_values = cost.model_dump(include=set(COST_UPDATE_FIELDS))
+                update_rows.append({"cost_id": cost.cost_id, **new_values})
+                update_index[cost.cost_id] = index
+                changes = _audit_changes(db_cost, new_values)
+                if changes:
+                    audit_rows.append({
+                        "event_type": 'UPDATE',
+                        "cost_id": cost.cost_id,
+                        "user_name": payload.current_user,
+                        "changes": changes
+                    })
+            seen.add(cost.cost_id)
+
+        deleted_ids = []
+        seen = set()
+        for index, cost_id in enumerate(payload.delete):
+            if cost_id in seen:
+                fail("delete", index, "Koszt występuje w partii kilka razy")
+            elif cost_id not in existing:
+                fail("delete", index, "Nie znaleziono kosztu o podanym ID")
+            else:
+                deleted_ids.append(cost_id)
+                audit_rows.append({
+                    "event_type": 'DELETE',
+                    "cost_id": cost_id,
+                    "user_name": payload.current_user,
+                    "changes": _deleted_snapshot(existing[cost_id])
+                })
+            seen.add(cost_id)
+
+        # --- Zapis: jedna instrukcja na rodzaj operacji ---
+        costs = AllCosts.__table__
+        if create_rows:
+            created_ids = (await db.execute(
+                insert(costs).returning(costs.c.cost_id, sort_by_parameter_order=True),
+                [row for _, row in create_rows]
+            )).scalars().all()
+            for (index, _), cost_id in zip(create_rows, created_ids):
+                results["create"][index]["cost_id"] = cost_id
+
+        if update_rows:
+            # VALUES z typami kolumn all_costs; CAST w SET, bo kolumna z samymi NULL-ami ma w VALUES typ text
+            batch = values(
+                column('cost_id', costs.c.cost_id.type),
+                *(column(name, costs.c[name].type) for name in COST_UPDATE_FIELDS),
+                name='batch'
+            ).data([tuple(row[name] for name in ('cost_id',) + COST_UPDATE_FIELDS) for row in update_rows])
+            # NOT EXISTS: dokument ILUO przypisany po walidacji (poza blokadą wierszy
+            # all_costs) nie pozwala już edytować kosztu - pozycja wraca jako błąd
+            updated_ids = set((await db.execute(
+                update(costs)
+                .where(
+                    costs.c.cost_id == batch.c.cost_id,
+                    ~exists().where(CostsRaw.assigned_cost_id == costs.c.cost_id)
+                )
+                .values({name: cast(batch.c[name], costs.c[name].type) for name in COST_UPDATE_FIELDS})
+                .returning(costs.c.cost_id)
+            )).scalars().all())
+            skipped_ids = {row["cost_id"] for row in update_rows} - updated_ids
+            if skipped_ids:
+                for cost_id in skipped_ids:
+                    fail("update", update_index[cost_id], ILUO_READONLY_DETAIL)
+                update_rows = [row for row in update_rows if row["cost_id"] in updated_ids]
+                audit_rows = [
+                    row for row in audit_rows
+                    if row["event_type"] != 'UPDATE' or row["cost_id"] in updated_ids
+                ]
+
+        if deleted_ids:
+            # KROK 4d: odepnij dokumenty ILUO usuwanych kosztów - wracają do puli
+            unassigned = (await db.execute(
+                update(CostsRaw).where(
+                    CostsRaw.assigned_cost_id.in_(deleted_ids)
+                ).values(
+                    assigned_cost_id=None, assigned_at=None, assigned_by=None
+                ).execution_options(synchronize_session=False)
+            )).rowcount
+            if unassigned:
+                logger.info(f"Odpięto {unassigned} dokument(y) ILUO od usuwanych kosztów")
+            await db.execute(delete(costs).where(costs.c.cost_id.in_(deleted_ids)))
+
+        if audit_rows:
+            await db.execute(insert(CostAuditLog.__table__), audit_rows)
+
+        await db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Błąd podczas zbiorczego zapisu kosztów: {str(e)}")
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Błąd wewnętrzny serwera: {str(e)}")
 
+    if create_rows or update_rows or deleted_ids:
+        await bump_costs_version()
+    # Nowi przedstawiciele w kosztach trafili do słownika (trigger) - odśwież cache
+    if any(row["cost_ph"] for _, row in create_rows) or any(row["cost_ph"] for row in update_rows):
+        invalidate_rep_directory()
+
+    return {
+        "created": len(create_rows),
+        "updated": len(update_rows),
+        "deleted": len(deleted_ids),
+        "failed": sum(result["status"] == "error" for op in results.values() for result in op),
+        "results": results,
+    }
+
 
 # ZAKTUALIZOWANY ENDPOINT Z OBSŁUGĄ WYSZUKIWANIA
 @router.get("/costs")
 async def get_costs(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         year: Optional[int] = None,
         month: Optional[int] = None,
         branch: Optional[str] = None,
@@ -519,74 +800,149 @@ async def get_costs(
         cost_ph: Optional[str] = None,
         # --- DODANE PARAMETRY DLA WYSZUKIWANIA ---
         contrahent_like: Optional[str] = None,  # Wyszukiwanie kontrahenta
+        search: Optional[str] = None,  # Kontrahent, NIP albo numer dokumentu
         amount_gte: Optional[float] = None,  # Minimalna kwota
         amount_lte: Optional[float] = None,  # Maksymalna kwota
         # ----------------------------------------
         limit: int = Query(100, ge=1, le=1000),
-        offset: int = Query(0, ge=0)
+        offset: int = Query(0, ge=0),
+        cursor: Optional[int] = Query(None, description="next_cursor z poprzedniej strony (keyset po cost_id)")
 ):
     """
     Pobiera listę kosztów z możliwością filtrowania po różnych parametrach.
 
     Nowe parametry:
     - contrahent_like: Wyszukiwanie kontrahenta (LIKE '%text%')
+    - search: fragment nazwy kontrahenta, NIP-u albo numeru dokumentu
     - amount_gte: Minimalna kwota kosztu
     - amount_lte: Maksymalna kwota kosztu
+    - cursor: kolejna strona od next_cursor (zamiast offset - bez przewijania
+      wcześniejszych wierszy)
+
+    Z parametrem search wyniki są sortowane wg trafności (word similarity, pg_trgm),
+    a potem po cost_id; takie strony pobiera się przez offset - cursor jest wtedy
+    niedostępny (next_cursor = null).
+
+    total i total_sum dotyczą całego filtra (niezależnie od kursora).
     """
+    search = search.strip() if search else None
+    if search and cursor is not None:
+        raise HTTPException(status_code=400, detail="Parametr cursor nie jest obsługiwany razem z search")
     try:
-        query = db.query(AllCosts)
+        filters = []
 
         # Istniejące filtry
         if year is not None:
-            query = query.filter(AllCosts.cost_year == year)
+            filters.append(AllCosts.cost_year == year)
         if month is not None:
-            query = query.filter(AllCosts.cost_mo == month)
+            filters.append(AllCosts.cost_mo == month)
         if branch:
-            query = query.filter(AllCosts.cost_branch == branch)
+            filters.append(AllCosts.cost_branch == branch)
         if cost_own:
-            query = query.filter(AllCosts.cost_own == cost_own)
+            filters.append(AllCosts.cost_own == cost_own)
         if cost_kind:
-            query = query.filter(AllCosts.cost_kind == cost_kind)
+            filters.append(AllCosts.cost_kind == cost_kind)
         if cost_author:
-            query = query.filter(AllCosts.cost_author == cost_author)
+            filters.append(AllCosts.cost_author == cost_author)
         if cost_ph:
-            query = query.filter(AllCosts.cost_ph == cost_ph)
+            filters.append(AllCosts.cost_ph == cost_ph)
 
         # --- DODANE FILTRY WYSZUKIWANIA ---
-        # Wyszukiwanie kontrahenta (case-insensitive)
+        # Wyszukiwanie kontrahenta (case-insensitive) - indeksy trigramowe
+        # (migrations/010_costs_trigram_search.sql) obsługują ILIKE '%tekst%'
         if contrahent_like:
-            query = query.filter(
-                AllCosts.cost_contrahent.ilike(f"%{contrahent_like}%")
+            filters.append(
+                AllCosts.cost_contrahent.ilike(f"%{_escape_like(contrahent_like)}%")
             )
+        if search:
+            pattern = f"%{_escape_like(search)}%"
+            filters.append(or_(
+                AllCosts.cost_contrahent.ilike(pattern),
+                AllCosts.cost_nip.ilike(pattern),
+                AllCosts.cost_doc_no.ilike(pattern)
+            ))
 
         # Filtrowanie po kwocie
         if amount_gte is not None:
-            query = query.filter(AllCosts.cost_value >= amount_gte)
+            filters.append(AllCosts.cost_value >= amount_gte)
 
         if amount_lte is not None:
-            query = query.filter(AllCosts.cost_value <= amount_lte)
+            filters.append(AllCosts.cost_value <= amount_lte)
         # ------------------------------------
 
-        # Pobierz całkowitą liczbę rekordów dla danego filtra
-        total_count = query.count()
-
-        # Oblicz sumę cost_value dla wszystkich filtrowanych rekordów
-        total_sum = query.with_entities(func.sum(AllCosts.cost_value)).scalar() or 0
-
-        # Zastosuj paginację
-        costs = query.order_by(AllCosts.cost_id.desc()).offset(offset).limit(limit).all()
-
-        # Debug info (można usunąć w produkcji)
-        logger.info(
-            f"Filtry wyszukiwania: contrahent_like={contrahent_like}, amount_gte={amount_gte}, amount_lte={amount_lte}")
-        logger.info(f"Znaleziono {total_count} kosztów, zwracam {len(costs)} rekordów")
+        # Sumy dla zestawu filtrów - w cache do następnego zapisu kosztu
+        totals_params = {
+            "year": year, "month": month, "branch": branch, "cost_own": cost_own,
+            "cost_kind": cost_kind, "cost_author": cost_author, "cost_ph": cost_ph,
+            "contrahent_like": contrahent_like, "search": search, "amount_gte": amount_gte, "amount_lte": amount_lte,
+        }
+        totals, totals_key = await get_cached_value("costs_totals", totals_params, version_key=COSTS_VERSION_KEY)
+
+        # Z kursorem offset jest ignorowany (jak w /transactions/zero-margin) -
+        # klient przesyłający oba parametry nie gubi wierszy
+        page_offset = offset if cursor is None else 0
+        page_filters = list(filters)
+        if cursor is not None:
+            page_filters.append(AllCosts.cost_id < cursor)
+
+        if totals is not None:
+            # Sumy z cache - zostaje tylko strona (indeks po cost_id)
+            order = [AllCosts.cost_id.desc()]
+            if search:
+                order.insert(0, _search_rank(search, AllCosts).desc())
+            costs = [
+                dict(row) for row in (await db.execute(
+                    select(*COST_COLUMNS).where(*page_filters)
+                    .order_by(*order).offset(page_offset).limit(limit + 1)
+                )).mappings()
+            ]
+        else:
+            # Strona, liczność i suma w jednym zapytaniu - filtr czytany raz (CTE)
+            filtered = select(*COST_COLUMNS).where(*filters).cte("filtered")
+            summary = select(
+                func.count().label("total"),
+                func.coalesce(func.sum(filtered.c.cost_value), 0).label("total_sum")
+            ).select_from(filtered).cte("summary")
+            page_query = select(filtered)
+            page_order = [filtered.c.cost_id.desc()]
+            if search:
+                rank = _search_rank(search, filtered.c)
+                page_query = page_query.add_columns(rank.label("search_rank"))
+                page_order.insert(0, rank.desc())
+            if cursor is not None:
+                page_query = page_query.where(filtered.c.cost_id < cursor)
+            page = page_query.order_by(*page_order).offset(page_offset).limit(limit + 1).cte("page")
+
+            order = [page.c.cost_id.desc()]
+            if search:
+                order.insert(0, page.c.search_rank.desc())
+            rows = (await db.execute(
+                select(summary.c.total, summary.c.total_sum, page)
+                .select_from(summary.outerjoin(page, true()))
+                .order_by(*order)
+            )).mappings().all()
+
+            totals = {"total": rows[0]["total"], "total_sum": float(rows[0]["total_sum"])}
+            await set_cached_value(totals_key, totals, ttl=COSTS_TOTALS_TTL_SECONDS)
+            costs = [
+                {column: row[column] for column in COST_COLUMN_NAMES}
+                for row in rows if row["cost_id"] is not None
+            ]
+
+        # limit + 1 wierszy: dodatkowy oznacza, że jest następna strona
+        next_cursor = None
+        if len(costs) > limit:
+            costs = costs[:limit]
+            # Kolejność wg trafności nie pasuje do kursora po cost_id
+            next_cursor = None if search else costs[-1]["cost_id"]
 
         return {
-            "total": total_count,
-            "total_sum": float(total_sum),
+            "total": totals["total"],
+            "total_sum": totals["total_sum"],
             "costs": costs,
-            "offset": offset,
-            "limit": limit
+            "offset": page_offset,
+            "limit": limit,
+            "next_cursor": next_cursor
         }
 
     except Exception as e:
@@ -596,78 +952,88 @@ async def get_costs(
 
 @router.get("/costs/summary")
 async def get_costs_summary(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         year: Optional[int] = None,
         month: Optional[int] = None,
         branch: Optional[str] = None,
-        cost_ph: Optional[str] = None  # Dodane filtrowanie po przedstawicielu
+        cost_ph: Optional[str] = None,  # Dodane filtrowanie po przedstawicielu
+        breakdown: bool = Query(False, description="Dodaj podziały po oddziale, właścicielu, miesiącu i przedstawicielu")
 ):
     """
     Zwraca podsumowanie kosztów z podziałem na różne kategorie.
     Możliwość filtrowania po roku, miesiącu, oddziale i przedstawicielu.
+
+    Sumy i podziały liczy jedno zapytanie GROUPING SETS. Z breakdown=true
+    odpowiedź zawiera dodatkowo by_branch, by_owner, by_month i by_representative
+    (z sumami wypłat branch_payout / rep_payout) - jeden request zamiast
+    osobnych wywołań /costs/branch_payouts i /costs/representative_payouts.
     """
     try:
-        query = db.query(AllCosts)
+        filters = []
 
         if year is not None:
-            query = query.filter(AllCosts.cost_year == year)
+            filters.append(AllCosts.cost_year == year)
         if month is not None:
-            query = query.filter(AllCosts.cost_mo == month)
+            filters.append(AllCosts.cost_mo == month)
         if branch:
-            query = query.filter(AllCosts.cost_branch == branch)
+            filters.append(AllCosts.cost_branch == branch)
         if cost_ph:
-            query = query.filter(AllCosts.cost_ph == cost_ph)  # Dodany filtr po przedstawicielu
-
-        # Jeśli podano przedstawiciela, zwracamy tylko jego koszty
-        if cost_ph:
-            summary = db.query(
-                func.sum(AllCosts.cost_value).label("total_cost"),
-                func.sum(AllCosts.cost_ph_value).label("total_ph_cost")
-            ).filter(query.whereclause).first()
-
-            # Podsumowanie według kategorii kosztów dla przedstawiciela
-            cost_types = db.query(
-                AllCosts.cost_kind,
-                func.sum(AllCosts.cost_value).label("total")
-            ).filter(query.whereclause).group_by(AllCosts.cost_kind).all()
-
-            return {
-                "total_summary": {
-                    "total_cost": float(summary.total_cost or 0),
-                    "total_ph_cost": float(summary.total_ph_cost or 0)
-                },
-                "by_cost_type": {
-                    item.cost_kind: float(item.total or 0)
-                    for item in cost_types
-                }
-            }
-        else:
-            # Standardowe podsumowanie dla wszystkich
-            summary = db.query(
+            filters.append(AllCosts.cost_ph == cost_ph)  # Dodany filtr po przedstawicielu
+
+        dimensions = SUMMARY_DIMENSIONS if breakdown else SUMMARY_DIMENSIONS[:1]
+        columns = [column for _, _, column in dimensions]
+        rows = (await db.execute(
+            select(
+                *columns,
+                func.grouping(*columns).label("grouping_id"),
                 func.sum(AllCosts.cost_value).label("total_cost"),
                 func.sum(AllCosts.cost_branch_value).label("total_branch_cost"),
                 func.sum(AllCosts.cost_hq_value).label("total_hq_cost"),
-                func.sum(AllCosts.cost_ph_value).label("total_ph_cost")
-            ).filter(query.whereclause).first()
-
-            # Podsumowanie według kategorii kosztów
-            cost_types = db.query(
-                AllCosts.cost_kind,
-                func.sum(AllCosts.cost_value).label("total")
-            ).filter(query.whereclause).group_by(AllCosts.cost_kind).all()
-
-            return {
-                "total_summary": {
-                    "total_cost": float(summary.total_cost or 0),
-                    "total_branch_cost": float(summary.total_branch_cost or 0),
-                    "total_hq_cost": float(summary.total_hq_cost or 0),
-                    "total_ph_cost": float(summary.total_ph_cost or 0)
-                },
-                "by_cost_type": {
-                    item.cost_kind: float(item.total or 0)
-                    for item in cost_types
-                }
+                func.sum(AllCosts.cost_ph_value).label("total_ph_cost"),
+                func.sum(AllCosts.branch_payout).label("branch_payout"),
+                func.sum(AllCosts.rep_payout).label("rep_payout")
+            ).where(*filters).group_by(func.grouping_sets(tuple_(), *columns))
+        )).all()
+
+        # GROUPING(...) ma bit 1 dla każdej kolumny spoza zbioru grupowania:
+        # wiersz sumy ogólnej ma wszystkie bity, wiersz podziału - wszystkie poza swoim
+        all_bits = (1 << len(columns)) - 1
+        grouped = {name: [] for name, _, _ in dimensions}
+        total = None
+        for row in rows:
+            if row.grouping_id == all_bits:
+                total = row
+                continue
+            for position, name in enumerate(grouped):
+                if row.grouping_id == all_bits ^ (1 << (len(columns) - 1 - position)):
+                    grouped[name].append((row[position], row))
+                    break
+
+        def amount(row, field):
+            return float(getattr(row, field) or 0) if row is not None else 0.0
+
+        # Jeśli podano przedstawiciela, sumy dotyczą tylko jego kosztów
+        summary_fields = SUMMARY_PH_FIELDS if cost_ph else SUMMARY_FIELDS
+        result = {
+            "total_summary": {field: amount(total, field) for field in summary_fields},
+            "by_cost_type": {
+                kind: amount(row, "total_cost")
+                for kind, row in grouped["by_cost_type"]
             }
+        }
+
+        for name, key, _ in dimensions[1:]:
+            result[name] = [
+                {
+                    key: value,
+                    **{field: amount(row, field) for field in summary_fields + SUMMARY_PAYOUT_FIELDS}
+                }
+                for value, row in sorted(grouped[name], key=lambda item: (item[0] is None, item[0]))
+                # Koszty bez przedstawiciela nie tworzą pozycji by_representative
+                if name != "by_representative" or value
+            ]
+
+        return result
 
     except Exception as e:
         logger.error(f"Błąd podczas pobierania podsumowania kosztów: {str(e)}")
@@ -676,7 +1042,7 @@ async def get_costs_summary(
 
 @router.get("/costs/representatives-summary")
 async def get_representatives_costs_summary(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         year: Optional[int] = None,
         month: Optional[int] = None,
         branch: Optional[str] = None,
@@ -688,13 +1054,13 @@ async def get_representatives_costs_summary(
     """
     try:
         # Podstawowe zapytanie z agregacją
-        query = db.query(
+        query = select(
             AllCosts.cost_ph.label("representative"),
             AllCosts.cost_year.label("year"),
             AllCosts.cost_mo.label("month"),
             AllCosts.cost_branch.label("branch"),
             func.sum(AllCosts.cost_ph_value).label("total_ph_cost")
-        ).filter(
+        ).where(
             AllCosts.cost_ph.isnot(None),
             AllCosts.cost_ph != "",
             AllCosts.cost_ph_value.isnot(None),
@@ -703,13 +1069,13 @@ async def get_representatives_costs_summary(
 
         # Zastosuj filtry opcjonalne
         if year is not None:
-            query = query.filter(AllCosts.cost_year == year)
+            query = query.where(AllCosts.cost_year == year)
         if month is not None:
-            query = query.filter(AllCosts.cost_mo == month)
+            query = query.where(AllCosts.cost_mo == month)
         if branch:
-            query = query.filter(AllCosts.cost_branch == branch)
+            query = query.where(AllCosts.cost_branch == branch)
         if representative:
-            query = query.filter(AllCosts.cost_ph == representative)
+            query = query.where(AllCosts.cost_ph == representative)
 
         # Grupowanie po wszystkich wymiarach
         query = query.group_by(
@@ -725,7 +1091,7 @@ async def get_representatives_costs_summary(
         )
 
         # Wykonaj zapytanie
-        results = query.all()
+        results = (await db.execute(query)).all()
 
         # Formatuj wyniki
         data = []
@@ -774,13 +1140,67 @@ async def get_representatives_costs_summary(
         )
 
 
+@router.get("/costs/contractors/suggest")
+async def suggest_contractors(
+        db: AsyncSession = Depends(get_async_db),
+        q: str = Query(..., min_length=1, description="Początek nazwy kontrahenta albo NIP-u"),
+        limit: int = Query(10, ge=1, le=50)
+):
+    """
+    Podpowiedzi kontrahentów (typeahead) ze słownika cost_contractors:
+    najbliższe nazwy wg word similarity (sortowanie KNN po indeksie GiST),
+    a dla tekstu z samych cyfr - NIP-y o tym początku.
+    WAŻNE: ta trasa MUSI być przed /costs/{cost_id}.
+    """
+    try:
+        q = q.strip()
+        digits = q.replace("-", "").replace(" ", "")
+        if digits.isdigit():
+            rows = (await db.execute(
+                select(
+                    CostContractor.cost_contrahent,
+                    CostContractor.cost_nip,
+                    CostContractor.uses,
+                    literal(1.0).label("score")
+                )
+                .where(or_(
+                    CostContractor.cost_nip.like(f"{_escape_like(q)}%"),
+                    CostContractor.cost_nip.like(f"{digits}%")
+                ))
+                .order_by(CostContractor.uses.desc())
+                .limit(limit)
+            )).mappings().all()
+        else:
+            # Próg dla operatora <% - tylko w tej transakcji
+            await db.execute(
+                text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+                {"threshold": str(SUGGEST_MIN_SIMILARITY)}
+            )
+            rows = (await db.execute(
+                text("""
+                    SELECT cost_contrahent, cost_nip, uses,
+                           word_similarity(:q, cost_contrahent) AS score
+                    FROM cost_contractors
+                    WHERE :q <% cost_contrahent
+                    ORDER BY :q <<-> cost_contrahent, uses DESC
+                    LIMIT :limit
+                """),
+                {"q": q, "limit": limit}
+            )).mappings().all()
+
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Błąd podczas podpowiedzi kontrahentów: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Błąd wewnętrzny serwera: {str(e)}")
+
+
 @router.get("/costs/{cost_id}")
-async def get_cost_by_id(cost_id: int, db: Session = Depends(get_db)):
+async def get_cost_by_id(cost_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Pobiera szczegóły konkretnego kosztu na podstawie jego ID.
     """
     try:
-        cost = db.query(AllCosts).filter(AllCosts.cost_id == cost_id).first()
+        cost = await db.get(AllCosts, cost_id)
         if not cost:
             raise HTTPException(status_code=404, detail="Nie znaleziono kosztu o podanym ID")
         return cost
@@ -793,7 +1213,7 @@ async def get_cost_by_id(cost_id: int, db: Session = Depends(get_db)):
 async def delete_cost(
         cost_id: int,
         current_user: str = Query(..., description="Nazwa użytkownika usuwającego koszt"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Usuwa koszt o podanym ID z bazy danych.
@@ -802,51 +1222,37 @@ async def delete_cost(
     do puli "do przypisania".
     """
     try:
-        cost = db.query(AllCosts).filter(AllCosts.cost_id == cost_id).first()
+        cost = await db.get(AllCosts, cost_id)
         if not cost:
             raise HTTPException(status_code=404, detail="Nie znaleziono kosztu o podanym ID")
 
         # --- AUDIT LOG: Zarejestruj usunięcie ze stanem kosztu ---
-        # Zapisz wszystkieważne pola kosztu przed usunięciem
-        deleted_cost_snapshot = {
-            "cost_contrahent": str(cost.cost_contrahent),
-            "cost_nip": str(cost.cost_nip),
-            "cost_doc_no": str(cost.cost_doc_no),
-            "cost_value": str(cost.cost_value),
-            "cost_mo": str(cost.cost_mo),
-            "cost_year": str(cost.cost_year),
-            "cost_kind": str(cost.cost_kind),
-            "cost_4what": str(cost.cost_4what),
-            "cost_own": str(cost.cost_own),
-            "cost_branch": str(cost.cost_branch),
-            "cost_ph": str(cost.cost_ph) if cost.cost_ph else None,
-            "cost_author": str(cost.cost_author)
-        }
-
         audit_entry = CostAuditLog(
             event_type='DELETE',
             cost_id=cost_id,
             user_name=current_user,
-            changes=deleted_cost_snapshot  # Zapisz stan kosztu w momencie usunięcia
+            changes=_deleted_snapshot(cost)  # Zapisz stan kosztu w momencie usunięcia
         )
         db.add(audit_entry)
         # --- KONIEC AUDIT LOG ---
 
         # --- KROK 4d: odepnij dokument(y) ILUO wskazujące na ten koszt ---
-        unassigned = db.query(CostsRaw).filter(
-            CostsRaw.assigned_cost_id == cost_id
-        ).update(
-            {"assigned_cost_id": None, "assigned_at": None, "assigned_by": None},
-            synchronize_session=False,
-        )
+        unassigned = (await db.execute(
+            update(CostsRaw).where(
+                CostsRaw.assigned_cost_id == cost_id
+            ).values(
+                assigned_cost_id=None, assigned_at=None, assigned_by=None
+            ).execution_options(synchronize_session=False)
+        )).rowcount
         if unassigned:
             logger.info(f"Odpięto {unassigned} dokument(y) ILUO od usuwanego kosztu {cost_id}")
         # --- KONIEC KROKU 4d ---
 
-        db.delete(cost)
-        db.commit()
+        await db.delete(cost)
+        await db.commit()
+        await bump_costs_version()
         return {"status": "success", "message": f"Koszt o ID {cost_id} został usunięty"}
     except Exception as e:
         logger.error(f"Błąd podczas usuwania kosztu: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Błąd wewnętrzny serwera: {str(e)}")
\ No newline at end of file
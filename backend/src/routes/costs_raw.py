@@ -18,14 +18,17 @@ KROK 4b: endpoint przypisania + status przypisania na liście.
 import re
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc, Numeric, Date, case, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, asc, Numeric, Date, case, or_, select
 import logging
 from typing import List, Optional, Any, Tuple
 
 from models.costs_raw import CostsRaw
-from models.transaction import AllCosts, ConfigCurrentDate
-from database import get_db
+from models.transaction import AllCosts
+from database import get_async_db, get_async_read_db
+from config_cache import get_config_date_async
+from cache import bump_costs_version
+from responses import json_response
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -281,32 +284,35 @@ def _is_commission_document(pozycje: Any) -> bool:
     return len(nazwy) == 1 and nazwy.pop().casefold() == COMMISSION_POSITION_NAME
 
 
-def _build_header(row: CostsRaw) -> CostRawHeader:
-    """Rozbija surowy naglowek (JSONB) na płaski nagłówek + status przypisania."""
+def _build_header(row: CostsRaw) -> dict:
+    """
+    Rozbija surowy naglowek (JSONB) na płaski nagłówek + status przypisania.
+    Zwraca dict o polach CostRawHeader - lista serializuje go bez tworzenia modeli.
+    """
     n = row.naglowek if isinstance(row.naglowek, dict) else {}
     pozycje = row.pozycje if isinstance(row.pozycje, list) else []
     oddzial_kod, oddzial_disp = _resolve_branch(n.get("numer"))
     assigned_at = getattr(row, "assigned_at", None)
-    return CostRawHeader(
-        id=row.id,
-        numer=n.get("numer"),
-        data=n.get("data"),
-        nip=n.get("nip"),
-        nazwa_skrocona=n.get("nazwa_skrocona"),
-        netto=_to_float(n.get("netto")),
-        vat=_to_float(n.get("vat")),
-        brutto=_to_float(n.get("brutto")),
-        etykieta=n.get("etykieta"),
-        punkt_handlowy=n.get("punkt_handlowy"),
-        oddzial=oddzial_kod,
-        oddzial_display=oddzial_disp,
-        numer_obcy=n.get("numer_obcy"),
-        liczba_pozycji=len(pozycje),
-        prowizja=_is_commission_document(pozycje),
-        assigned_cost_id=getattr(row, "assigned_cost_id", None),
-        assigned_at=assigned_at.isoformat() if assigned_at else None,
-        assigned_by=getattr(row, "assigned_by", None),
-    )
+    return {
+        "id": row.id,
+        "numer": n.get("numer"),
+        "data": n.get("data"),
+        "nip": n.get("nip"),
+        "nazwa_skrocona": n.get("nazwa_skrocona"),
+        "netto": _to_float(n.get("netto")),
+        "vat": _to_float(n.get("vat")),
+        "brutto": _to_float(n.get("brutto")),
+        "etykieta": n.get("etykieta"),
+        "punkt_handlowy": n.get("punkt_handlowy"),
+        "oddzial": oddzial_kod,
+        "oddzial_display": oddzial_disp,
+        "numer_obcy": n.get("numer_obcy"),
+        "liczba_pozycji": len(pozycje),
+        "prowizja": _is_commission_document(pozycje),
+        "assigned_cost_id": getattr(row, "assigned_cost_id", None),
+        "assigned_at": assigned_at.isoformat() if assigned_at else None,
+        "assigned_by": getattr(row, "assigned_by", None),
+    }
 
 
 # ============================================================
@@ -326,7 +332,7 @@ _SORTABLE = {
 
 @router.get("/costs-iluo", response_model=CostRawListResponse)
 async def get_costs_iluo(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_read_db),
         # --- filtry (po polach JSON naglowek) ---
         oddzial: Optional[str] = None,         # filtr po KODZIE oddziału legacy
         wyklucz_oddzialy: Optional[str] = None,  # kody po przecinku do WYKLUCZENIA (np. "HQ" dla BOARD)
@@ -350,45 +356,45 @@ async def get_costs_iluo(
     obowiązują flagi produkcyjne (data graniczna, wymóg etykiety).
     """
     try:
-        query = db.query(CostsRaw)
+        filters = []
 
         # --- Tylko dokumenty z rozpoznanym oddziałem ---
-        query = query.filter(_branch_expr().isnot(None))
+        filters.append(_branch_expr().isnot(None))
 
         # --- FLAGA: data graniczna (rzutowanie ::date, odporne na timestampy) ---
         if ILUO_DATE_FILTER_ENABLED:
-            query = query.filter(
+            filters.append(
                 func.cast(CostsRaw.naglowek["data"].astext, Date) >= ILUO_MIN_DATE
             )
 
         # --- FLAGA: wymóg etykiety (nadpisuje parametr ma_etykiete z frontu) ---
         if ILUO_REQUIRE_LABEL:
-            query = query.filter(func.trim(CostsRaw.naglowek["etykieta"].astext) != "")
+            filters.append(func.trim(CostsRaw.naglowek["etykieta"].astext) != "")
         else:
             if ma_etykiete is True:
-                query = query.filter(func.trim(CostsRaw.naglowek["etykieta"].astext) != "")
+                filters.append(func.trim(CostsRaw.naglowek["etykieta"].astext) != "")
             elif ma_etykiete is False:
-                query = query.filter(
+                filters.append(
                     func.coalesce(func.trim(CostsRaw.naglowek["etykieta"].astext), "") == ""
                 )
 
         # --- Filtr statusu przypisania ---
         if przypisane is True:
-            query = query.filter(CostsRaw.assigned_cost_id.isnot(None))
+            filters.append(CostsRaw.assigned_cost_id.isnot(None))
         elif przypisane is False:
-            query = query.filter(CostsRaw.assigned_cost_id.is_(None))
+            filters.append(CostsRaw.assigned_cost_id.is_(None))
 
         # --- Filtry po polach JSON (naglowek->>'pole') ---
         if oddzial:
-            query = query.filter(_branch_expr() == oddzial)
+            filters.append(_branch_expr() == oddzial)
         # KROK 5: wykluczenie kodów oddziałów (uprawnienia — np. BOARD bez HQ)
         if wyklucz_oddzialy:
             excluded = [code.strip() for code in wyklucz_oddzialy.split(",") if code.strip()]
             if excluded:
-                query = query.filter(_branch_expr().notin_(excluded))
+                filters.append(_branch_expr().notin_(excluded))
         if szukaj:
             wzor = f"%{szukaj}%"
-            query = query.filter(
+            filters.append(
                 or_(
                     CostsRaw.naglowek["nazwa_skrocona"].astext.ilike(wzor),
                     CostsRaw.naglowek["numer"].astext.ilike(wzor),
@@ -397,22 +403,24 @@ async def get_costs_iluo(
                 )
             )
         if nazwa_like:
-            query = query.filter(CostsRaw.naglowek["nazwa_skrocona"].astext.ilike(f"%{nazwa_like}%"))
+            filters.append(CostsRaw.naglowek["nazwa_skrocona"].astext.ilike(f"%{nazwa_like}%"))
         if numer_like:
-            query = query.filter(CostsRaw.naglowek["numer"].astext.ilike(f"%{numer_like}%"))
+            filters.append(CostsRaw.naglowek["numer"].astext.ilike(f"%{numer_like}%"))
         if data_od:
-            query = query.filter(CostsRaw.naglowek["data"].astext >= data_od)
+            filters.append(CostsRaw.naglowek["data"].astext >= data_od)
         if data_do:
-            query = query.filter(CostsRaw.naglowek["data"].astext <= f"{data_do}T23:59:59")
+            filters.append(CostsRaw.naglowek["data"].astext <= f"{data_do}T23:59:59")
 
         # --- Łączna liczba rekordów dla filtra ---
-        total_count = query.count()
+        total_count = await db.scalar(select(func.count()).select_from(CostsRaw).where(*filters))
 
         # --- Sumy brutto i netto wszystkich filtrowanych dokumentów ---
-        sums = query.with_entities(
-            func.sum(CostsRaw.naglowek["brutto"].astext.cast(Numeric)),
-            func.sum(CostsRaw.naglowek["netto"].astext.cast(Numeric)),
-        ).first()
+        sums = (await db.execute(
+            select(
+                func.sum(CostsRaw.naglowek["brutto"].astext.cast(Numeric)),
+                func.sum(CostsRaw.naglowek["netto"].astext.cast(Numeric)),
+            ).where(*filters)
+        )).first()
         total_sum = float(sums[0] or 0)
         total_sum_netto = float(sums[1] or 0)
 
@@ -424,10 +432,12 @@ async def get_costs_iluo(
             sort_col = CostsRaw.naglowek[sort_path].astext
             if sort_path in ("netto", "brutto"):
                 sort_col = CostsRaw.naglowek[sort_path].astext.cast(Numeric)
-        query = query.order_by(asc(sort_col) if sort_dir == "asc" else desc(sort_col))
+        query = select(CostsRaw).where(*filters).order_by(
+            asc(sort_col) if sort_dir == "asc" else desc(sort_col)
+        )
 
         # --- Paginacja ---
-        rows = query.offset(offset).limit(limit).all()
+        rows = (await db.scalars(query.offset(offset).limit(limit))).all()
 
         data = [_build_header(row) for row in rows]
 
@@ -438,17 +448,18 @@ async def get_costs_iluo(
             f"znaleziono {total_count}, zwracam {len(data)}"
         )
 
-        return CostRawListResponse(
-            data=data,
-            total=total_count,
-            total_sum=float(total_sum),
-            total_sum_netto=float(total_sum_netto),
-            limit=limit,
-            offset=offset,
-            require_label=ILUO_REQUIRE_LABEL,
-            date_filter_enabled=ILUO_DATE_FILTER_ENABLED,
-            min_date=ILUO_MIN_DATE if ILUO_DATE_FILTER_ENABLED else None,
-        )
+        # Kształt CostRawListResponse - zwracany bezpośrednio, bez walidacji każdego nagłówka
+        return json_response({
+            "data": data,
+            "total": total_count,
+            "total_sum": total_sum,
+            "total_sum_netto": total_sum_netto,
+            "limit": limit,
+            "offset": offset,
+            "require_label": ILUO_REQUIRE_LABEL,
+            "date_filter_enabled": ILUO_DATE_FILTER_ENABLED,
+            "min_date": ILUO_MIN_DATE if ILUO_DATE_FILTER_ENABLED else None,
+        })
 
     except Exception as e:
         logger.error(f"Błąd podczas pobierania listy kosztów ILUO: {str(e)}")
@@ -456,19 +467,18 @@ async def get_costs_iluo(
 
 
 @router.get("/costs-iluo/branches")
-async def get_costs_iluo_branches(db: Session = Depends(get_db)):
+async def get_costs_iluo_branches(db: AsyncSession = Depends(get_async_db)):
     """
     Lista unikalnych KODÓW oddziałów — do dropdownu filtra.
     WAŻNE: ta trasa MUSI być przed /costs-iluo/{cost_id}.
     """
     try:
         branch = _branch_expr()
-        rows = (
-            db.query(branch)
+        rows = (await db.execute(
+            select(branch)
             .distinct()
             .order_by(branch)
-            .all()
-        )
+        )).all()
         names = sorted({r[0] for r in rows if r[0]})
         return names
     except Exception as e:
@@ -480,7 +490,7 @@ async def get_costs_iluo_branches(db: Session = Depends(get_db)):
 async def assign_cost_iluo(
         cost_id: int,
         body: CostRawAssignRequest,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
     """
     Przypisuje własność kosztu ILUO: tworzy rekord w all_costs (ścieżka zapisu
@@ -497,7 +507,7 @@ async def assign_cost_iluo(
     """
     try:
         # --- Dokument źródłowy ---
-        row = db.query(CostsRaw).filter(CostsRaw.id == cost_id).first()
+        row = await db.get(CostsRaw, cost_id)
         if not row:
             raise HTTPException(status_code=404, detail="Nie znaleziono dokumentu o podanym ID")
 
@@ -577,7 +587,7 @@ async def assign_cost_iluo(
         )
 
         # --- Data wpisu: z config_current_date, identycznie jak legacy POST /costs ---
-        config = db.query(ConfigCurrentDate).filter(ConfigCurrentDate.id == 1).first()
+        config = await get_config_date_async(db)
         if not config:
             raise HTTPException(status_code=404, detail="Nie znaleziono konfiguracji daty")
 
@@ -600,7 +610,7 @@ async def assign_cost_iluo(
             cost_branch=cost_branch,
         )
         db.add(db_cost)
-        db.flush()  # nadaje cost_id bez commitu
+        await db.flush()  # nadaje cost_id bez commitu
 
         # --- Oznaczenie dokumentu jako przypisany (ta sama transakcja) ---
         assigned_at = datetime.now(timezone.utc)
@@ -608,8 +618,9 @@ async def assign_cost_iluo(
         row.assigned_at = assigned_at
         row.assigned_by = author
 
-        db.commit()
-        db.refresh(db_cost)
+        await db.commit()
+        await bump_costs_version()
+        await db.refresh(db_cost)
 
         logger.info(
             f"ILUO assign: dokument {cost_id} ({numer}) -> all_costs.cost_id={db_cost.cost_id}, "
@@ -627,22 +638,22 @@ async def assign_cost_iluo(
         )
 
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
         logger.error(f"Błąd podczas przypisywania kosztu ILUO {cost_id}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Błąd wewnętrzny serwera: {str(e)}")
 
 
 @router.get("/costs-iluo/{cost_id}", response_model=CostRawDetail)
-async def get_cost_iluo_detail(cost_id: int, db: Session = Depends(get_db)):
+async def get_cost_iluo_detail(cost_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Szczegóły jednego dokumentu ILUO: nagłówek + pozycje.
     Wołane po kliknięciu wiersza (dociąga pozycje do modala).
     """
     try:
-        row = db.query(CostsRaw).filter(CostsRaw.id == cost_id).first()
+        row = await db.get(CostsRaw, cost_id)
         if not row:
             raise HTTPException(status_code=404, detail="Nie znaleziono dokumentu o podanym ID")
 
@@ -1,7 +1,7 @@
 # routes/representatives.py
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, and_, distinct
+from sqlalchemy import func, or_, and_, distinct, literal_column
 from datetime import datetime, date
 import logging
 import time
@@ -13,85 +13,113 @@ from models.transaction import (
     NetSalesRepresentativePayd,
     ProfitRepresentativeTotal,
     ProfitRepresentativePayd,
-    ConfigCurrentDate,
     RepresentativeAggregatedData  # Dodano nowy model
 )
-from database import get_db
+from database import get_read_db
+from cache import cached_response
+from query_stats import query_summary
+from responses import json_response
+from config_cache import get_config_date
+from rep_directory import get_directory, sales_representatives
 import schemas
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+RAD = RepresentativeAggregatedData
 
-@router.get("/representatives")
-def get_representatives(
-        db: Session = Depends(get_db),
-        year: int = Query(None),
-        branch: str = Query(None)
-):
-    """
-    Zwraca listę unikalnych przedstawicieli handlowych dla danego roku,
-    którzy faktycznie mają sprzedaż w tym roku.
 
-    Parametry:
-    - year: rok do filtrowania (domyślnie bieżący rok)
-    - branch: oddział do filtrowania (opcjonalnie)
-    """
-    try:
-        logger.info(f"Rozpoczęcie pobierania przedstawicieli dla roku: {year}, oddział: {branch}")
+def _num(column, label: str):
+    """Kolumna liczbowa pod nazwą z API; NULL -> 0 w SQL, Decimal serializuje responses.py."""
+    return func.coalesce(column, 0).label(label)
 
-        # Jeśli rok nie został podany, użyj bieżącego roku z konfiguracji
-        if not year:
-            current_date = db.query(ConfigCurrentDate).first()
-            if current_date:
-                year = current_date.year_value
-                logger.info(f"Pobrano rok z konfiguracji: {year}")
-            else:
-                # Jeśli nie ma konfiguracji, użyj bieżącego roku z systemu
-                year = datetime.now().year
-                logger.info(f"Brak konfiguracji daty, użyto roku systemowego: {year}")
-
-        logger.info(f"Budowanie zapytania o przedstawicieli z aktywną sprzedażą dla roku {year}")
-
-        # Tworzenie zapytania, które filtruje przedstawicieli z faktyczną sprzedażą/zyskiem
-        # Używamy func.coalesce aby bezpiecznie obsłużyć wartości NULL
-        query = db.query(
-            distinct(RepresentativeAggregatedData.representative_name)
-        ).filter(
-            RepresentativeAggregatedData.year == year,
-            and_(
-                func.coalesce(RepresentativeAggregatedData.net_sales_total, 0) > 0,
-                func.coalesce(RepresentativeAggregatedData.profit_total, 0) > 0
-            )
-        )
 
-        # Dodajemy filtr oddziału, jeśli podano
-        if branch:
-            query = query.filter(RepresentativeAggregatedData.branch_name == branch)
-            logger.info(f"Dodano filtr oddziału: {branch}")
+# Kolumny wiersza przedstawiciela w kształcie odpowiedzi API
+REP_DATA_COLUMNS = (
+    RAD.representative_name,
+    RAD.year,
+    RAD.month,
+    _num(RAD.net_sales_total, "sales_net"),
+    _num(RAD.profit_total, "profit_net"),
+    _num(RAD.net_sales_paid, "sales_payd"),
+    _num(RAD.profit_paid, "profit_payd"),
+    _num(RAD.sales_paid_percentage, "sales_payd_percent"),
+    _num(RAD.profit_margin_percentage, "marg_total"),
+)
 
-        # Pobierz wyniki i zaloguj
-        try:
-            raw_results = query.all()
-            logger.info(f"Surowe wyniki zapytania: {raw_results}")
+AGGREGATED_DATA_COLUMNS = (
+    RAD.representative_name,
+    RAD.year,
+    RAD.month,
+    RAD.branch_name,
+    _num(RAD.net_sales_total, "sales_net"),
+    _num(RAD.profit_total, "profit_net"),
+    _num(RAD.net_sales_paid, "sales_payd"),
+    _num(RAD.profit_paid, "profit_payd"),
+    _num(RAD.sales_paid_percentage, "sales_payd_percent"),
+    _num(RAD.profit_margin_percentage, "marg_total"),
+    _num(RAD.paid_profit_margin_percentage, "paid_profit_margin_percentage"),
+)
 
-            representatives = [row[0] for row in raw_results]
-            logger.info(f"Znaleziono {len(representatives)} przedstawicieli z aktywną sprzedażą: {representatives}")
+# Wariant IND: zysk z kolumn rep_profit_total / rep_profit_payd
+IND_FULL_COLUMNS = (
+    RAD.representative_name,
+    RAD.year,
+    RAD.month,
+    RAD.branch_name,
+    _num(RAD.net_sales_total, "sales_net"),
+    _num(RAD.rep_profit_total, "profit_net"),
+    _num(RAD.net_sales_paid, "sales_payd"),
+    _num(RAD.rep_profit_payd, "profit_payd"),
+    _num(RAD.sales_paid_percentage, "sales_payd_percent"),
+    _num(RAD.profit_margin_percentage, "marg_total"),
+    _num(RAD.paid_profit_margin_percentage, "paid_profit_margin_percentage"),
+)
+
+# Tylko niezbędne pola dla widoku ProfitsPHView + puste pola wymagane przez API
+IND_MINIMAL_COLUMNS = (
+    RAD.representative_name,
+    RAD.year,
+    RAD.month,
+    RAD.branch_name,
+    _num(RAD.rep_profit_total, "profit_net"),
+    _num(RAD.rep_profit_payd, "profit_payd"),
+    literal_column("0").label("sales_net"),
+    literal_column("0").label("sales_payd"),
+    literal_column("0").label("sales_payd_percent"),
+    literal_column("0").label("marg_total"),
+    literal_column("0").label("paid_profit_margin_percentage"),
+)
 
-            return {"representatives": representatives, "year": year}
-        except Exception as e:
-            logger.error(f"Błąd podczas przetwarzania wyników zapytania: {str(e)}")
-            raise
+
+@router.get("/representatives")
+def get_representatives(
+        db: Session = Depends(get_read_db),
+        branch: str = Query(None, description="Nazwa oddziału do filtrowania przedstawicieli"),
+        year: int = Query(None, description="Tylko przedstawiciele ze sprzedażą w danym roku")
+):
+    """
+    Zwraca listę unikalnych przedstawicieli ze sprzedażą ze słownika
+    representative_directory (cache procesu, rep_directory.py).
+    Jeśli podano branch, zwraca tylko przedstawicieli powiązanych z danym oddziałem.
+    """
+    try:
+        return [
+            {
+                "id": str(entry.id),
+                "representative_name": entry.representative_name
+            }
+            for entry in sales_representatives(get_directory(db), branch=branch, year=year)
+        ]
 
     except Exception as e:
         logger.error(f"Error in /representatives endpoint: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
 @router.get("/representative_data")
 def get_representative_data(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         representative: str = Query(...),
         year: int = Query(None),
         measure_timings: bool = Query(False)
@@ -123,7 +151,7 @@ def get_representative_data(
 
         # Pobierz bieżącą datę z konfiguracji
         try:
-            current_date = db.query(ConfigCurrentDate).first()
+            current_date = get_config_date(db)
             if not current_date:
                 logger.warning("Nie znaleziono konfiguracji daty, używam domyślnych wartości")
                 current_date = type('obj', (object,), {
@@ -164,7 +192,7 @@ def get_representative_data(
             t = time.perf_counter()
 
             # Używamy nowej tabeli zagregowanej zamiast łączenia czterech tabel
-            query = db.query(RepresentativeAggregatedData).filter(
+            query = db.query(*REP_DATA_COLUMNS).filter(
                 RepresentativeAggregatedData.representative_name == representative,
                 RepresentativeAggregatedData.year == year
             ).order_by(RepresentativeAggregatedData.month)
@@ -185,51 +213,15 @@ def get_representative_data(
             default_result["debug_info"]["query_execution_error"] = str(query_exec_error)
             return default_result
 
-        # Przetwarzanie wyników
+        # Przetwarzanie wyników - wiersze mają już kształt API, dzielimy tylko na bieżący miesiąc i historię
         try:
-            processed_data = []
             current_month_data = None
             historical_data = []
-
             for row in results:
-                # Logowanie wartości dla debugowania
-                logger.info(f"Przetwarzanie wiersza: {row}")
-
-                try:
-                    # Upewnij się, że wartości nie są None i konwertuj na float
-                    sales_net = float(row.net_sales_total or 0)
-                    profit_net = float(row.profit_total or 0)
-                    sales_payd = float(row.net_sales_paid or 0)
-                    profit_payd = float(row.profit_paid or 0)
-
-                    # Korzystamy z już wyliczonych wartości procentowych z tabeli zagregowanej
-                    sales_payd_percent = float(row.sales_paid_percentage or 0)
-                    marg_total = float(row.profit_margin_percentage or 0)
-
-                    data_item = {
-                        "representative_name": row.representative_name,
-                        "year": row.year,
-                        "month": row.month,
-                        "sales_net": sales_net,
-                        "profit_net": profit_net,
-                        "sales_payd": sales_payd,
-                        "profit_payd": profit_payd,
-                        "sales_payd_percent": sales_payd_percent,
-                        "marg_total": marg_total
-                    }
-
-                    # Podział na bieżący miesiąc i historyczne
-                    if row.month == current_month:
-                        current_month_data = data_item
-                        logger.info(f"Dane dla bieżącego miesiąca ({current_month}): {data_item}")
-                    else:
-                        historical_data.append(data_item)
-                        logger.info(f"Dane historyczne dla miesiąca {row.month}: {data_item}")
-
-                except Exception as row_process_error:
-                    logger.error(f"Błąd podczas przetwarzania wiersza: {str(row_process_error)}")
-                    logger.error(traceback.format_exc())
-                    # Kontynuuj przetwarzanie następnych wierszy
+                if row.month == current_month:
+                    current_month_data = row._mapping
+                else:
+                    historical_data.append(row._mapping)
 
             result = {
                 "representative": representative,
@@ -242,11 +234,12 @@ def get_representative_data(
             if measure_timings:
                 result["timings"] = {
                     "query": execution_time,
-                    "total": time.perf_counter() - overall_start
+                    "total": time.perf_counter() - overall_start,
+                    "db": query_summary()
                 }
 
             logger.info(f"Zwracam dane dla przedstawiciela {representative}, rok {year}")
-            return result
+            return json_response(result)
 
         except Exception as process_error:
             logger.error(f"Błąd podczas przetwarzania wyników: {str(process_error)}")
@@ -274,7 +267,7 @@ def get_representative_data(
 
 @router.get("/aggregated_representative_data")
 def get_aggregated_representative_data(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         representative: str = Query(None),
         year: int = Query(None),
         month: int = Query(None),
@@ -337,7 +330,7 @@ def get_aggregated_representative_data(
             t = time.perf_counter()
 
             # Tworzymy zapytanie do nowej tabeli zagregowanej
-            query = db.query(RepresentativeAggregatedData)
+            query = db.query(*AGGREGATED_DATA_COLUMNS)
 
             # Dodajemy filtry
             if representative:
@@ -377,46 +370,20 @@ def get_aggregated_representative_data(
             default_result["debug_info"]["query_execution_error"] = str(query_exec_error)
             return default_result
 
-        # Przetwarzanie wyników
+        # Przetwarzanie wyników - kolumny są już zmapowane na nazwy API w zapytaniu
         try:
-            processed_data = []
-            for row in results:
-                # Bezpieczna konwersja wartości
-                try:
-                    # Mapowanie kolumn z nowej tabeli na nazwy używane w API
-                    item = {
-                        "representative_name": row.representative_name,
-                        "year": row.year,
-                        "month": row.month,
-                        "branch_name": row.branch_name,  # Dodajemy branch_name
-                        "sales_net": float(row.net_sales_total or 0),
-                        "profit_net": float(row.profit_total or 0),
-                        "sales_payd": float(row.net_sales_paid or 0),
-                        "profit_payd": float(row.profit_paid or 0),
-                        "sales_payd_percent": float(row.sales_paid_percentage or 0),
-                        "marg_total": float(row.profit_margin_percentage or 0),
-                        # Dodatkowe kolumny dostępne w nowej tabeli
-                        "paid_profit_margin_percentage": float(row.paid_profit_margin_percentage or 0)
-                    }
-
-                    processed_data.append(item)
-                    logger.info(
-                        f"Przygotowano dane dla {row.representative_name}, {row.branch_name}, {row.year}-{row.month}")
-
-                except Exception as row_process_error:
-                    logger.error(f"Błąd podczas przetwarzania wiersza: {str(row_process_error)}")
-                    logger.error(traceback.format_exc())
-                    # Kontynuuj przetwarzanie następnych wierszy
+            processed_data = [row._mapping for row in results]
 
             result = {"data": processed_data}
 
             if measure_timings:
                 result["timings"] = {
                     "query": execution_time,
-                    "total": time.perf_counter() - overall_start
+                    "total": time.perf_counter() - overall_start,
+                    "db": query_summary()
                 }
 
-            return result
+            return json_response(result)
 
         except Exception as process_error:
             logger.error(f"Błąd podczas przetwarzania wyników: {str(process_error)}")
@@ -442,8 +409,9 @@ def get_aggregated_representative_data(
 
 # Dodaj nowy endpoint bezpośrednio po istniejącym endpoint aggregated_representative_data
 @router.get("/aggregated_representative_ind_data")
+@cached_response("aggregated_representative_ind_data")
 def get_aggregated_representative_ind_data(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         representative: str = Query(None),
         year: int = Query(None),
         month: int = Query(None),
@@ -513,20 +481,9 @@ def get_aggregated_representative_ind_data(
         try:
             t = time.perf_counter()
 
-            # Wybór kolumn w zależności od parametru fields_set
-            if fields_set == "minimal":
-                # Wybieramy tylko niezbędne kolumny dla widoku ProfitsPHView
-                query = db.query(
-                    RepresentativeAggregatedData.representative_name,
-                    RepresentativeAggregatedData.year,
-                    RepresentativeAggregatedData.month,
-                    RepresentativeAggregatedData.branch_name,
-                    RepresentativeAggregatedData.rep_profit_total,
-                    RepresentativeAggregatedData.rep_profit_payd
-                )
-            else:
-                # Domyślnie pobieramy wszystkie kolumny (kompatybilność wsteczna)
-                query = db.query(RepresentativeAggregatedData)
+            # Wybór kolumn w zależności od parametru fields_set ('minimal' - widok ProfitsPHView)
+            columns = IND_MINIMAL_COLUMNS if fields_set == "minimal" else IND_FULL_COLUMNS
+            query = db.query(*columns)
 
             # Dodajemy filtry
             if representative:
@@ -569,64 +526,20 @@ def get_aggregated_representative_ind_data(
             default_result["debug_info"]["query_execution_error"] = str(query_exec_error)
             return default_result
 
-        # Przetwarzanie wyników
+        # Przetwarzanie wyników - kolumny są już zmapowane na nazwy API w zapytaniu
         try:
-            processed_data = []
-            for row in results:
-                # Bezpieczna konwersja wartości
-                try:
-                    # Mapowanie kolumn z nowej tabeli na nazwy używane w API,
-                    # dostosowane do wybranego zestawu pól
-                    if fields_set == "minimal":
-                        # Tylko niezbędne pola dla widoku ProfitsPHView
-                        item = {
-                            "representative_name": row.representative_name,
-                            "year": row.year,
-                            "month": row.month,
-                            "branch_name": row.branch_name,
-                            "profit_net": float(row.rep_profit_total or 0),
-                            "profit_payd": float(row.rep_profit_payd or 0),
-                            # Dodajemy puste pola wymagane przez API
-                            "sales_net": 0,
-                            "sales_payd": 0,
-                            "sales_payd_percent": 0,
-                            "marg_total": 0,
-                            "paid_profit_margin_percentage": 0
-                        }
-                    else:
-                        # Standardowe mapowanie dla pełnego zestawu pól
-                        item = {
-                            "representative_name": row.representative_name,
-                            "year": row.year,
-                            "month": row.month,
-                            "branch_name": row.branch_name,
-                            "sales_net": float(row.net_sales_total or 0),
-                            "profit_net": float(row.rep_profit_total or 0),
-                            "sales_payd": float(row.net_sales_paid or 0),
-                            "profit_payd": float(row.rep_profit_payd or 0),
-                            "sales_payd_percent": float(row.sales_paid_percentage or 0),
-                            "marg_total": float(row.profit_margin_percentage or 0),
-                            "paid_profit_margin_percentage": float(row.paid_profit_margin_percentage or 0)
-                        }
-
-                    processed_data.append(item)
-                    logger.info(
-                        f"Przygotowano dane IND dla {row.representative_name}, {row.branch_name}, {row.year}-{row.month}")
-
-                except Exception as row_process_error:
-                    logger.error(f"Błąd podczas przetwarzania wiersza IND: {str(row_process_error)}")
-                    logger.error(traceback.format_exc())
-                    # Kontynuuj przetwarzanie następnych wierszy
+            processed_data = [row._mapping for row in results]
 
             result = {"data": processed_data}
 
             if measure_timings:
                 result["timings"] = {
                     "query": execution_time,
-                    "total": time.perf_counter() - overall_start
+                    "total": time.perf_counter() - overall_start,
+                    "db": query_summary()
                 }
 
-            return result
+            return json_response(result)
 
         except Exception as process_error:
             logger.error(f"Błąd podczas przetwarzania wyników IND: {str(process_error)}")
@@ -653,7 +566,7 @@ def get_aggregated_representative_ind_data(
 # Zaktualizowany endpoint do pobierania szczegółowych danych z tabeli representative_aggregated_data
 @router.get("/representative_performance")
 def get_representative_performance(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         year: int = Query(None),
         include_branches: bool = Query(False, description="Czy grupować wyniki po oddziałach"),
         measure_timings: bool = Query(False)
@@ -671,7 +584,7 @@ def get_representative_performance(
 
         # Pobierz bieżący rok, jeśli nie podano
         if not year:
-            current_date = db.query(ConfigCurrentDate).first()
+            current_date = get_config_date(db)
             if current_date:
                 year = current_date.year_value
             else:
@@ -688,14 +601,14 @@ def get_representative_performance(
             representatives_data = db.query(
                 RepresentativeAggregatedData.representative_name,
                 RepresentativeAggregatedData.branch_name,
-                func.sum(RepresentativeAggregatedData.net_sales_total).label("total_sales"),
-                func.sum(RepresentativeAggregatedData.rep_profit_total).label("total_profit"),  # Zmieniono na rep_profit_total
-                func.sum(RepresentativeAggregatedData.net_sales_paid).label("paid_sales"),
-                func.sum(RepresentativeAggregatedData.rep_profit_payd).label("paid_profit"),  # Zmieniono na rep_profit_payd
-                (func.sum(RepresentativeAggregatedData.profit_total) / func.nullif(
-                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100).label("margin_percentage"),
-                (func.sum(RepresentativeAggregatedData.net_sales_paid) / func.nullif(
-                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100).label("paid_percentage")
+                _num(func.sum(RepresentativeAggregatedData.net_sales_total), "total_sales"),
+                _num(func.sum(RepresentativeAggregatedData.rep_profit_total), "total_profit"),  # Zmieniono na rep_profit_total
+                _num(func.sum(RepresentativeAggregatedData.net_sales_paid), "paid_sales"),
+                _num(func.sum(RepresentativeAggregatedData.rep_profit_payd), "paid_profit"),  # Zmieniono na rep_profit_payd
+                _num(func.sum(RepresentativeAggregatedData.profit_total) / func.nullif(
+                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100, "margin_percentage"),
+                _num(func.sum(RepresentativeAggregatedData.net_sales_paid) / func.nullif(
+                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100, "paid_percentage")
             ).filter(
                 RepresentativeAggregatedData.year == year
             ).group_by(
@@ -705,32 +618,21 @@ def get_representative_performance(
                 func.sum(RepresentativeAggregatedData.net_sales_total).desc()
             ).all()
 
-            # Przygotuj dane zagregowane
-            results = []
-            for row in representatives_data:
-                results.append({
-                    "representative_name": row.representative_name,
-                    "branch_name": row.branch_name,
-                    "total_sales": float(row.total_sales or 0),
-                    "total_profit": float(row.total_profit or 0),
-                    "paid_sales": float(row.paid_sales or 0),
-                    "paid_profit": float(row.paid_profit or 0),
-                    "margin_percentage": float(row.margin_percentage or 0),
-                    "paid_percentage": float(row.paid_percentage or 0)
-                })
+            # Kolumny mają już nazwy API, NULL zamienione na 0 w SQL
+            results = [row._mapping for row in representatives_data]
 
         else:
             # Grupuj tylko po przedstawicielu (sumuj po wszystkich oddziałach), użyj rep_profit_total i rep_profit_payd
             representatives_data = db.query(
                 RepresentativeAggregatedData.representative_name,
-                func.sum(RepresentativeAggregatedData.net_sales_total).label("total_sales"),
-                func.sum(RepresentativeAggregatedData.rep_profit_total).label("total_profit"),  # Zmieniono na rep_profit_total
-                func.sum(RepresentativeAggregatedData.net_sales_paid).label("paid_sales"),
-                func.sum(RepresentativeAggregatedData.rep_profit_payd).label("paid_profit"),  # Zmieniono na rep_profit_payd
-                (func.sum(RepresentativeAggregatedData.profit_total) / func.nullif(
-                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100).label("margin_percentage"),
-                (func.sum(RepresentativeAggregatedData.net_sales_paid) / func.nullif(
-                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100).label("paid_percentage")
+                _num(func.sum(RepresentativeAggregatedData.net_sales_total), "total_sales"),
+                _num(func.sum(RepresentativeAggregatedData.rep_profit_total), "total_profit"),  # Zmieniono na rep_profit_total
+                _num(func.sum(RepresentativeAggregatedData.net_sales_paid), "paid_sales"),
+                _num(func.sum(RepresentativeAggregatedData.rep_profit_payd), "paid_profit"),  # Zmieniono na rep_profit_payd
+                _num(func.sum(RepresentativeAggregatedData.profit_total) / func.nullif(
+                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100, "margin_percentage"),
+                _num(func.sum(RepresentativeAggregatedData.net_sales_paid) / func.nullif(
+                    func.sum(RepresentativeAggregatedData.net_sales_total), 0) * 100, "paid_percentage")
             ).filter(
                 RepresentativeAggregatedData.year == year
             ).group_by(
@@ -739,18 +641,8 @@ def get_representative_performance(
                 func.sum(RepresentativeAggregatedData.net_sales_total).desc()
             ).all()
 
-            # Przygotuj dane zagregowane
-            results = []
-            for row in representatives_data:
-                results.append({
-                    "representative_name": row.representative_name,
-                    "total_sales": float(row.total_sales or 0),
-                    "total_profit": float(row.total_profit or 0),
-                    "paid_sales": float(row.paid_sales or 0),
-                    "paid_profit": float(row.paid_profit or 0),
-                    "margin_percentage": float(row.margin_percentage or 0),
-                    "paid_percentage": float(row.paid_percentage or 0)
-                })
+            # Kolumny mają już nazwy API, NULL zamienione na 0 w SQL
+            results = [row._mapping for row in representatives_data]
 
         execution_time = time.perf_counter() - t
 
@@ -763,10 +655,11 @@ def get_representative_performance(
         if measure_timings:
             response["timings"] = {
                 "query": execution_time,
-                "total": time.perf_counter() - overall_start
+                "total": time.perf_counter() - overall_start,
+                "db": query_summary()
             }
 
-        return response
+        return json_response(response)
 
     except Exception as e:
         logger.error(f"Błąd w endpoint /representative_performance: {str(e)}")
@@ -1,19 +1,34 @@
 # routes/transactions.py
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from sqlalchemy import text, func, or_, and_
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request
+from sqlalchemy import text, func, or_, and_, select, union, union_all, literal, tuple_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, date
+import anyio.to_thread
+import base64
+import io
+import json
 import logging
+import os
+import psycopg2
 import time
 
 from models.transaction import (
     Transaction,
     NetSalesBranchTotal, ProfitTotal, ProfitPayd,
-    NetSalesBranchPayd, CostKind,
+    NetSalesBranchPayd,
     NetSalesRepresentativeTotal, ProfitRepresentativeTotal, ConfigCurrentDate, AggregatedSalesData,
-    ProfitRepresentativePayd, NetSalesRepresentativePayd, AggregatedData, AggregatedDataHist, AggregatedDataSums
+    ProfitRepresentativePayd, NetSalesRepresentativePayd, AggregatedData, AggregatedDataHist, AggregatedDataSums,
+    DailySalesRollup, MonthlyProfitCube, AggregateDirtyPeriod, AggregateDirtyClaim
 )
-from database import get_db
+from database import get_db, get_read_db, get_async_db
+from cache import cached_response, cached_value
+from query_stats import query_summary
+from config_cache import get_config_date, get_config_date_async, invalidate_config_date
+from refresh_jobs import request_refresh, run_pending, get_job
+from rep_directory import get_directory, sales_representatives, invalidate_rep_directory
+from ingest import ingest_transactions, IngestError
+from year_cache import get_transaction_years_async
 import schemas
 from sqlalchemy import case, literal_column
 
@@ -23,7 +38,7 @@ router = APIRouter()
 
 @router.get("/aggregated_profits")
 def get_aggregated_profits(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         branch: str = Query(None),
         year: int = Query(None),
         month: int = Query(None),
@@ -35,36 +50,91 @@ def get_aggregated_profits(
         )
 ):
     """
-    Zwraca zagregowane dane o zyskach pobrane z tabeli transactions.
+    Zwraca zagregowane dane o zyskach.
+    Zamknięte miesiące pochodzą z kostki monthly_profit_cube, bieżący miesiąc
+    (wg daty konfiguracyjnej) jest liczony na żywo z tabeli transactions - tak samo
+    każdy (rok, miesiąc, oddział) czekający na przeliczenie kostki
+    (aggregate_dirty_periods / aggregate_dirty_claims).
     Dane można filtrować po roku, miesiącu i oddziale.
     Można również wybrać konkretne kolumny do pobrania i zagregować dane dla całej firmy.
     """
     try:
         overall_start = time.perf_counter()
 
-        # Przygotowujemy kolumny z agregatami dla wszystkich wartości
+        config = get_config_date(db)
+        open_date = config.config_date if config else date.today()
+        open_period = (open_date.year, open_date.month)
+
+        # Źródło: kostka dla wszystkich miesięcy poza bieżącym + bieżący miesiąc z transakcji.
+        # Filtry trafiają do obu części, więc każda czyta tylko potrzebne klucze.
+        def period_filters(year_col, month_col, branch_col):
+            filters = []
+            if branch:
+                filters.append(branch_col == branch)
+            if year:
+                filters.append(year_col == year)
+            if month:
+                filters.append(month_col == month)
+            return filters
+
+        # Klucze zmienione od ostatniego przeliczenia kostki (triggery na transactions,
+        # także zapisy spoza API) - kostka ma dla nich nieaktualne wiersze
+        stale_keys = union(
+            select(AggregateDirtyPeriod.year, AggregateDirtyPeriod.month, AggregateDirtyPeriod.branch_name),
+            select(AggregateDirtyClaim.year, AggregateDirtyClaim.month, AggregateDirtyClaim.branch_name)
+        ).subquery("stale_keys")
+
+        profit_columns = ["hq_profit", "branch_profit", "rep_profit", "found", "profit"]
+        cube_part = select(
+            MonthlyProfitCube.year,
+            MonthlyProfitCube.month,
+            MonthlyProfitCube.branch_name,
+            *[getattr(MonthlyProfitCube, name) for name in profit_columns],
+            *[getattr(MonthlyProfitCube, f"{name}_paid") for name in profit_columns]
+        ).where(
+            tuple_(MonthlyProfitCube.year, MonthlyProfitCube.month) != tuple_(*open_period),
+            ~select(literal(1)).where(
+                stale_keys.c.year == MonthlyProfitCube.year,
+                stale_keys.c.month == MonthlyProfitCube.month,
+                stale_keys.c.branch_name == MonthlyProfitCube.branch_name
+            ).exists(),
+            *period_filters(MonthlyProfitCube.year, MonthlyProfitCube.month, MonthlyProfitCube.branch_name)
+        )
+
         # Używamy wyrażenia is_paid zdefiniowanego w modelu Transaction
+        def live_select():
+            return select(
+                Transaction.year,
+                Transaction.month,
+                Transaction.branch_name,
+                *[func.sum(getattr(Transaction, name)).label(name) for name in profit_columns],
+                *[func.sum(getattr(Transaction, name)).filter(Transaction.is_paid).label(f"{name}_paid")
+                  for name in profit_columns]
+            ).group_by(Transaction.year, Transaction.month, Transaction.branch_name)
+
+        live_part = live_select().where(
+            Transaction.year == open_period[0],
+            Transaction.month == open_period[1],
+            *period_filters(Transaction.year, Transaction.month, Transaction.branch_name)
+        )
+        # Klucze z kolejki: join po (year, month, branch_name) - indeks ix_transactions_year_month_branch
+        stale_part = live_select().join(
+            stale_keys,
+            and_(
+                stale_keys.c.year == Transaction.year,
+                stale_keys.c.month == Transaction.month,
+                stale_keys.c.branch_name == Transaction.branch_name
+            )
+        ).where(
+            tuple_(Transaction.year, Transaction.month) != tuple_(*open_period),
+            *period_filters(Transaction.year, Transaction.month, Transaction.branch_name)
+        )
+        source = union_all(cube_part, live_part, stale_part).subquery("profits")
+
+        # Przygotowujemy kolumny z agregatami dla wszystkich wartości
         base_columns = {
-            "hq_profit": func.sum(Transaction.hq_profit).label("hq_profit"),
-            "branch_profit": func.sum(Transaction.branch_profit).label("branch_profit"),
-            "rep_profit": func.sum(Transaction.rep_profit).label("rep_profit"),
-            "found": func.sum(Transaction.found).label("found"),
-            "profit": func.sum(Transaction.profit).label("profit"),
-            "hq_profit_paid": func.sum(Transaction.hq_profit).filter(
-                Transaction.is_paid
-            ).label("hq_profit_paid"),
-            "branch_profit_paid": func.sum(Transaction.branch_profit).filter(
-                Transaction.is_paid
-            ).label("branch_profit_paid"),
-            "rep_profit_paid": func.sum(Transaction.rep_profit).filter(
-                Transaction.is_paid
-            ).label("rep_profit_paid"),
-            "found_paid": func.sum(Transaction.found).filter(
-                Transaction.is_paid
-            ).label("found_paid"),
-            "profit_paid": func.sum(Transaction.profit).filter(
-                Transaction.is_paid
-            ).label("profit_paid")
+            name: func.sum(source.c[name]).label(name)
+            for name in profit_columns + [f"{name}_paid" for name in profit_columns]
         }
 
         # Przygotowujemy kolumny do zapytania
@@ -76,9 +146,9 @@ def get_aggregated_profits(
         if not aggregate_yearly and not aggregate_company:
             # Standardowe grupowanie po roku, miesiącu i oddziale
             query_columns.extend([
-                Transaction.year,
-                Transaction.month,
-                Transaction.branch_name
+                source.c.year,
+                source.c.month,
+                source.c.branch_name
             ])
 
         # Dodajemy wybrane kolumny lub wszystkie jeśli nie wybrano
@@ -90,16 +160,8 @@ def get_aggregated_profits(
             for col_name, col in base_columns.items():
                 query_columns.append(col)
 
-        # Budujemy zapytanie podstawowe z wybranymi kolumnami
-        query = db.query(*query_columns)
-
-        # Dodajemy filtry
-        if branch:
-            query = query.filter(Transaction.branch_name == branch)
-        if year:
-            query = query.filter(Transaction.year == year)
-        if month:
-            query = query.filter(Transaction.month == month)
+        # Budujemy zapytanie podstawowe z wybranymi kolumnami (filtry są już w źródle)
+        query = db.query(*query_columns).select_from(source)
 
         # Grupujemy wyniki
         if aggregate_company or aggregate_yearly:
@@ -107,7 +169,7 @@ def get_aggregated_profits(
             pass
         else:
             # Grupujemy standardowo po roku, miesiącu i oddziale
-            query = query.group_by(Transaction.year, Transaction.month, Transaction.branch_name)
+            query = query.group_by(source.c.year, source.c.month, source.c.branch_name)
 
         # Wykonanie zapytania z pomiarem czasu
         t = time.perf_counter()
@@ -175,7 +237,8 @@ def get_aggregated_profits(
         if measure_timings:
             result["timings"] = {
                 "query": execution_time,
-                "total": time.perf_counter() - overall_start
+                "total": time.perf_counter() - overall_start,
+                "db": query_summary()
             }
 
         return result
@@ -186,198 +249,197 @@ def get_aggregated_profits(
 
 
 @router.put("/config/update-date")
-def update_config_date(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def update_config_date(
+        background_tasks: BackgroundTasks,
+        db: Session = Depends(get_db),
+        full_refresh: bool = Query(
+            True,
+            description="Domyślnie pełna przebudowa agregatów miesięcznych; false – przeliczenie przyrostowe"
+        )
+):
+    """
+    Ustawia datę konfiguracyjną na dziś i zleca odświeżenie agregatów w tle.
+    Domyślnie pełne - tymi samymi funkcjami bazy co nocny Lambda - dopóki
+    tests/refresh_parity_check.py nie potwierdzi na danych produkcyjnych, że
+    przeliczenie przyrostowe daje te same liczby. Każde zadanie odświeżania
+    opróżnia też kolejkę aggregate_dirty_periods.
+    """
     start_time = time.time()
     try:
         # Pobierz bieżącą datę
         current_date = datetime.now().date()
 
-        try:
-            # 1. NAJPIERW TYLKO AKTUALIZACJA DATY (SZYBKA OPERACJA)
-            # Dezaktywuj tymczasowo triggery związane z agregatami
-            db.execute(text("ALTER TABLE config_current_date DISABLE TRIGGER trg_update_aggregated_data_config"))
-            db.execute(text("ALTER TABLE config_current_date DISABLE TRIGGER trg_update_historical_data"))
-            db.execute(text("ALTER TABLE config_current_date DISABLE TRIGGER trg_update_summary_from_config"))
-            db.execute(
-                text("ALTER TABLE config_current_date DISABLE TRIGGER trg_update_summary_after_config_date_change"))
-
-            # Aktualizuj samą datę - szybka operacja
-            query = text("UPDATE config_current_date SET config_date = :date WHERE id = 1")
-            db.execute(query, {"date": current_date})
-
-            # Sprawdź, czy istnieje rekord do aktualizacji
-            count = db.execute(text("SELECT COUNT(*) FROM config_current_date WHERE id = 1")).scalar()
-
-            # Jeśli nie ma rekordu, wstaw nowy
-            if count == 0:
-                insert_query = text("INSERT INTO config_current_date (id, config_date) VALUES (1, :date)")
-                db.execute(insert_query, {"date": current_date})
-
-            db.commit()
+        # 1. NAJPIERW TYLKO AKTUALIZACJA DATY (SZYBKA OPERACJA)
+        # Triggery agregatów na config_current_date pomijają tę transakcję
+        # (warunek WHEN na app.defer_aggregates) - bez ALTER TABLE i blokady tabeli
+        db.execute(text("SET LOCAL app.defer_aggregates = 'on'"))
+
+        # Aktualizuj samą datę, a jeśli nie ma rekordu - wstaw nowy
+        db.execute(
+            text("""
+                INSERT INTO config_current_date (id, config_date) VALUES (1, :date)
+                ON CONFLICT (id) DO UPDATE SET config_date = EXCLUDED.config_date
+            """),
+            {"date": current_date}
+        )
+        db.commit()
+        invalidate_config_date()
 
-            # 2. ZAPLANUJ ODŚWIEŻENIE AGREGATÓW W TLE
-            background_tasks.add_task(refresh_aggregate_data, db)
+        # 2. ZAPLANUJ ODŚWIEŻENIE AGREGATÓW W TLE - zadanie ma własną sesję,
+        # równoległe żądania są łączone w jeden przebieg
+        job_id = request_refresh(full=full_refresh)
+        background_tasks.add_task(run_pending)
 
-            execution_time = time.time() - start_time
+        execution_time = time.time() - start_time
 
-            return {
-                "success": True,
-                "date": current_date.isoformat(),
-                "execution_time_seconds": round(execution_time, 4),
-                "message": "Data została zaktualizowana. Agregaty zostaną odświeżone w tle."
-            }
-        finally:
-            pass  # Nie zamykamy sesji db, ponieważ jest zarządzana przez FastAPI Depends
+        return {
+            "success": True,
+            "date": current_date.isoformat(),
+            "job_id": job_id,
+            "execution_time_seconds": round(execution_time, 4),
+            "message": "Data została zaktualizowana. Agregaty zostaną odświeżone w tle."
+        }
     except Exception as e:
         execution_time = time.time() - start_time
         logger.error(f"Błąd podczas aktualizacji daty: {e}, czas: {execution_time:.4f}s")
         raise HTTPException(status_code=500, detail=f"Błąd aktualizacji daty: {str(e)}")
 
 
-# Funkcja odświeżająca agregaty w tle
-def refresh_aggregate_data(db: Session):
-    """Funkcja uruchamiana w tle do odświeżenia zagregowanych danych"""
-    try:
-        # Włącz z powrotem triggery
-        db.execute(text("ALTER TABLE config_current_date ENABLE TRIGGER ALL"))
-
-        # Ręcznie wywołaj odświeżenie agregatów
-        db.execute(text("SELECT populate_aggregated_data()"))
-        db.execute(text("SELECT populate_aggregated_data_hist()"))
-        db.execute(text("SELECT populate_aggregated_data_sums()"))
-        db.execute(text("SELECT refresh_aggregated_sales_data()"))
-        db.execute(text("SELECT refresh_representative_aggregated_data()"))
-
-        db.commit()
-        logger.info("Pomyślnie odświeżono agregaty w tle")
-    except Exception as e:
-        logger.error(f"Błąd podczas odświeżania agregatów w tle: {e}")
-
-
-@router.get("/representatives")
-def get_representatives(
+@router.post("/refresh", response_model=schemas.RefreshJobStatus, status_code=202)
+def request_aggregate_refresh(
+        background_tasks: BackgroundTasks,
         db: Session = Depends(get_db),
-        branch: str = Query(None, description="Nazwa oddziału do filtrowania przedstawicieli")
+        full: bool = Query(False, description="Jeśli true – przebuduj agregaty miesięczne od zera")
 ):
-    """
-    Zwraca listę unikalnych przedstawicieli z tabeli transactions.
-    Jeśli podano parametr branch, zwraca tylko przedstawicieli powiązanych z danym oddziałem.
-    """
+    """Zleca odświeżenie agregatów bez zmiany daty; zwraca zadanie do odpytywania."""
     try:
-        # Podstawowe zapytanie pobierające unikalne representative_name
-        query = db.query(Transaction.representative_name, Transaction.id)
+        job_id = request_refresh(full=full)
+        background_tasks.add_task(run_pending)
+        return get_job(db, job_id)
+    except Exception as e:
+        logger.error(f"Błąd podczas zlecania odświeżenia agregatów: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-        # Filtrowanie niepustych wartości
-        query = query.filter(
-            Transaction.representative_name.isnot(None),
-            Transaction.representative_name != "",
-            Transaction.representative_name != "0"
-        )
 
-        # Jeśli podano oddział, filtruj po branch_name
-        if branch:
-            # Normalizacja nazwy oddziału (uwzględnienie różnic w pisowni)
-            branch_mapping = {
-                "LUBLIN": "Lublin",
-                "PCIM": "Pcim",
-                "RZGOW": "Rzgów",
-                "RZGÓW": "Rzgów",
-                "MALBORK": "Malbork",
-                "LOMZA": "Łomża",
-                "ŁOMŻA": "Łomża",
-                "LOMŻA": "Łomża",
-                "MYSLIBORZ": "Myślibórz",
-                "MYŚLIBÓRZ": "Myślibórz",
-                "MG": "MG",
-                "STH": "STH",
-                "BHP": "BHP"
-            }
+@router.get("/refresh/{job_id}", response_model=schemas.RefreshJobStatus)
+def get_refresh_status(job_id: int, db: Session = Depends(get_db)):
+    """Stan zadania odświeżania: queued, running (z bieżącym etapem), done albo failed."""
+    job = get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job
 
-            normalized_branch = branch_mapping.get(branch.upper(), branch)
-            query = query.filter(Transaction.branch_name == normalized_branch)
 
-        # Pobierz unikalne rekordy i posortuj alfabetycznie
-        representatives = query.distinct(Transaction.representative_name).order_by(
-            Transaction.representative_name).all()
+# Limit rozmiaru partii importu - większe partie należy dzielić
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(64 * 1024 * 1024)))
+INGEST_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
 
-        # Przygotuj dane w formacie przyjaznym dla API
-        result = [
-            {
-                "id": str(rep.id),
-                "representative_name": rep.representative_name
-            }
-            for rep in representatives
-        ]
 
-        return result
+@router.post("/transactions/ingest", response_model=schemas.IngestResponse)
+async def ingest_transactions_batch(
+        request: Request,
+        background_tasks: BackgroundTasks,
+        format: str = Query(None, description="csv albo ndjson; domyślnie wg Content-Type")
+):
+    """
+    Import partii transakcji z ERP (CSV z nagłówkiem albo NDJSON) przez COPY
+    i scalenie po (document_number, year) - szczegóły w ingest.py.
+    Po imporcie zleca przyrostowe odświeżenie agregatów dotkniętych okresów.
+    """
+    fmt = format or INGEST_CONTENT_TYPES.get(
+        request.headers.get("content-type", "").split(";")[0].strip().lower()
+    )
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Oczekiwano text/csv albo application/x-ndjson")
+
+    body = await request.body()
+    if len(body) > INGEST_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Partia większa niż {INGEST_MAX_BYTES} bajtów")
 
+    try:
+        result = await anyio.to_thread.run_sync(ingest_transactions, io.BytesIO(body), fmt)
+    except (IngestError, psycopg2.DataError) as e:
+        logger.error(f"Odrzucono partię transakcji: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error in /representatives endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+        logger.error(f"Błąd podczas importu transakcji: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Błąd importu transakcji: {str(e)}")
 
+    # Triggery oznaczyły dotknięte okresy - wystarczy odświeżenie przyrostowe
+    result["job_id"] = None
+    if result["inserted"] or result["updated"]:
+        invalidate_rep_directory()
+        result["job_id"] = await anyio.to_thread.run_sync(request_refresh)
+        background_tasks.add_task(run_pending)
+    return result
 
-@router.post("/cost_kinds", response_model=schemas.CostKind)
-def create_cost_kind(cost_kind: schemas.CostKindCreate, db: Session = Depends(get_db)):
-    db_cost_kind = CostKind(kind=cost_kind.kind)
-    db.add(db_cost_kind)
-    db.commit()
-    db.refresh(db_cost_kind)
-    return db_cost_kind
+
+# --- NOWY ENDPOINT DLA ZEROWEJ MARŻY (KROK 1) ---
+# Liczność wyniku zero-margin per zestaw filtrów - cache w Redis (cache.py)
+ZERO_MARGIN_TOTAL_TTL_SECONDS = int(os.getenv("ZERO_MARGIN_TOTAL_TTL_SECONDS", "300"))
 
 
-@router.get("/cost_kinds/{cost_kind_id}", response_model=schemas.CostKind)
-def read_cost_kind(cost_kind_id: int, db: Session = Depends(get_db)):
-    cost_kind = db.query(CostKind).filter(CostKind.id == cost_kind_id).first()
-    if not cost_kind:
-        raise HTTPException(status_code=404, detail="Cost kind not found")
-    return cost_kind
+def _encode_cursor(created_at: datetime, transaction_id: int) -> str:
+    """Nieprzezroczysty kursor keyset: (created_at, id) ostatniego wiersza strony."""
+    payload = json.dumps({"c": created_at.isoformat(), "i": transaction_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
 
 
-@router.put("/cost_kinds/{cost_kind_id}", response_model=schemas.CostKind)
-def update_cost_kind(cost_kind_id: int, cost_kind: schemas.CostKindUpdate, db: Session = Depends(get_db)):
-    db_cost_kind = db.query(CostKind).filter(CostKind.id == cost_kind_id).first()
-    if not db_cost_kind:
-        raise HTTPException(status_code=404, detail="Cost kind not found")
-    db_cost_kind.kind = cost_kind.kind
-    db.commit()
-    db.refresh(db_cost_kind)
-    return db_cost_kind
+def _parse_date_param(name: str, value: str, date_only: bool = False):
+    try:
+        return date.fromisoformat(value) if date_only else datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected ISO date (YYYY-MM-DD)")
 
 
-@router.delete("/cost_kinds/{cost_kind_id}")
-def delete_cost_kind(cost_kind_id: int, db: Session = Depends(get_db)):
-    db_cost_kind = db.query(CostKind).filter(CostKind.id == cost_kind_id).first()
-    if not db_cost_kind:
-        raise HTTPException(status_code=404, detail="Cost kind not found")
-    db.delete(db_cost_kind)
-    db.commit()
-    return {"ok": True}
+def _decode_cursor(cursor: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
-# --- NOWY ENDPOINT DLA ZEROWEJ MARŻY (KROK 1) ---
 @router.get("/transactions/zero-margin", response_model=schemas.PaginatedZeroMarginResponse)
 def get_zero_margin_transactions(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         year: int = Query(None),
         branch: str = Query(None),
         representative: str = Query(None),
         date_from: str = Query(None),
         date_to: str = Query(None),
         limit: int = Query(20, ge=1, le=100),
-        offset: int = Query(0, ge=0)
+        offset: int = Query(0, ge=0),
+        cursor: str = Query(None, description="next_cursor z poprzedniej strony (paginacja keyset zamiast offset)"),
+        include_total: bool = Query(True, description="Jeśli false – bez liczenia wszystkich pasujących transakcji")
 ):
     """
     Pobiera transakcje, które mają 100% marży (Zysk == Netto).
     Dopuszczamy minimalną różnicę 0.02 PLN na błędy zaokrągleń.
+
+    Strony są sortowane po (created_at, id) malejąco. Z parametrem cursor kolejna
+    strona zaczyna się za ostatnim wierszem poprzedniej - koszt nie rośnie z
+    numerem strony, w przeciwieństwie do offset. Całkowita liczba wyników jest
+    cache'owana per zestaw filtrów.
     """
+    after = _decode_cursor(cursor) if cursor else None
+    created_from = _parse_date_param("date_from", date_from) if date_from else None
+    created_to = _parse_date_param("date_to", date_to, date_only=True) if date_to else None
     try:
         query = db.query(Transaction)
 
         # 1. Główny warunek: Netto > 0 ORAZ |Netto - Zysk| < 0.02
-        # Używamy func.abs() dla bezpiecznego porównania liczb zmiennoprzecinkowych
+        # Używamy func.abs() dla bezpiecznego porównania liczb zmiennoprzecinkowych.
+        # Warunek odpowiada predykatowi indeksu ix_transactions_zero_margin
+        # (migrations/006_zero_margin_index.sql) - zmiana tutaj wymaga zmiany indeksu.
         query = query.filter(
             Transaction.net_value > 0,
-            func.abs(Transaction.net_value - Transaction.profit) < 0.02
+            func.abs(Transaction.net_value - Transaction.profit) < 0.02,
+            Transaction.created_at.isnot(None)
         )
 
         # 2. Filtrowanie dynamiczne
@@ -390,21 +452,38 @@ def get_zero_margin_transactions(
         if representative and representative != 'all':
             query = query.filter(Transaction.representative_name == representative)
 
-        if date_from:
-            query = query.filter(Transaction.created_at >= date_from)
+        # Bez zawężania po year: year nie musi być rokiem created_at (import może podać
+        # go jawnie), a takie wiersze wypadałyby z wyników
+        if created_from:
+            query = query.filter(Transaction.created_at >= created_from)
 
-        if date_to:
+        if created_to:
             # Dodajemy czas 23:59:59 dla daty końcowej, aby objąć cały dzień
-            query = query.filter(Transaction.created_at <= f"{date_to} 23:59:59")
+            query = query.filter(
+                Transaction.created_at <= datetime(created_to.year, created_to.month, created_to.day, 23, 59, 59)
+            )
 
-        # 3. Liczenie całkowitej ilości (dla paginacji)
-        total = query.count()
+        # 3. Liczenie całkowitej ilości (dla paginacji) - opcjonalne i cache'owane
+        total = None
+        if include_total:
+            filters = {
+                "year": year, "branch": branch, "representative": representative,
+                "date_from": date_from, "date_to": date_to
+            }
+            total = cached_value(
+                "zero_margin_total", filters, query.count, ttl=ZERO_MARGIN_TOTAL_TTL_SECONDS
+            )
 
-        # 4. Pobieranie danych z limitem i offsetem
-        transactions = query.order_by(Transaction.created_at.desc()) \
-            .offset(offset) \
-            .limit(limit) \
-            .all()
+        # 4. Pobieranie strony: za kursorem (keyset) albo z offsetem
+        page = query.order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        if after:
+            page = page.filter(tuple_(Transaction.created_at, Transaction.id) < tuple_(*after))
+        elif offset:
+            page = page.offset(offset)
+        # Jeden wiersz więcej mówi, czy istnieje następna strona
+        transactions = page.limit(limit + 1).all()
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
 
         # 5. Mapowanie modelu DB na schemat Pydantic
         # Zauważ mapowanie: document_number -> doc_no, customer_nip -> nip
@@ -421,11 +500,17 @@ def get_zero_margin_transactions(
                 branch=t.branch_name
             ))
 
+        next_cursor = None
+        if has_more:
+            last = transactions[-1]
+            next_cursor = _encode_cursor(last.created_at, last.id)
+
         return {
             "data": mapped_data,
             "total": total,
             "limit": limit,
-            "offset": offset
+            "offset": 0 if after else offset,
+            "next_cursor": next_cursor
         }
 
     except Exception as e:
@@ -437,21 +522,20 @@ def get_zero_margin_transactions(
 
 
 @router.get("/years")
-async def get_transaction_years(db: Session = Depends(get_db)):
+async def get_transaction_years(db: AsyncSession = Depends(get_async_db)):
     """
-    Returns unique years from transactions table and current year from config
+    Returns years with transactions (transaction_years) and current year from config.
+    Both come from per-process caches - no query once they are warm.
     """
     try:
         # Get current year from config
-        config = db.query(ConfigCurrentDate).filter(ConfigCurrentDate.id == 1).first()
+        config = await get_config_date_async(db)
         current_year = config.year_value if config else None
 
-        # Get unique years from transactions
-        years = db.query(Transaction.year).distinct().order_by(Transaction.year.desc()).all()
-        years = [year[0] for year in years if year[0] is not None]
+        years = await get_transaction_years_async(db)
 
         return {
-            "years": years,
+            "years": list(years),
             "currentYear": current_year
         }
 
@@ -461,13 +545,13 @@ async def get_transaction_years(db: Session = Depends(get_db)):
 
 
 @router.get("/date")
-async def get_current_date(db: Session = Depends(get_db)):
+async def get_current_date(db: AsyncSession = Depends(get_async_db)):
     """
     Returns the current configured date from the config_current_date table.
     This date is used as the reference point for all calculations and aggregations.
     """
     try:
-        config = db.query(ConfigCurrentDate).filter(ConfigCurrentDate.id == 1).first()
+        config = await get_config_date_async(db)
 
         if not config:
             raise HTTPException(
@@ -488,22 +572,29 @@ async def get_current_date(db: Session = Depends(get_db)):
 
 
 @router.get("/health", include_in_schema=False)
-def health_check():
+async def health_check():
     """
-    Prosty endpoint health check, który zwraca status 'ok'.
+    Prosty endpoint health check (liveness), który zwraca status 'ok' bez dotykania bazy.
+    async def - obsługiwany na pętli zdarzeń, nie zajmuje wątku z puli.
     Ustawienie include_in_schema na False powoduje, że endpoint nie pojawi się w dokumentacji OpenAPI.
     """
     return {"status": "ok"}
 
 
+FIRST_STATS_BRANCHES = ["Rzgów", "Malbork", "Pcim", "Lublin", "Łomża", "Myślibórz", "MG", "STH", "BHP"]
+
+
 @router.get("/first_stats")
 def get_first_stats(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         measure_timings: bool = Query(False, description="If true - add execution times for sequences")
 ):
     """
-    Returns statistics from AggregatedData table for current day and month.
-    Data is pre-aggregated and stored in a dedicated table for fast access.
+    Returns statistics for current day and month.
+    Daily block is read from daily_sales_rollup (kept up to date by triggers on
+    transactions), monthly block from the pre-aggregated AggregatedData table.
+    Not wrapped in cached_response - the aggregate version does not change on
+    transaction writes, so a cached response would hide today's sales.
     """
     try:
         def process_aggregated_row(row):
@@ -569,12 +660,56 @@ def get_first_stats(
         overall_start = time.perf_counter()
         timings = {}
 
-        # Get daily stats
+        # Get daily stats: jedno zapytanie do dziennego rollupu - suma, oddziały
+        # i suma przedstawicieli (GROUPING SETS). Dzień wg daty konfiguracyjnej.
         t = time.perf_counter()
-        daily_data = db.query(AggregatedData).filter(
-            AggregatedData.aggregation_type == 'today'
-        ).first()
-        daily_stats = process_aggregated_row(daily_data)
+        config = get_config_date(db)
+        today = config.config_date if config else date.today()
+        # Przedstawiciel jak w słowniku: nazwa po btrim, bez pustych i '0'
+        has_rep = func.btrim(DailySalesRollup.representative_name).notin_(['', '0'])
+        daily_rows = db.execute(
+            select(
+                DailySalesRollup.branch_name,
+                func.grouping(DailySalesRollup.branch_name).label("is_total"),
+                func.coalesce(func.sum(DailySalesRollup.net_sales), 0).label("net_sales"),
+                func.coalesce(func.sum(DailySalesRollup.profit), 0).label("profit"),
+                func.coalesce(func.sum(DailySalesRollup.net_sales_paid), 0).label("net_sales_paid"),
+                func.coalesce(func.sum(DailySalesRollup.profit_paid), 0).label("profit_paid"),
+                func.coalesce(func.sum(DailySalesRollup.net_sales).filter(has_rep), 0).label("rep_net_sales"),
+                func.coalesce(func.sum(DailySalesRollup.profit).filter(has_rep), 0).label("rep_profit")
+            ).where(
+                DailySalesRollup.day == today
+            ).group_by(func.grouping_sets(
+                tuple_(),
+                tuple_(DailySalesRollup.branch_name)
+            ))
+        ).all()
+
+        daily_total = next((row for row in daily_rows if row.is_total), None)
+        daily_branches = {row.branch_name: row for row in daily_rows if not row.is_total}
+        daily_stats = {
+            "branches": {
+                "total": {
+                    "net_sales": float(daily_total.net_sales) if daily_total else 0.0,
+                    "profit": float(daily_total.profit) if daily_total else 0.0,
+                    "net_sales_paid": float(daily_total.net_sales_paid) if daily_total else 0.0,
+                    "profit_paid": float(daily_total.profit_paid) if daily_total else 0.0
+                },
+                "details": {
+                    branch: {
+                        "net_sales": float(daily_branches[branch].net_sales) if branch in daily_branches else 0.0,
+                        "profit": float(daily_branches[branch].profit) if branch in daily_branches else 0.0
+                    }
+                    for branch in FIRST_STATS_BRANCHES
+                }
+            },
+            "representatives": {
+                "total": {
+                    "net_sales": float(daily_total.rep_net_sales) if daily_total else 0.0,
+                    "profit": float(daily_total.rep_profit) if daily_total else 0.0
+                }
+            }
+        }
         if measure_timings:
             timings["daily"] = time.perf_counter() - t
 
@@ -598,7 +733,8 @@ def get_first_stats(
             result["timings"] = {
                 "daily": timings.get("daily"),
                 "monthly": timings.get("monthly"),
-                "total": overall_time
+                "total": overall_time,
+                "db": query_summary()
             }
 
         return result
@@ -609,8 +745,9 @@ def get_first_stats(
 
 
 @router.get("/sum_stats")
+@cached_response("sum_stats")
 def get_sum_stats(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         measure_timings: bool = Query(False, description="If true - add execution times for sequences")
 ):
     """
@@ -699,7 +836,8 @@ def get_sum_stats(
         if measure_timings:
             result["timings"] = {
                 "query": execution_time,
-                "total": overall_time
+                "total": overall_time,
+                "db": query_summary()
             }
 
         return result
@@ -712,8 +850,9 @@ def get_sum_stats(
 
 
 @router.get("/second_stats")
+@cached_response("second_stats")
 def get_second_stats(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         measure_timings: bool = Query(False, description="If true - add execution times for sequences")
 ):
     """
@@ -802,7 +941,8 @@ def get_second_stats(
         if measure_timings:
             result["timings"] = {
                 "historical": execution_time,
-                "total": overall_time
+                "total": overall_time,
+                "db": query_summary()
             }
 
         return result
@@ -813,8 +953,9 @@ def get_second_stats(
 
 
 @router.get("/aggregated_sales_data")
+@cached_response("aggregated_sales_data")
 def get_aggregated_sales_data(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         branch: str = Query(None),
         year: int = Query(None),
         month: int = Query(None),
@@ -954,7 +1095,8 @@ def get_aggregated_sales_data(
         if measure_timings:
             result["timings"] = {
                 "query": execution_time,
-                "total": time.perf_counter() - overall_start
+                "total": time.perf_counter() - overall_start,
+                "db": query_summary()
             }
 
         return result
@@ -966,20 +1108,20 @@ def get_aggregated_sales_data(
 
 @router.get("/all_stats")
 def get_all_stats(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         measure_timings: bool = Query(False, description="Jeśli true – dodaj czasy wykonania poszczególnych sekwencji")
 ):
     """
     Zwraca statystyki dla:
       - Bloku SUMA: globalne dane (wszystkie transakcje) z tabel:
-          • transactions (dla dzisiejszych danych),
+          • daily_sales_rollup (dla dzisiejszych danych),
           • net_sales_branch_total, profit_total, net_sales_branch_payd, profit_payd (dla miesięcznych danych)
       - Bloku przedstawicieli: statystyki dla **każdego unikatowego przedstawiciela**,
-          • dzisiaj: dane z tabeli transactions (filtrowane po representative_name),
+          • dzisiaj: dane z tabeli daily_sales_rollup (filtrowane po representative_name),
           • miesięcznie: dane z tabel net_sales_representative_total, profit_representative_total,
                      net_sales_representative_payd, profit_representative_payd.
       - Bloków oddziałowych: dla każdego oddziału (Rzgów, Malbork, Pcim, Lublin, Łomża, Myślibórz)
-          • dzisiaj: dane z tabeli transactions (filtrowane po branch_name),
+          • dzisiaj: dane z tabeli daily_sales_rollup (filtrowane po branch_name),
           • miesięcznie: dane z tabel net_sales_branch_total, profit_total, net_sales_branch_payd, profit_payd.
     Dla danych miesięcznych pobieramy także historyczne dane z 3 poprzednich miesięcy.
 
@@ -990,295 +1132,74 @@ def get_all_stats(
         current_year = today.year
         current_month = today.month
 
-        # -------------------------------
-        # Funkcje pomocnicze - DZIŚ (dane z tabeli transactions)
-        # -------------------------------
-        def get_daily_stats_transactions(filter_condition=None):
-            """Dane globalne – wszystkie transakcje dla dzisiejszej daty."""
-            start = datetime.combine(today, datetime.min.time())
-            end = datetime.combine(today, datetime.max.time())
-            query = db.query(
-                func.coalesce(func.sum(Transaction.net_value), 0).label("net_sales"),
-                func.coalesce(func.sum(Transaction.profit), 0).label("profit"),
-                func.coalesce(
-                    func.sum(Transaction.net_value).filter(
-                        or_(
-                            Transaction.to_pay == 0,
-                            Transaction.to_pay.is_(None)
-                        )
-                    ), 0
-                ).label("net_sales_paid"),
-                func.coalesce(
-                    func.sum(Transaction.profit).filter(
-                        or_(
-                            Transaction.to_pay == 0,
-                            Transaction.to_pay.is_(None)
-                        )
-                    ), 0
-                ).label("profit_paid")
-            ).filter(Transaction.created_at.between(start, end))
-            if filter_condition is not None:
-                query = query.filter(filter_condition)
-            result = query.first()
-            return {
-                "net_sales": float(result.net_sales or 0),
-                "profit": float(result.profit or 0),
-                "net_sales_paid": float(result.net_sales_paid or 0),
-                "profit_paid": float(result.profit_paid or 0)
-            }
-
-        def get_daily_stats_branch(branch_name: str):
-            """Dane dla danego oddziału – transakcje z filtrem branch_name."""
-            start = datetime.combine(today, datetime.min.time())
-            end = datetime.combine(today, datetime.max.time())
-            branch_filter = (Transaction.branch_name == branch_name)
-            query = db.query(
-                func.coalesce(func.sum(Transaction.net_value), 0).label("net_sales"),
-                func.coalesce(func.sum(Transaction.profit), 0).label("profit"),
-                func.coalesce(
-                    func.sum(Transaction.net_value).filter(
-                        or_(
-                            Transaction.to_pay == 0,
-                            Transaction.to_pay.is_(None)
-                        )
-                    ), 0
-                ).label("net_sales_paid"),
-                func.coalesce(
-                    func.sum(Transaction.profit).filter(
-                        or_(
-                            Transaction.to_pay == 0,
-                            Transaction.to_pay.is_(None)
-                        )
-                    ), 0
-                ).label("profit_paid")
-            ).filter(Transaction.created_at.between(start, end)).filter(branch_filter)
-            result = query.first()
-            return {
-                "net_sales": float(result.net_sales or 0),
-                "profit": float(result.profit or 0),
-                "net_sales_paid": float(result.net_sales_paid or 0),
-                "profit_paid": float(result.profit_paid or 0)
-            }
-
-        def get_daily_stats_representative(representative_name: str):
-            """Dane dla danego przedstawiciela – transakcje z filtrem representative_name."""
-            start = datetime.combine(today, datetime.min.time())
-            end = datetime.combine(today, datetime.max.time())
-            rep_filter = (Transaction.representative_name == representative_name)
-            query = db.query(
-                func.coalesce(func.sum(Transaction.net_value), 0).label("net_sales"),
-                func.coalesce(func.sum(Transaction.profit), 0).label("profit"),
-                func.coalesce(
-                    func.sum(Transaction.net_value).filter(
-                        or_(
-                            Transaction.to_pay == 0,
-                            Transaction.to_pay.is_(None)
-                        )
-                    ), 0
-                ).label("net_sales_paid"),
-                func.coalesce(
-                    func.sum(Transaction.profit).filter(
-                        or_(
-                            Transaction.to_pay == 0,
-                            Transaction.to_pay.is_(None)
-                        )
-                    ), 0
-                ).label("profit_paid")
-            ).filter(Transaction.created_at.between(start, end)).filter(rep_filter)
-            result = query.first()
-            return {
-                "net_sales": float(result.net_sales or 0),
-                "profit": float(result.profit or 0),
-                "net_sales_paid": float(result.net_sales_paid or 0),
-                "profit_paid": float(result.profit_paid or 0)
-            }
-
-        # -------------------------------
-        # Funkcje pomocnicze - MIESIĘCZNE (dane z tabel miesięcznych)
-        # -------------------------------
-        def get_monthly_stats_summary(year: int, month: int):
-            """Miesięczne dane dla SUMA – agregacja po wszystkich oddziałach."""
-            net_sales = db.query(
-                func.coalesce(func.sum(NetSalesBranchTotal.net_sales), 0)
-            ).filter(
-                NetSalesBranchTotal.year == year,
-                NetSalesBranchTotal.month == month
-            ).scalar() or 0
-
-            profit = db.query(
-                func.coalesce(func.sum(ProfitTotal.profit), 0)
-            ).filter(
-                ProfitTotal.year == year,
-                ProfitTotal.month == month
-            ).scalar() or 0
-
-            net_sales_paid = db.query(
-                func.coalesce(func.sum(NetSalesBranchPayd.net_sales_paid), 0)
-            ).filter(
-                NetSalesBranchPayd.year == year,
-                NetSalesBranchPayd.month == month
-            ).scalar() or 0
-
-            profit_paid = db.query(
-                func.coalesce(func.sum(ProfitPayd.profit_paid), 0)
-            ).filter(
-                ProfitPayd.year == year,
-                ProfitPayd.month == month
-            ).scalar() or 0
-
-            return {
-                "net_sales": float(net_sales),
-                "profit": float(profit),
-                "net_sales_paid": float(net_sales_paid),
-                "profit_paid": float(profit_paid)
-            }
-
-        def get_monthly_stats_branch(year: int, month: int, branch_name: str):
-            """Miesięczne dane dla danego oddziału – filtrowane po branch_name."""
-            net_sales = db.query(
-                func.coalesce(NetSalesBranchTotal.net_sales, 0)
-            ).filter(
-                NetSalesBranchTotal.year == year,
-                NetSalesBranchTotal.month == month,
-                NetSalesBranchTotal.branch_name == branch_name
-            ).scalar() or 0
-
-            profit = db.query(
-                func.coalesce(ProfitTotal.profit, 0)
-            ).filter(
-                ProfitTotal.year == year,
-                ProfitTotal.month == month,
-                ProfitTotal.branch_name == branch_name
-            ).scalar() or 0
-
-            net_sales_paid = db.query(
-                func.coalesce(NetSalesBranchPayd.net_sales_paid, 0)
-            ).filter(
-                NetSalesBranchPayd.year == year,
-                NetSalesBranchPayd.month == month,
-                NetSalesBranchPayd.branch_name == branch_name
-            ).scalar() or 0
-
-            profit_paid = db.query(
-                func.coalesce(ProfitPayd.profit_paid, 0)
-            ).filter(
-                ProfitPayd.year == year,
-                ProfitPayd.month == month,
-                ProfitPayd.branch_name == branch_name
-            ).scalar() or 0
-
-            return {
-                "net_sales": float(net_sales),
-                "profit": float(profit),
-                "net_sales_paid": float(net_sales_paid),
-                "profit_paid": float(profit_paid)
-            }
-
-        def get_monthly_stats_representative(year: int, month: int, representative_name: str):
-            """Miesięczne dane dla danego przedstawiciela – filtrowane po representative_name."""
-            net_sales = db.query(
-                func.coalesce(NetSalesRepresentativeTotal.net_sales, 0)
-            ).filter(
-                NetSalesRepresentativeTotal.year == year,
-                NetSalesRepresentativeTotal.month == month,
-                NetSalesRepresentativeTotal.representative_name == representative_name
-            ).scalar() or 0
-
-            profit = db.query(
-                func.coalesce(ProfitRepresentativeTotal.profit, 0)
-            ).filter(
-                ProfitRepresentativeTotal.year == year,
-                ProfitRepresentativeTotal.month == month,
-                ProfitRepresentativeTotal.representative_name == representative_name
-            ).scalar() or 0
-
-            net_sales_paid = db.query(
-                func.coalesce(NetSalesRepresentativePayd.net_sales_paid, 0)
-            ).filter(
-                NetSalesRepresentativePayd.year == year,
-                NetSalesRepresentativePayd.month == month,
-                NetSalesRepresentativePayd.representative_name == representative_name
-            ).scalar() or 0
-
-            profit_paid = db.query(
-                func.coalesce(ProfitRepresentativePayd.profit_paid, 0)
-            ).filter(
-                ProfitRepresentativePayd.year == year,
-                ProfitRepresentativePayd.month == month,
-                ProfitRepresentativePayd.representative_name == representative_name
-            ).scalar() or 0
-
-            return {
-                "net_sales": float(net_sales),
-                "profit": float(profit),
-                "net_sales_paid": float(net_sales_paid),
-                "profit_paid": float(profit_paid)
-            }
-
-        # -------------------------------
-        # Funkcje łączące - KOMPUTACJA statystyk dla danej grupy
-        # -------------------------------
-        def compute_summary_stats():
-            daily = get_daily_stats_transactions()
-            monthly = get_monthly_stats_summary(current_year, current_month)
+        # Bieżący miesiąc + 3 poprzednie - wszystkie okresy pobieramy jednym zapytaniem
+        historical_periods = []
+        for i in range(1, 4):
+            m = current_month - i
+            y = current_year
+            if m <= 0:
+                m += 12
+                y -= 1
+            historical_periods.append((y, m))
+        periods = [(current_year, current_month)] + historical_periods
+
+        def empty_stats():
+            return {"net_sales": 0.0, "profit": 0.0, "net_sales_paid": 0.0, "profit_paid": 0.0}
+
+        def monthly_block(values: dict, key):
+            """Składa blok monthly/historical z mapy (klucz, rok, miesiąc) -> statystyki."""
+            monthly = values.get((key, current_year, current_month)) or empty_stats()
             historical = []
-            for i in range(1, 4):
-                m = current_month - i
-                y = current_year
-                if m <= 0:
-                    m += 12
-                    y -= 1
-                hist = get_monthly_stats_summary(y, m)
+            for y, m in historical_periods:
+                hist = dict(values.get((key, y, m)) or empty_stats())
                 hist["year"] = y
                 hist["month"] = m
                 historical.append(hist)
-            return {"daily": daily, "monthly": monthly, "historical": historical}
+            return monthly, historical
+
+        TOTAL_KEY = "__total__"
+
+        def monthly_values(metric_tables, name_column_attr: str, with_total: bool):
+            """
+            Wartości miesięczne ze wszystkich czterech tabel (UNION ALL) dla wszystkich
+            okresów naraz. Przy with_total dodatkowo suma po wszystkich nazwach
+            (GROUPING SETS) - wiersz z kluczem TOTAL_KEY; nazwa NULL (np. wiersze
+            bez przedstawiciela) ma osobny klucz None i nie nadpisuje sumy.
+            """
+            union = union_all(*[
+                select(
+                    literal(metric).label("metric"),
+                    model.year.label("year"),
+                    model.month.label("month"),
+                    # Nazwy przycięte jak w słowniku przedstawicieli (rep_directory.py)
+                    func.btrim(getattr(model, name_column_attr)).label("name"),
+                    value_column.label("value")
+                ).where(tuple_(model.year, model.month).in_(periods))
+                for metric, model, value_column in metric_tables
+            ]).subquery()
+
+            query = select(
+                union.c.metric,
+                union.c.year,
+                union.c.month,
+                union.c.name,
+                func.grouping(union.c.name).label("is_total"),
+                func.coalesce(func.sum(union.c.value), 0).label("value")
+            )
+            if with_total:
+                query = query.group_by(func.grouping_sets(
+                    tuple_(union.c.metric, union.c.year, union.c.month),
+                    tuple_(union.c.metric, union.c.year, union.c.month, union.c.name)
+                ))
+            else:
+                query = query.group_by(union.c.metric, union.c.year, union.c.month, union.c.name)
 
-        def compute_branch_stats(branch_name: str):
-            daily = get_daily_stats_branch(branch_name)
-            monthly = get_monthly_stats_branch(current_year, current_month, branch_name)
-            historical = []
-            for i in range(1, 4):
-                m = current_month - i
-                y = current_year
-                if m <= 0:
-                    m += 12
-                    y -= 1
-                hist = get_monthly_stats_branch(y, m, branch_name)
-                hist["year"] = y
-                hist["month"] = m
-                historical.append(hist)
-            return {"daily": daily, "monthly": monthly, "historical": historical}
-
-        def compute_representative_stats():
-            """Oblicza statystyki dla każdego unikatowego przedstawiciela."""
-            reps = db.query(Transaction.representative_name).filter(
-                Transaction.representative_name.isnot(None),
-                Transaction.representative_name != "",
-                Transaction.representative_name != "0"
-            ).distinct().all()
-            rep_stats = {}
-            for rep_tuple in reps:
-                rep = rep_tuple[0]
-                daily = get_daily_stats_representative(rep)
-                monthly = get_monthly_stats_representative(current_year, current_month, rep)
-                historical = []
-                for i in range(1, 4):
-                    m = current_month - i
-                    y = current_year
-                    if m <= 0:
-                        m += 12
-                        y -= 1
-                    hist = get_monthly_stats_representative(y, m, rep)
-                    hist["year"] = y
-                    hist["month"] = m
-                    historical.append(hist)
-                rep_stats[rep] = {
-                    "daily": daily,
-                    "monthly": monthly,
-                    "historical": historical
-                }
-            return rep_stats
+            values = {}
+            for row in db.execute(query):
+                key = TOTAL_KEY if row.is_total else row.name
+                stats = values.setdefault((key, row.year, row.month), empty_stats())
+                stats[row.metric] = float(row.value or 0)
+            return values
 
         # -------------------------------
         # Obliczanie statystyk dla poszczególnych bloków z pomiarem czasu
@@ -1286,25 +1207,104 @@ def get_all_stats(
         overall_start = time.perf_counter()
         timings = {}
 
+        # DZIŚ: jedno zapytanie do dziennego rollupu - suma, oddziały i przedstawiciele
+        # (GROUPING SETS). Rollup jest aktualizowany triggerami przy każdym zapisie transakcji.
         t = time.perf_counter()
-        summary_stats = compute_summary_stats()
+        daily_rep_name = func.btrim(DailySalesRollup.representative_name)
+        daily_rows = db.execute(
+            select(
+                DailySalesRollup.branch_name,
+                daily_rep_name.label("representative_name"),
+                func.grouping(DailySalesRollup.branch_name).label("all_branches"),
+                func.grouping(daily_rep_name).label("all_reps"),
+                func.coalesce(func.sum(DailySalesRollup.net_sales), 0).label("net_sales"),
+                func.coalesce(func.sum(DailySalesRollup.profit), 0).label("profit"),
+                func.coalesce(func.sum(DailySalesRollup.net_sales_paid), 0).label("net_sales_paid"),
+                func.coalesce(func.sum(DailySalesRollup.profit_paid), 0).label("profit_paid")
+            ).where(
+                DailySalesRollup.day == today
+            ).group_by(func.grouping_sets(
+                tuple_(),
+                tuple_(DailySalesRollup.branch_name),
+                tuple_(daily_rep_name)
+            ))
+        ).all()
+
+        daily_summary = empty_stats()
+        daily_branches = {}
+        daily_reps = {}
+        for row in daily_rows:
+            stats = {
+                "net_sales": float(row.net_sales or 0),
+                "profit": float(row.profit or 0),
+                "net_sales_paid": float(row.net_sales_paid or 0),
+                "profit_paid": float(row.profit_paid or 0)
+            }
+            if row.all_branches and row.all_reps:
+                daily_summary = stats
+            elif not row.all_branches:
+                daily_branches[row.branch_name] = stats
+            else:
+                daily_reps[row.representative_name] = stats
         if measure_timings:
-            timings["summary"] = time.perf_counter() - t
+            timings["daily"] = time.perf_counter() - t
 
+        # MIESIĘCZNIE - SUMA i oddziały: cztery tabele oddziałowe w jednym zapytaniu
         t = time.perf_counter()
-        representative_stats = compute_representative_stats()
+        branch_values = monthly_values(
+            [
+                ("net_sales", NetSalesBranchTotal, NetSalesBranchTotal.net_sales),
+                ("profit", ProfitTotal, ProfitTotal.profit),
+                ("net_sales_paid", NetSalesBranchPayd, NetSalesBranchPayd.net_sales_paid),
+                ("profit_paid", ProfitPayd, ProfitPayd.profit_paid),
+            ],
+            "branch_name",
+            with_total=True
+        )
+        monthly, historical = monthly_block(branch_values, TOTAL_KEY)
+        summary_stats = {"daily": daily_summary, "monthly": monthly, "historical": historical}
         if measure_timings:
-            timings["representatives"] = time.perf_counter() - t
+            timings["summary"] = time.perf_counter() - t
 
         branch_names = ["Rzgów", "Malbork", "Pcim", "Lublin", "Łomża", "Myślibórz"]
         branches_stats = {}
         branch_timings = {}
         for branch in branch_names:
+            # Dane oddziałów pochodzą z zapytań powyżej - czas obejmuje tylko złożenie bloku
             t = time.perf_counter()
-            branches_stats[branch] = compute_branch_stats(branch)
+            monthly, historical = monthly_block(branch_values, branch)
+            branches_stats[branch] = {
+                "daily": daily_branches.get(branch) or empty_stats(),
+                "monthly": monthly,
+                "historical": historical
+            }
             if measure_timings:
                 branch_timings[branch] = time.perf_counter() - t
 
+        # PRZEDSTAWICIELE: lista ze słownika (cache procesu) + cztery tabele przedstawicieli w jednym zapytaniu
+        t = time.perf_counter()
+        reps = [entry.representative_name for entry in sales_representatives(get_directory(db))]
+        rep_values = monthly_values(
+            [
+                ("net_sales", NetSalesRepresentativeTotal, NetSalesRepresentativeTotal.net_sales),
+                ("profit", ProfitRepresentativeTotal, ProfitRepresentativeTotal.profit),
+                ("net_sales_paid", NetSalesRepresentativePayd, NetSalesRepresentativePayd.net_sales_paid),
+                ("profit_paid", ProfitRepresentativePayd, ProfitRepresentativePayd.profit_paid),
+            ],
+            "representative_name",
+            with_total=False
+        )
+        representative_stats = {}
+        for rep in reps:
+            monthly, historical = monthly_block(rep_values, rep)
+            representative_stats[rep] = {
+                "daily": daily_reps.get(rep) or empty_stats(),
+                "monthly": monthly,
+                "historical": historical
+            }
+        if measure_timings:
+            timings["representatives"] = time.perf_counter() - t
+
         overall_time = time.perf_counter() - overall_start
 
         result = {
@@ -1314,10 +1314,12 @@ def get_all_stats(
         }
         if measure_timings:
             result["timings"] = {
+                "daily": timings.get("daily"),
                 "summary": timings.get("summary"),
                 "representatives": timings.get("representatives"),
                 "branches": branch_timings,
-                "total": overall_time
+                "total": overall_time,
+                "db": query_summary()
             }
         return result
 
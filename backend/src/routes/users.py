@@ -1,13 +1,14 @@
 # routes/users.py
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, and_, select, cast, String, Float
 import logging
 from typing import List, Optional
 from decimal import Decimal
 
 from models.user import User, Client
-from database import get_db
+from database import get_async_db, get_async_read_db
+from responses import json_response
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -65,7 +66,7 @@ class ClientResponse(ClientBase):
 # Endpoint do pobierania klientów dla mapview
 @router.get("/clients/map", response_model=List[dict])
 async def get_clients_for_map(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_read_db),
         branch: Optional[str] = None,
         status_free: Optional[bool] = None,
         rep: Optional[str] = None
@@ -75,54 +76,50 @@ async def get_clients_for_map(
     Zwraca tylko te rekordy, które mają współrzędne geograficzne.
     """
     try:
-        # Podstawowe zapytanie - tylko klienci ze współrzędnymi
-        query = db.query(
-            Client.id,
-            Client.nazwa,
-            Client.nip,
-            Client.kod_pocztowy,
-            Client.miejscowosc,
-            Client.ulica,
-            Client.nr_nieruchomosci,
-            Client.longitude,
-            Client.latitude,
+        # Podstawowe zapytanie - tylko klienci ze współrzędnymi.
+        # Kształt odpowiedzi dla mapview budujemy w SQL, a wiersze trafiają
+        # bezpośrednio do serializera (bez pętli i walidacji 20 000 słowników).
+        query = select(
+            cast(Client.id, String).label("id"),
+            Client.nazwa.label("name"),
+            func.concat(
+                func.coalesce(Client.ulica, ""), " ",
+                func.coalesce(Client.nr_nieruchomosci, ""), ", ",
+                func.coalesce(Client.kod_pocztowy, ""), " ",
+                func.coalesce(Client.miejscowosc, "")
+            ).label("address"),
+            cast(func.nullif(Client.latitude, 0), Float).label("latitude"),
+            cast(func.nullif(Client.longitude, 0), Float).label("longitude"),
             Client.status_free,
             Client.branch,
             Client.rep
-        ).filter(
+        ).where(
             Client.longitude.isnot(None),
             Client.latitude.isnot(None)
         )
 
         # Dodatkowe filtry
         if branch:
-            query = query.filter(Client.branch == branch)
+            query = query.where(Client.branch == branch)
         if status_free is not None:
-            query = query.filter(Client.status_free == status_free)
+            query = query.where(Client.status_free == status_free)
         if rep:
-            query = query.filter(Client.rep == rep)
-
-        # Limitujemy wyniki do 1000 rekordów dla wydajności
-        clients = query.limit(20000).all()
-
-        # Przekształcamy do formatu dla mapview
-        return [{
-            "id": str(client.id),
-            "name": client.nazwa,
-            "address": f"{client.ulica or ''} {client.nr_nieruchomosci or ''}, {client.kod_pocztowy or ''} {client.miejscowosc or ''}",
-            "latitude": float(client.latitude) if client.latitude else None,
-            "longitude": float(client.longitude) if client.longitude else None,
-            "status_free": client.status_free,
-            "branch": client.branch,
-            "rep": client.rep
-        } for client in clients]
+            query = query.where(Client.rep == rep)
+
+        # Limitujemy wyniki do 20 000 rekordów dla wydajności
+        clients = (await db.execute(query.limit(20000))).mappings().all()
+
+        return json_response(clients)
 
     except Exception as e:
         logger.error(f"Błąd podczas pobierania klientów dla mapy: {str(e)}")
         # Zwracamy prostszy format w przypadku błędów
         try:
+            # Transakcja po błędzie jest przerwana - wycofujemy przed ponowną próbą
+            await db.rollback()
+
             # Alternatywne zapytanie bez problematycznych kolumn
-            simple_query = db.query(
+            simple_query = select(
                 Client.id,
                 Client.nazwa,
                 Client.longitude,
@@ -130,19 +127,19 @@ async def get_clients_for_map(
                 Client.status_free,
                 Client.branch,
                 Client.rep
-            ).filter(
+            ).where(
                 Client.longitude.isnot(None),
                 Client.latitude.isnot(None)
             )
 
             if branch:
-                simple_query = simple_query.filter(Client.branch == branch)
+                simple_query = simple_query.where(Client.branch == branch)
             if status_free is not None:
-                simple_query = simple_query.filter(Client.status_free == status_free)
+                simple_query = simple_query.where(Client.status_free == status_free)
             if rep:
-                simple_query = simple_query.filter(Client.rep == rep)
+                simple_query = simple_query.where(Client.rep == rep)
 
-            simple_clients = simple_query.limit(1000).all()
+            simple_clients = (await db.execute(simple_query.limit(1000))).all()
 
             return [{
                 "id": str(client.id),
@@ -162,7 +159,7 @@ async def get_clients_for_map(
 # Endpointy dla User
 @router.get("/users", response_model=List[UserResponse])
 async def get_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     cognito_user_name: Optional[str] = None,
     branch: Optional[str] = None,
     position: Optional[str] = None,
@@ -173,21 +170,18 @@ async def get_users(
     Pobiera listę użytkowników z możliwością filtrowania.
     """
     try:
-        query = db.query(User)
+        query = select(User)
 
         # Zastosuj filtry
         if cognito_user_name:
-            query = query.filter(User.cognito_user_name == cognito_user_name)
+            query = query.where(User.cognito_user_name == cognito_user_name)
         if branch:
-            query = query.filter(User.branch == branch)
+            query = query.where(User.branch == branch)
         if position:
-            query = query.filter(User.position == position)
-
-        # Pobierz całkowitą liczbę rekordów dla danego filtra
-        total_count = query.count()
+            query = query.where(User.position == position)
 
         # Zastosuj paginację
-        users = query.order_by(User.id).offset(offset).limit(limit).all()
+        users = (await db.scalars(query.order_by(User.id).offset(offset).limit(limit))).all()
 
         return users
 
@@ -197,12 +191,12 @@ async def get_users(
 
 
 @router.get("/users/{cognito_user_name}", response_model=UserResponse)
-async def get_user_by_cognito_username(cognito_user_name: str, db: Session = Depends(get_db)):
+async def get_user_by_cognito_username(cognito_user_name: str, db: AsyncSession = Depends(get_async_db)):
     """
     Pobiera szczegóły użytkownika na podstawie jego cognito_user_name.
     """
     try:
-        user = db.query(User).filter(User.cognito_user_name == cognito_user_name).first()
+        user = await db.scalar(select(User).where(User.cognito_user_name == cognito_user_name))
         if not user:
             raise HTTPException(
                 status_code=404,
@@ -220,13 +214,13 @@ async def get_user_by_cognito_username(cognito_user_name: str, db: Session = Dep
 
 
 @router.post("/users", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Tworzy nowego użytkownika.
     """
     try:
         # Sprawdź czy użytkownik o takiej nazwie już istnieje
-        existing_user = db.query(User).filter(User.cognito_user_name == user.cognito_user_name).first()
+        existing_user = await db.scalar(select(User).where(User.cognito_user_name == user.cognito_user_name))
         if existing_user:
             raise HTTPException(
                 status_code=400,
@@ -236,13 +230,13 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
         # Utwórz nowego użytkownika
         db_user = User(**user.model_dump())
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas tworzenia użytkownika: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -254,14 +248,14 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
 async def update_user(
     cognito_user_name: str,
     user_data: UserBase,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Aktualizuje dane istniejącego użytkownika.
     """
     try:
         # Pobierz istniejącego użytkownika
-        db_user = db.query(User).filter(User.cognito_user_name == cognito_user_name).first()
+        db_user = await db.scalar(select(User).where(User.cognito_user_name == cognito_user_name))
         if not db_user:
             raise HTTPException(
                 status_code=404,
@@ -273,13 +267,13 @@ async def update_user(
             if key != "cognito_user_name":  # Nie zmieniamy cognito_user_name
                 setattr(db_user, key, value)
 
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas aktualizacji użytkownika: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -288,25 +282,25 @@ async def update_user(
 
 
 @router.delete("/users/{cognito_user_name}")
-async def delete_user(cognito_user_name: str, db: Session = Depends(get_db)):
+async def delete_user(cognito_user_name: str, db: AsyncSession = Depends(get_async_db)):
     """
     Usuwa użytkownika na podstawie jego cognito_user_name.
     """
     try:
-        db_user = db.query(User).filter(User.cognito_user_name == cognito_user_name).first()
+        db_user = await db.scalar(select(User).where(User.cognito_user_name == cognito_user_name))
         if not db_user:
             raise HTTPException(
                 status_code=404,
                 detail=f"Nie znaleziono użytkownika o nazwie {cognito_user_name}"
             )
 
-        db.delete(db_user)
-        db.commit()
+        await db.delete(db_user)
+        await db.commit()
         return {"ok": True, "message": f"Użytkownik {cognito_user_name} został usunięty"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas usuwania użytkownika: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -317,7 +311,7 @@ async def delete_user(cognito_user_name: str, db: Session = Depends(get_db)):
 # Endpointy dla Client
 @router.get("/clients", response_model=List[ClientResponse])
 async def get_clients(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     nip: Optional[str] = None,
     nazwa: Optional[str] = None,
     branch: Optional[str] = None,
@@ -329,20 +323,20 @@ async def get_clients(
     Pobiera listę klientów z możliwością filtrowania.
     """
     try:
-        query = db.query(Client)
+        query = select(Client)
 
         # Zastosuj filtry
         if nip:
-            query = query.filter(Client.nip == nip)
+            query = query.where(Client.nip == nip)
         if nazwa:
-            query = query.filter(Client.nazwa.ilike(f"%{nazwa}%"))
+            query = query.where(Client.nazwa.ilike(f"%{nazwa}%"))
         if branch:
-            query = query.filter(Client.branch == branch)
+            query = query.where(Client.branch == branch)
         if status_free is not None:
-            query = query.filter(Client.status_free == status_free)
+            query = query.where(Client.status_free == status_free)
 
         # Zastosuj paginację
-        clients = query.order_by(Client.id).offset(offset).limit(limit).all()
+        clients = (await db.scalars(query.order_by(Client.id).offset(offset).limit(limit))).all()
 
         return clients
 
@@ -352,24 +346,24 @@ async def get_clients(
 
 
 @router.get("/clients/{client_id}", response_model=ClientResponse)
-async def get_client(client_id: int, db: Session = Depends(get_db)):
+async def get_client(client_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Pobiera szczegóły klienta na podstawie jego ID.
     """
-    client = db.query(Client).filter(Client.id == client_id).first()
+    client = await db.get(Client, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Klient nie znaleziony")
     return client
 
 
 @router.post("/clients", response_model=ClientResponse)
-async def create_client(client: ClientCreate, db: Session = Depends(get_db)):
+async def create_client(client: ClientCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Tworzy nowego klienta.
     """
     try:
         # Sprawdź czy klient o takim NIP już istnieje
-        existing_client = db.query(Client).filter(Client.nip == client.nip).first()
+        existing_client = await db.scalar(select(Client).where(Client.nip == client.nip))
         if existing_client:
             raise HTTPException(
                 status_code=400,
@@ -379,13 +373,13 @@ async def create_client(client: ClientCreate, db: Session = Depends(get_db)):
         # Utwórz nowego klienta
         db_client = Client(**client.model_dump())
         db.add(db_client)
-        db.commit()
-        db.refresh(db_client)
+        await db.commit()
+        await db.refresh(db_client)
         return db_client
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas tworzenia klienta: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -397,14 +391,14 @@ async def create_client(client: ClientCreate, db: Session = Depends(get_db)):
 async def update_client(
     client_id: int,
     client_data: ClientBase,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Aktualizuje dane istniejącego klienta.
     """
     try:
         # Pobierz istniejącego klienta
-        db_client = db.query(Client).filter(Client.id == client_id).first()
+        db_client = await db.get(Client, client_id)
         if not db_client:
             raise HTTPException(
                 status_code=404,
@@ -415,13 +409,13 @@ async def update_client(
         for key, value in client_data.model_dump().items():
             setattr(db_client, key, value)
 
-        db.commit()
-        db.refresh(db_client)
+        await db.commit()
+        await db.refresh(db_client)
         return db_client
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas aktualizacji klienta: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -430,25 +424,25 @@ async def update_client(
 
 
 @router.delete("/clients/{client_id}")
-async def delete_client(client_id: int, db: Session = Depends(get_db)):
+async def delete_client(client_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Usuwa klienta na podstawie jego ID.
     """
     try:
-        db_client = db.query(Client).filter(Client.id == client_id).first()
+        db_client = await db.get(Client, client_id)
         if not db_client:
             raise HTTPException(
                 status_code=404,
                 detail=f"Nie znaleziono klienta o ID {client_id}"
             )
 
-        db.delete(db_client)
-        db.commit()
+        await db.delete(db_client)
+        await db.commit()
         return {"ok": True, "message": f"Klient o ID {client_id} został usunięty"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Błąd podczas usuwania klienta: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -458,13 +452,13 @@ async def delete_client(client_id: int, db: Session = Depends(get_db)):
 
 # Endpoint diagnostyczny
 @router.get("/users/debug/test", include_in_schema=False)
-async def debug_users_endpoint(db: Session = Depends(get_db)):
+async def debug_users_endpoint(db: AsyncSession = Depends(get_async_db)):
     """
     Endpoint diagnostyczny do sprawdzania połączenia z bazą danych i tabeli users.
     """
     try:
         # Sprawdź czy tabela istnieje
-        users = db.query(User).limit(5).all()
+        users = (await db.scalars(select(User).limit(5))).all()
         return {
             "status": "ok",
             "users_count": len(users),
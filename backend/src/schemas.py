@@ -2,22 +2,6 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, date
 
-# Cost Kind schemas
-class CostKindBase(BaseModel):
-    kind: str
-
-    class Config:
-        from_attributes = True
-
-class CostKindCreate(CostKindBase):
-    pass
-
-class CostKindUpdate(CostKindBase):
-    pass
-
-class CostKind(CostKindBase):
-    id: int
-
 # Cost schemas
 class CostBase(BaseModel):
     cost_year: int
@@ -114,6 +98,39 @@ class ZeroMarginTransaction(BaseModel):
 
 class PaginatedZeroMarginResponse(BaseModel):
     data: List[ZeroMarginTransaction]
-    total: int
+    total: Optional[int] = None  # None przy include_total=false
     limit: int
-    offset: int
\ No newline at end of file
+    offset: int
+    next_cursor: Optional[str] = None  # kursor następnej strony; None na ostatniej
+
+# --- IMPORT TRANSAKCJI ---
+
+class IngestResponse(BaseModel):
+    received: int   # wiersze partii
+    rows: int       # po usunięciu powtórzeń dokumentu
+    inserted: int
+    updated: int
+    unchanged: int
+    job_id: Optional[int] = None  # zadanie odświeżania; None, gdy nic się nie zmieniło
+    execution_time_seconds: float
+
+# --- ZADANIA ODŚWIEŻANIA AGREGATÓW ---
+
+class RefreshStage(BaseModel):
+    name: str
+    seconds: float
+
+class RefreshJobStatus(BaseModel):
+    id: int
+    status: str
+    full_refresh: bool
+    requests: int
+    requested_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    current_stage: Optional[str] = None
+    stages: Optional[List[RefreshStage]] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
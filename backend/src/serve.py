@@ -0,0 +1,113 @@
+# serve.py
+"""
+Produkcyjny punkt wejścia: uvicorn z N workerami.
+
+Liczba workerów: WORKERS albo liczba dostępnych rdzeni. Jeśli ustawiono
+DB_CONNECTION_BUDGET (łączna liczba połączeń, na jaką stać ten kontener),
+budżet jest dzielony między workery i wyliczone rozmiary pul trafiają do
+zmiennych środowiskowych przed startem workerów - database.py czyta je
+przy imporcie. Jawnie ustawione DB_POOL_SIZE / DB_MAX_OVERFLOW /
+DB_ASYNC_POOL_SIZE / DB_ASYNC_MAX_OVERFLOW mają pierwszeństwo.
+"""
+import logging
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("serve")
+
+# Połączenia na worker poza pulami API: jednopołączeniowy silnik sondy health,
+# połączenie LISTEN (notifications.py) i silnik runnera odświeżania
+# (refresh_jobs.REFRESH_RUNNER_CONNECTIONS)
+PROBE_CONNECTIONS = 1
+LISTEN_CONNECTIONS = 1
+REFRESH_RUNNER_CONNECTIONS = 2
+EXTRA_CONNECTIONS = PROBE_CONNECTIONS + LISTEN_CONNECTIONS + REFRESH_RUNNER_CONNECTIONS
+
+
+def worker_count() -> int:
+    if workers := os.getenv("WORKERS"):
+        return max(int(workers), 1)
+    try:
+        # Uwzględnia ograniczenie CPU kontenera (affinity), w przeciwieństwie do cpu_count()
+        return max(len(os.sched_getaffinity(0)), 1)
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def split_pool(connections: int) -> tuple:
+    """Dzieli połączenia na stałą część puli (2/3) i overflow (reszta)."""
+    pool_size = max(connections * 2 // 3, 1)
+    return pool_size, max(connections - pool_size, 0)
+
+
+def apply_connection_budget(workers: int):
+    """Ustawia rozmiary pul per worker z DB_CONNECTION_BUDGET i loguje rachunek."""
+    budget = os.getenv("DB_CONNECTION_BUDGET")
+    if budget:
+        per_worker = int(budget) // workers - EXTRA_CONNECTIONS
+        if per_worker < 2:
+            raise SystemExit(
+                f"DB_CONNECTION_BUDGET={budget} nie wystarcza dla {workers} workerów "
+                f"(potrzeba co najmniej {(2 + EXTRA_CONNECTIONS) * workers})"
+            )
+        # Endpointy synchroniczne i async def mają osobne pule - dzielimy po połowie
+        sync_total = (per_worker + 1) // 2
+        sync_size, sync_overflow = split_pool(sync_total)
+        async_size, async_overflow = split_pool(per_worker - sync_total)
+        os.environ.setdefault("DB_POOL_SIZE", str(sync_size))
+        os.environ.setdefault("DB_MAX_OVERFLOW", str(sync_overflow))
+        os.environ.setdefault("DB_ASYNC_POOL_SIZE", str(async_size))
+        os.environ.setdefault("DB_ASYNC_MAX_OVERFLOW", str(async_overflow))
+
+    sync_size = int(os.getenv("DB_POOL_SIZE", "5"))
+    sync_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    async_size = int(os.getenv("DB_ASYNC_POOL_SIZE", str(sync_size)))
+    async_overflow = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", str(sync_overflow)))
+    per_worker_max = sync_size + sync_overflow + async_size + async_overflow + EXTRA_CONNECTIONS
+
+    logger.info(
+        f"Połączenia z bazą: {workers} workerów x (sync {sync_size}+{sync_overflow} "
+        f"+ async {async_size}+{async_overflow} + sonda {PROBE_CONNECTIONS} "
+        f"+ LISTEN {LISTEN_CONNECTIONS} + odświeżanie {REFRESH_RUNNER_CONNECTIONS}) "
+        f"= maks. {workers * per_worker_max}, stale otwartych {workers * (sync_size + async_size + PROBE_CONNECTIONS + LISTEN_CONNECTIONS)}"
+        + (f", budżet {budget}" if budget else ", bez DB_CONNECTION_BUDGET")
+    )
+    if budget and workers * per_worker_max > int(budget):
+        logger.warning("Jawnie ustawione rozmiary pul przekraczają DB_CONNECTION_BUDGET")
+
+
+def prepare_prometheus_multiprocess(workers: int):
+    """Przy wielu workerach metryki muszą być agregowane przez katalog współdzielony."""
+    if workers <= 1:
+        return
+    directory = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "prometheus_multiproc")
+    )
+    # Pliki po poprzednim uruchomieniu zafałszowałyby liczniki
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def main():
+    workers = worker_count()
+    apply_connection_budget(workers)
+    prepare_prometheus_multiprocess(workers)
+
+    uvicorn.run(
+        "app:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        workers=workers,
+        timeout_keep_alive=int(os.getenv("TIMEOUT_KEEP_ALIVE", 65)),
+    )
+
+
+if __name__ == "__main__":
+    main()
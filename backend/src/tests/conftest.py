@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Moduły aplikacji importowane jak w kontenerze (PYTHONPATH=/app/src),
+# niezależnie od katalogu, z którego uruchomiono pytest
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
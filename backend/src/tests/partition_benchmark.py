@@ -0,0 +1,216 @@
+"""
+Benchmark partycjonowania transactions po year.
+
+Tworzy w osobnym schemacie dwie tabele o strukturze transactions z tymi samymi
+syntetycznymi danymi z kilku lat: zwykłą (bench_plain) i partycjonowaną
+zakresowo po year (bench_partitioned). Dla typowych zapytań API porównuje plany
+EXPLAIN (ANALYZE, BUFFERS): liczbę przeczytanych partycji, bufory i czasy.
+
+Uruchomienie (zmienne DB_* z pliku .env jak w db_structure_test.py):
+    python tests/partition_benchmark.py --rows 2000000 --years 6
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA = "partition_bench"
+BRANCHES = ["Rzgów", "Malbork", "Pcim", "Lublin", "Łomża", "Myślibórz", "MG", "STH", "BHP"]
+
+# (nazwa, zapytanie) - {table} zastępowane nazwą tabeli; ostatni rok danych to {last_year}
+QUERIES = [
+    (
+        "aggregated_profits: rok i miesiąc",
+        """SELECT branch_name, SUM(profit), SUM(rep_profit) FILTER (WHERE to_pay IS NULL OR to_pay = 0)
+           FROM {table} WHERE year = {last_year} AND month = 6 GROUP BY branch_name"""
+    ),
+    (
+        "aggregated_profits: cały rok",
+        """SELECT month, branch_name, SUM(hq_profit), SUM(found)
+           FROM {table} WHERE year = {last_year} GROUP BY month, branch_name"""
+    ),
+    (
+        "zero-margin: zakres dat bez year",
+        """SELECT id FROM {table}
+           WHERE net_value > 0 AND abs(net_value - profit) < 0.02
+             AND created_at BETWEEN '{last_year}-03-01' AND '{last_year}-03-31 23:59:59'
+           ORDER BY created_at DESC LIMIT 20"""
+    ),
+    (
+        "zero-margin: zakres dat z year",
+        """SELECT id FROM {table}
+           WHERE net_value > 0 AND abs(net_value - profit) < 0.02
+             AND created_at BETWEEN '{last_year}-03-01' AND '{last_year}-03-31 23:59:59'
+             AND year >= {last_year} AND year <= {last_year}
+           ORDER BY created_at DESC LIMIT 20"""
+    ),
+    (
+        "bez filtra po year (pełny skan)",
+        """SELECT branch_name, SUM(net_value) FROM {table} GROUP BY branch_name"""
+    ),
+]
+
+
+def load_env_variables() -> Optional[Dict[str, str]]:
+    """Ładuje parametry połączenia z pliku .env"""
+    env_path = Path(__file__).parent.parent / '.env'
+    logger.info(f"Szukam pliku .env w: {env_path}")
+    load_dotenv(env_path)
+
+    db_config = {
+        'host': os.getenv('DB_HOST'),
+        'dbname': os.getenv('DB_NAME'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'port': os.getenv('DB_PORT', '5432')
+    }
+    missing_vars = [key for key, value in db_config.items() if not value]
+    if missing_vars:
+        logger.error(f"❌ Brakujące zmienne środowiskowe: {', '.join(missing_vars)}")
+        return None
+    return db_config
+
+
+def create_dataset(cursor, rows: int, first_year: int, years: int):
+    """Tworzy obie tabele i wypełnia je tymi samymi danymi."""
+    logger.info(f"Tworzenie danych: {rows} wierszy, lata {first_year}-{first_year + years - 1}")
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+
+    columns = """
+        id integer NOT NULL,
+        document_number varchar(50) NOT NULL,
+        created_at timestamptz,
+        branch_name varchar(100) NOT NULL,
+        representative_name varchar(100),
+        net_value numeric(12, 2) NOT NULL,
+        to_pay numeric(12, 2),
+        profit numeric(12, 2) NOT NULL,
+        year integer,
+        month integer,
+        rep_profit numeric(12, 2),
+        branch_profit numeric(12, 2),
+        hq_profit numeric(12, 2),
+        found numeric(12, 2)
+    """
+    cursor.execute(f"CREATE TABLE bench_plain ({columns})")
+    cursor.execute(f"CREATE TABLE bench_partitioned ({columns}) PARTITION BY RANGE (year)")
+    cursor.execute("CREATE TABLE bench_partitioned_default PARTITION OF bench_partitioned DEFAULT")
+    for year in range(first_year, first_year + years):
+        cursor.execute(
+            f"CREATE TABLE bench_partitioned_y{year} PARTITION OF bench_partitioned "
+            f"FOR VALUES FROM ({year}) TO ({year + 1})"
+        )
+
+    branches = "ARRAY[" + ", ".join(f"'{b}'" for b in BRANCHES) + "]"
+    cursor.execute(f"""
+        INSERT INTO bench_plain
+        SELECT g,
+               'FV/' || g,
+               ts,
+               ({branches})[1 + g % {len(BRANCHES)}],
+               CASE WHEN g % 3 = 0 THEN NULL ELSE 'PH ' || (g % 40) END,
+               net,
+               CASE WHEN g % 4 = 0 THEN net ELSE 0 END,
+               CASE WHEN g % 50 = 0 THEN net ELSE round(net * 0.2, 2) END,
+               extract(year FROM ts)::integer,
+               extract(month FROM ts)::integer,
+               round(net * 0.05, 2), round(net * 0.05, 2), round(net * 0.08, 2), round(net * 0.02, 2)
+        FROM (
+            SELECT g,
+                   timestamptz '{first_year}-01-01' + (random() * {years * 365}) * interval '1 day' AS ts,
+                   round((random() * 5000)::numeric, 2) + 1 AS net
+            FROM generate_series(1, {rows}) g
+        ) s
+    """)
+    cursor.execute("INSERT INTO bench_partitioned SELECT * FROM bench_plain")
+
+    for table in ("bench_plain", "bench_partitioned"):
+        cursor.execute(f"CREATE INDEX ON {table} (year, month, branch_name)")
+        cursor.execute(f"CREATE INDEX ON {table} (created_at)")
+        cursor.execute(f"ANALYZE {table}")
+
+
+def scanned_relations(plan: dict) -> List[str]:
+    """Nazwy tabel/partycji czytanych w planie."""
+    names = []
+    if "Relation Name" in plan:
+        names.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        names.extend(scanned_relations(child))
+    return names
+
+
+def explain(cursor, query: str) -> dict:
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+    result = cursor.fetchone()[0]
+    result = result[0] if isinstance(result, list) else json.loads(result)[0]
+    plan = result["Plan"]
+    return {
+        "planning_ms": result["Planning Time"],
+        "execution_ms": result["Execution Time"],
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "relations": sorted(set(scanned_relations(plan))),
+    }
+
+
+def run_benchmark(cursor, last_year: int, runs: int):
+    logger.info("")
+    logger.info(f"{'zapytanie':<36} {'tabela':<18} {'partycje':>8} {'bufory':>9} {'plan ms':>8} {'wyk. ms':>9}")
+    for name, template in QUERIES:
+        for table in ("bench_plain", "bench_partitioned"):
+            query = template.format(table=table, last_year=last_year)
+            # Pierwszy przebieg rozgrzewa cache - mierzymy kolejne
+            explain(cursor, query)
+            samples = [explain(cursor, query) for _ in range(runs)]
+            relations = samples[0]["relations"]
+            logger.info(
+                f"{name:<36} {table:<18} {len(relations):>8} {samples[0]['buffers']:>9} "
+                f"{statistics.median(s['planning_ms'] for s in samples):>8.2f} "
+                f"{statistics.median(s['execution_ms'] for s in samples):>9.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Porównanie planów: transactions zwykła vs partycjonowana po year")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Liczba syntetycznych transakcji")
+    parser.add_argument("--years", type=int, default=5, help="Liczba lat danych")
+    parser.add_argument("--first-year", type=int, default=2020)
+    parser.add_argument("--runs", type=int, default=5, help="Liczba pomiarów na zapytanie (mediana)")
+    parser.add_argument("--keep", action="store_true", help="Nie usuwaj schematu po zakończeniu")
+    args = parser.parse_args()
+
+    db_config = load_env_variables()
+    if not db_config:
+        return
+
+    conn = psycopg2.connect(**db_config)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        create_dataset(cursor, args.rows, args.first_year, args.years)
+        run_benchmark(cursor, args.first_year + args.years - 1, args.runs)
+    except Exception as e:
+        logger.error(f"❌ Błąd podczas benchmarku: {str(e)}")
+    finally:
+        if not args.keep:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
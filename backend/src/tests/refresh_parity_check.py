@@ -0,0 +1,169 @@
+"""
+Porównanie przyrostowego odświeżania agregatów z pełną przebudową.
+
+W jednej transakcji, wycofywanej na końcu (baza zostaje bez zmian):
+  1. pełne funkcje bazy - refresh_aggregated_sales_data(),
+     refresh_representative_aggregated_data(), refresh_profit_cube_full() -
+     i kopia wyniku każdej tabeli agregatów,
+  2. wszystkie klucze (rok, miesiąc, oddział, przedstawiciel) z transactions
+     i z tabel agregatów trafiają do aggregate_dirty_claims, potem
+     refresh_aggregates_incremental() (migrations/002, 004, 012),
+  3. porównanie tabel po obu przebiegach (EXCEPT w obie strony, bez kolumn
+     id i znaczników czasu).
+
+Dopóki skrypt zgłasza różnice na danych produkcyjnych, PUT /config/update-date
+powinien zostać przy full_refresh=true.
+
+Uruchomienie (zmienne DB_* z pliku .env jak w db_structure_test.py):
+    python tests/refresh_parity_check.py
+"""
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+AGGREGATE_TABLES = [
+    "aggregated_sales_data",
+    "representative_aggregated_data",
+    "net_sales_branch_total",
+    "profit_total",
+    "net_sales_branch_payd",
+    "profit_payd",
+    "net_sales_representative_total",
+    "profit_representative_total",
+    "net_sales_representative_payd",
+    "profit_representative_payd",
+    "monthly_profit_cube",
+]
+FULL_REFRESH = [
+    "SELECT refresh_aggregated_sales_data()",
+    "SELECT refresh_representative_aggregated_data()",
+    "SELECT refresh_profit_cube_full()",
+]
+# Klucze przyrostowego przeliczenia: wszystko, co jest w transakcjach albo w agregatach
+ALL_KEYS = """
+    INSERT INTO aggregate_dirty_claims (year, month, branch_name, representative_name)
+    SELECT year, month, branch_name, COALESCE(representative_name, '')
+    FROM transactions
+    WHERE month IS NOT NULL AND branch_name IS NOT NULL
+    UNION
+    SELECT year, month, branch_name, '' FROM net_sales_branch_total
+    UNION
+    SELECT asd_year, asd_month, asd_branch, '' FROM aggregated_sales_data
+    UNION
+    SELECT year, month, branch_name, representative_name FROM representative_aggregated_data
+    ON CONFLICT DO NOTHING
+"""
+SAMPLE_ROWS = 5
+
+
+def load_env_variables() -> Optional[Dict[str, str]]:
+    """Ładuje parametry połączenia z pliku .env"""
+    env_path = Path(__file__).parent.parent / '.env'
+    logger.info(f"Szukam pliku .env w: {env_path}")
+    load_dotenv(env_path)
+
+    db_config = {
+        'host': os.getenv('DB_HOST'),
+        'dbname': os.getenv('DB_NAME'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'port': os.getenv('DB_PORT', '5432')
+    }
+    missing_vars = [key for key, value in db_config.items() if not value]
+    if missing_vars:
+        logger.error(f"❌ Brakujące zmienne środowiskowe: {', '.join(missing_vars)}")
+        return None
+    return db_config
+
+
+def compared_columns(cursor, table: str) -> List[str]:
+    """Kolumny wyniku - bez id i znaczników czasu, które różnią się przy każdym przebiegu."""
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+          AND column_name <> 'id'
+          AND data_type NOT IN ('timestamp with time zone', 'timestamp without time zone')
+        ORDER BY ordinal_position
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def compare_table(cursor, table: str, columns: List[str]) -> int:
+    column_list = ", ".join(columns)
+    differences = 0
+    for label, left, right in (
+        ("tylko przyrostowo", table, f"_full_{table}"),
+        ("tylko w pełnej przebudowie", f"_full_{table}", table),
+    ):
+        cursor.execute(f"""
+            SELECT {column_list} FROM {left}
+            EXCEPT
+            SELECT {column_list} FROM {right}
+        """)
+        rows = cursor.fetchall()
+        if rows:
+            differences += len(rows)
+            logger.warning(f"  {table}: {len(rows)} wierszy {label}")
+            for row in rows[:SAMPLE_ROWS]:
+                logger.warning(f"    {dict(zip(columns, row))}")
+    return differences
+
+
+def main() -> int:
+    db_config = load_env_variables()
+    if not db_config:
+        return 2
+
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET LOCAL statement_timeout = 0")
+
+        logger.info("Pełna przebudowa agregatów...")
+        for statement in FULL_REFRESH:
+            cursor.execute(statement)
+        columns = {}
+        for table in AGGREGATE_TABLES:
+            columns[table] = compared_columns(cursor, table)
+            cursor.execute(
+                f"CREATE TEMP TABLE _full_{table} AS SELECT {', '.join(columns[table])} FROM {table}"
+            )
+
+        logger.info("Przyrostowe przeliczenie wszystkich kluczy...")
+        cursor.execute("DELETE FROM aggregate_dirty_claims")
+        cursor.execute(ALL_KEYS)
+        cursor.execute("SELECT refresh_aggregates_incremental()")
+        logger.info(f"Przeliczono {cursor.fetchone()[0]} kluczy")
+
+        differences = 0
+        for table in AGGREGATE_TABLES:
+            differences += compare_table(cursor, table, columns[table])
+
+        if differences:
+            logger.error(f"❌ Różnice między przebiegami: {differences} wierszy")
+            return 1
+        logger.info("✅ Przyrostowe odświeżanie daje te same agregaty co pełna przebudowa")
+        return 0
+    except Exception as e:
+        logger.error(f"❌ Błąd podczas porównania: {str(e)}")
+        return 2
+    finally:
+        # Porównanie niczego nie zapisuje
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
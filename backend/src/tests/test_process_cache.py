@@ -0,0 +1,52 @@
+import asyncio
+
+from process_cache import ProcessCache
+
+
+def test_value_cached_until_invalidated():
+    cache = ProcessCache("test", 60)
+    calls = []
+
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get(load) == 1
+    assert cache.get(load) == 1
+    cache.invalidate()
+    assert cache.get(load) == 2
+
+
+def test_ttl_expiry():
+    cache = ProcessCache("test", 0)
+    values = iter([1, 2])
+    assert cache.get(lambda: next(values)) == 1
+    assert cache.get(lambda: next(values)) == 2
+
+
+def test_none_not_cached():
+    cache = ProcessCache("test", 60)
+    assert cache.get(lambda: None) is None
+    assert cache.get(lambda: 5) == 5
+
+
+def test_load_started_before_invalidate_is_not_stored():
+    cache = ProcessCache("test", 60)
+
+    def stale_load():
+        # Powiadomienie przychodzi w trakcie ładowania
+        cache.invalidate("x")
+        return "stale"
+
+    assert cache.get(stale_load) == "stale"
+    assert cache.get(lambda: "fresh") == "fresh"
+
+
+def test_get_async():
+    cache = ProcessCache("test", 60)
+
+    async def load():
+        return (2024, 2023)
+
+    assert asyncio.run(cache.get_async(load)) == (2024, 2023)
+    assert cache.get(lambda: ()) == (2024, 2023)
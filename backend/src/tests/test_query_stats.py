@@ -0,0 +1,18 @@
+from query_stats import statement_template
+
+
+def test_whitespace_is_normalized():
+    assert statement_template("SELECT  *\n  FROM\tt ") == "SELECT * FROM t"
+
+
+def test_placeholders_of_both_drivers():
+    # psycopg2 (%(name)s) i asyncpg ($1) dają ten sam szablon
+    sync = statement_template("SELECT a FROM t WHERE year = %(year_1)s AND month = %(month_1)s")
+    async_ = statement_template("SELECT a FROM t WHERE year = $1 AND month = $2")
+    assert sync == async_ == "SELECT a FROM t WHERE year = ? AND month = ?"
+
+
+def test_in_lists_collapse():
+    short = statement_template("SELECT a FROM t WHERE id IN ($1, $2)")
+    long = statement_template("SELECT a FROM t WHERE id IN ($1, $2, $3, $4, $5)")
+    assert short == long == "SELECT a FROM t WHERE id IN (?...)"
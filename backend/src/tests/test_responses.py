@@ -0,0 +1,44 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import orjson
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import create_engine, text
+
+from responses import dumps
+
+
+class Item(BaseModel):
+    name: str
+    value: float
+
+
+def test_decimal_and_dates():
+    payload = {"amount": Decimal("12.50"), "day": date(2024, 5, 1), "at": datetime(2024, 5, 1, 8, 30)}
+    assert orjson.loads(dumps(payload)) == {"amount": 12.5, "day": "2024-05-01", "at": "2024-05-01T08:30:00"}
+
+
+def test_non_string_keys():
+    assert orjson.loads(dumps({2024: 1, 1: 2})) == {"2024": 1, "1": 2}
+
+
+def test_pydantic_model_and_set():
+    assert orjson.loads(dumps({"item": Item(name="a", value=1), "tags": {"x"}})) == {
+        "item": {"name": "a", "value": 1.0},
+        "tags": ["x"],
+    }
+
+
+def test_sqlalchemy_rows():
+    rows_stmt = text("SELECT 1 AS id, 'a' AS name UNION ALL SELECT 2, 'b'")
+    with create_engine("sqlite://").connect() as conn:
+        rows = conn.execute(rows_stmt).all()
+        mappings = conn.execute(rows_stmt).mappings().all()
+    assert orjson.loads(dumps(rows)) == [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+    assert orjson.loads(dumps(mappings)) == [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+
+
+def test_unknown_type():
+    with pytest.raises(TypeError):
+        dumps({"x": object()})
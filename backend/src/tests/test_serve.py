@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import serve
+
+POOL_VARIABLES = ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_ASYNC_POOL_SIZE", "DB_ASYNC_MAX_OVERFLOW")
+
+
+@pytest.fixture
+def clean_pool_env(monkeypatch):
+    # apply_connection_budget ustawia os.environ bezpośrednio - przywracamy stan po teście
+    saved = {name: os.environ.pop(name) for name in POOL_VARIABLES if name in os.environ}
+    monkeypatch.delenv("DB_CONNECTION_BUDGET", raising=False)
+    yield monkeypatch
+    for name in POOL_VARIABLES:
+        os.environ.pop(name, None)
+    os.environ.update(saved)
+
+
+def pool_env():
+    return tuple(int(os.environ[name]) for name in POOL_VARIABLES)
+
+
+@pytest.mark.parametrize("connections, expected", [
+    (1, (1, 0)),
+    (2, (1, 1)),
+    (3, (2, 1)),
+    (10, (6, 4)),
+])
+def test_split_pool(connections, expected):
+    assert serve.split_pool(connections) == expected
+
+
+def test_split_pool_keeps_total():
+    for connections in range(1, 50):
+        size, overflow = serve.split_pool(connections)
+        assert size >= 1
+        assert size + overflow == max(connections, 1)
+
+
+def test_budget_counts_extra_connections(clean_pool_env):
+    # 4 workery x 20 połączeń: po odjęciu sondy, LISTEN i runnera zostaje 16 na pule API
+    clean_pool_env.setenv("DB_CONNECTION_BUDGET", "80")
+    serve.apply_connection_budget(4)
+    sync_size, sync_overflow, async_size, async_overflow = pool_env()
+    per_worker = sync_size + sync_overflow + async_size + async_overflow
+    assert per_worker == 20 - serve.EXTRA_CONNECTIONS
+    assert 4 * (per_worker + serve.EXTRA_CONNECTIONS) <= 80
+
+
+def test_budget_minimum(clean_pool_env):
+    clean_pool_env.setenv("DB_CONNECTION_BUDGET", str(2 + serve.EXTRA_CONNECTIONS))
+    serve.apply_connection_budget(1)
+    assert pool_env() == (1, 0, 1, 0)
+
+
+def test_budget_too_small(clean_pool_env):
+    clean_pool_env.setenv("DB_CONNECTION_BUDGET", str(2 * (1 + serve.EXTRA_CONNECTIONS)))
+    with pytest.raises(SystemExit):
+        serve.apply_connection_budget(2)
+
+
+def test_explicit_pool_size_wins(clean_pool_env):
+    clean_pool_env.setenv("DB_CONNECTION_BUDGET", "40")
+    clean_pool_env.setenv("DB_POOL_SIZE", "3")
+    serve.apply_connection_budget(2)
+    assert pool_env()[0] == 3
@@ -0,0 +1,42 @@
+# year_cache.py
+"""
+Cache procesu dla listy lat z transakcjami (transaction_years).
+
+Lista zmienia się raz w roku, a czyta ją wybór roku na każdym dashboardzie
+(/years). Wartość trzymamy w pamięci (process_cache.py); unieważnia ją
+NOTIFY transaction_years wysyłany przez trigger tylko wtedy, gdy transakcja
+trafia do nowego roku (migrations/008_transaction_years.sql, notifications.py).
+TRANSACTION_YEARS_TTL_SECONDS jest tylko zabezpieczeniem na wypadek
+utraconego powiadomienia.
+"""
+import logging
+import os
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.transaction import TransactionYear
+from process_cache import ProcessCache
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_YEARS_TTL_SECONDS = float(os.getenv("TRANSACTION_YEARS_TTL_SECONDS", "3600"))
+TRANSACTION_YEARS_CHANNEL = "transaction_years"
+
+_cache: ProcessCache[Tuple[int, ...]] = ProcessCache(
+    "lat transakcji", TRANSACTION_YEARS_TTL_SECONDS, channel=TRANSACTION_YEARS_CHANNEL
+)
+
+
+async def get_transaction_years_async(db: AsyncSession) -> Tuple[int, ...]:
+    """Lata z transakcjami, od najnowszego (AsyncSession)."""
+    async def load():
+        return tuple((await db.scalars(
+            select(TransactionYear.year).order_by(TransactionYear.year.desc())
+        )).all())
+    return await _cache.get_async(load)
+
+
+def invalidate_transaction_years(payload: Optional[str] = None):
+    _cache.invalidate(payload)
@@ -155,7 +155,7 @@ const ZeroCostsView = () => {
       setTransactions(response.data);
       setPagination(prev => ({
         ...prev,
-        total: response.total
+        total: response.total ?? 0
       }));
 
     } catch (error) {
@@ -38,6 +38,7 @@ class CostsService {
     cost_ph?: string;
     limit?: number;
     offset?: number;
+    cursor?: number; // next_cursor z poprzedniej strony
   }) {
     try {
       const queryParams = new URLSearchParams();
@@ -11,6 +11,8 @@ export interface ZeroMarginParams {
   date_to?: string;
   limit: number;
   offset: number;
+  cursor?: string;         // next_cursor z poprzedniej strony - zamiast offset
+  include_total?: boolean;
 }
 
 export interface ZeroMarginTransaction {
@@ -26,9 +28,10 @@ export interface ZeroMarginTransaction {
 
 export interface ZeroMarginResponse {
   data: ZeroMarginTransaction[];
-  total: number;
+  total: number | null;       // null przy include_total=false
   limit: number;
   offset: number;
+  next_cursor: string | null; // null na ostatniej stronie
 }
 
 class TransactionsService {
@@ -49,6 +52,8 @@ class TransactionsService {
       // Paginacja
       queryParams.append('limit', params.limit.toString());
       queryParams.append('offset', params.offset.toString());
+      if (params.cursor) queryParams.append('cursor', params.cursor);
+      if (params.include_total === false) queryParams.append('include_total', 'false');
 
       const response = await fetch(`${this.apiUrl}/zero-margin?${queryParams.toString()}`, {
         method: 'GET',